@@ -1,25 +1,109 @@
 '''
     - Simple Python API for retrieving credentials from an sqlite3 database - json output
-    - Usage: python creds-api.py - Running locally will open a Flask server on port 5000, accessible on LAN by host machine local IP address
+    - Usage: python api.py - Running locally will open a Flask server on port 5000, accessible on LAN by host machine local IP address
+    - Production: gunicorn -c gunicorn.conf.py wsgi:app - Multiple worker processes, see README.md
 '''
 
 # TODO: (1) Add more error handling and input validation
-# TODO: (2) Find fix for running the script the first time (no users in db): Current workaround is to comment out the @app.login_required decorator for add_user > STARTED
 # TODO: (3) Add logging
 
 import os
-from flask import Flask, request, jsonify
+import time
+import hashlib
+import hmac
+from collections import namedtuple
+from flask import Flask, Blueprint, request, jsonify, current_app, g, url_for
 from flask_sqlalchemy import SQLAlchemy
-from flask_httpauth import HTTPBasicAuth
+from sqlalchemy import inspect, text as text_clause
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from werkzeug.security import generate_password_hash, check_password_hash
 import config_init as ci
+from auth_cache import VerifiedCredentialCache, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+from row_cache import CredentialRowCache, DEFAULT_TTL as DEFAULT_CRED_CACHE_TTL, DEFAULT_MAX_ENTRIES as DEFAULT_CRED_CACHE_MAX_ENTRIES
+from crypto_utils import get_or_gen_token_key
+from migrations import migrate
+from db_config import configure_storage, register_pragmas
+import metrics
+import profiling
+import json_provider
+import serialization
+import response_compression
+from password_hashing import DEFAULT_METHOD as DEFAULT_PASSWORD_HASH_METHOD, needs_rehash
+
+# Importing this module has no side effects. Apps are built by create_app(), see wsgi.py for production serving.
+db = SQLAlchemy()
+bp = Blueprint('vault', __name__)
+# Routes accept either HTTP Basic or a bearer token from POST /auth/token
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth(scheme='Bearer')
+auth = MultiAuth(basic_auth, token_auth)
+
+def default_config():
+    """
+    Returns the default app settings. Most can be set with an environment variable of the same name.
+
+    Returns:
+        dict: Flask config keys and values.
+    """
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///creds.db'),    # relative sqlite paths are in instance/
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'STORAGE_PROFILE': os.environ.get('VAULT_STORAGE_PROFILE'),    # see db_config.py, None = default profile
+        'AUTH_CACHE_TTL': int(os.environ.get('AUTH_CACHE_TTL', DEFAULT_TTL)),    # seconds, 0 disables the cache
+        'AUTH_CACHE_MAX_ENTRIES': int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        'AUTH_TOKEN_TTL': int(os.environ.get('AUTH_TOKEN_TTL', 900)),    # seconds
+        'PASSWORD_HASH_METHOD': os.environ.get('VAULT_PASSWORD_HASH', DEFAULT_PASSWORD_HASH_METHOD),    # see password_hashing.py
+        'BULK_MAX_ITEMS': int(os.environ.get('BULK_MAX_ITEMS', 5000)),    # max credentials per POST /creds/bulk
+        'BATCH_MAX_ITEMS': int(os.environ.get('BATCH_MAX_ITEMS', 1000)),    # max services per POST /creds/batch
+        'SEARCH_DEFAULT_LIMIT': int(os.environ.get('SEARCH_DEFAULT_LIMIT', 50)),    # matches per GET /creds/search without ?limit
+        'SEARCH_MAX_LIMIT': int(os.environ.get('SEARCH_MAX_LIMIT', 500)),
+        'CRED_CACHE_TTL': int(os.environ.get('VAULT_CRED_CACHE_TTL', DEFAULT_CRED_CACHE_TTL)),    # seconds, 0 disables the credential row cache
+        'CRED_CACHE_MAX_ENTRIES': int(os.environ.get('VAULT_CRED_CACHE_MAX_ENTRIES', DEFAULT_CRED_CACHE_MAX_ENTRIES)),
+        'RAW_READS': os.environ.get('VAULT_RAW_READS', '1') == '1',    # raw sqlite3 reads for GET /creds/<service> and /services/<service>
+        'PAGE_MAX_LIMIT': int(os.environ.get('PAGE_MAX_LIMIT', 10000)),    # max ?limit of GET /services and GET /users
+        'INIT_DB': os.environ.get('VAULT_INIT_DB', '1') == '1',    # create tables and run migrations in create_app
+        'ADMIN_USERNAME': os.environ.get('VAULT_ADMIN_USERNAME'),    # first API user, created if the users table is empty
+        'ADMIN_PASSWORD': os.environ.get('VAULT_ADMIN_PASSWORD'),
+        'ADMIN_EMAIL': os.environ.get('VAULT_ADMIN_EMAIL'),
+        'METRICS_ENABLED': os.environ.get('VAULT_METRICS', '1') == '1',    # record metrics and serve GET /metrics, see metrics.py
+        'METRICS_AUTH': os.environ.get('VAULT_METRICS_AUTH', '1') == '1',    # require authentication for GET /metrics
+        'COMPRESSION_ENABLED': os.environ.get('VAULT_COMPRESSION', '1') == '1',    # gzip/deflate/br/zstd responses, see response_compression.py
+        'COMPRESSION_MIN_SIZE': int(os.environ.get('VAULT_COMPRESSION_MIN_SIZE', 1024)),    # bytes, smaller responses are sent uncompressed
+        'COMPRESSION_LEVEL': int(os.environ.get('VAULT_COMPRESSION_LEVEL', 6)),    # zlib level for gzip and deflate
+        'PROFILE_ALL': os.environ.get('VAULT_PROFILE', '0') == '1',    # cProfile every request, see profiling.py
+        'PROFILE_SECRET': os.environ.get('VAULT_PROFILE_SECRET'),    # cProfile requests sending 'X-Vault-Profile: <secret>'
+        'PROFILE_DIR': os.environ.get('VAULT_PROFILE_DIR', 'profiles'),
+    }
+
+def hash_password(password):
+    """
+    Hashes a password with the app's PASSWORD_HASH_METHOD. Must be called inside an app context.
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///creds.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    Parameters:
+        password (str): The plaintext password.
 
-db = SQLAlchemy(app)
-auth = HTTPBasicAuth()
+    Returns:
+        str: The password hash.
+    """
+    start = time.perf_counter()
+    try:
+        return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+    finally:
+        metrics.observe_since(metrics.PASSWORD_HASH_SECONDS, start, 'generate')
+
+def hash_fingerprint(password_hash):
+    """
+    Returns a short digest of a password hash, see User.password_fingerprint.
+
+    Parameters:
+        password_hash (str): A stored password hash.
+
+    Returns:
+        str: Hex digest identifying the password hash.
+    """
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,18 +113,12 @@ class User(db.Model):
     
     def set_password(self, password):
         """
-        Retrieves a credential from the database based on the provided service name.
-
-        This route handler handles the 'GET' request to '/services/{service}' endpoint. It requires the user to be authenticated using the `@auth.login_required` decorator.
+        Hash the given password with the app's PASSWORD_HASH_METHOD and store it in the object. Must be called inside an app context.
 
         Parameters:
-            service (str): The name of the service for which the credential is requested.
-
-        Returns:
-            - If a credential with the provided service name is found, a JSON response containing the message "True" is returned.
-            - If no credential with the provided service name is found, a JSON response containing the message "False" is returned.
+            password (str): The plaintext password.
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """
@@ -52,7 +130,20 @@ class User(db.Model):
         Returns:
             bool: True if the password matches the hashed password, False otherwise.
         """
-        return check_password_hash(self.password_hash, password)
+        start = time.perf_counter()
+        try:
+            return check_password_hash(self.password_hash, password)
+        finally:
+            metrics.observe_since(metrics.PASSWORD_HASH_SECONDS, start, 'check')
+
+    def password_fingerprint(self):
+        """
+        Returns a short digest of the stored password hash. Embedded in bearer tokens so that changing the password revokes them.
+
+        Returns:
+            str: Hex digest identifying the current password hash.
+        """
+        return hash_fingerprint(self.password_hash)
     
     def __repr__(self):
         """
@@ -67,8 +158,9 @@ class Credential(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False)
     password = db.Column(db.String(128), nullable=False)
-    service = db.Column(db.String(80), nullable=False)
+    service = db.Column(db.String(80), unique=True, index=True, nullable=False)
     note = db.Column(db.String(200), nullable=True)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')    # set by triggers, unique across rows and their lifetimes, see migrations.unique_credential_revisions
 
     def set_password(self, password):
         self.password = ci.encrypt_password(password)
@@ -85,26 +177,232 @@ class Credential(db.Model):
         """
         return f"Credential(username={self.username}, password={self.password}, service={self.service}, note={self.note})"
 
+class TableRevision(db.Model):
+    # Change counter per table, bumped by triggers when rows are added or removed (see migrations.add_revisions)
+    name = db.Column(db.String(80), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False)
+
+# Row of the credential columns returned by the read paths below. Being a tuple, it is built without any ORM bookkeeping.
+CredentialRow = namedtuple('CredentialRow', ['id', 'username', 'password', 'service', 'note', 'revision'])
+
+class OrmCredentialReads:
+    """
+    Read path of the single-credential routes through the ORM. Used when RAW_READS is off or the database is not SQLite.
+    """
+
+    def get_by_service(self, service):
+        """
+        Returns:
+            CredentialRow or None: The credential of the service, None if it does not exist.
+        """
+        cred = Credential.query.filter_by(service=service).first()
+        if cred is None:
+            return None
+        return CredentialRow(cred.id, cred.username, cred.password, cred.service, cred.note, cred.revision)
+
+    def service_exists(self, service):
+        return Credential.query.filter_by(service=service).first() is not None
+
+class SQLiteCredentialReads(OrmCredentialReads):
+    """
+    Low-overhead read path of the hot 'GET /creds/{service}' and 'GET /services/{service}' routes.
+
+    The statements run directly on the sqlite3 connection the request's session already holds from the pool, so no second
+    connection is checked out and the storage profile PRAGMAs apply. sqlite3 keeps the prepared statements cached per connection.
+    This skips SQLAlchemy's statement compilation, result processing and identity map; rows come back as plain tuples.
+    Writes keep using the ORM models. Unflushed ORM changes are not seen, so only use it in read-only routes.
+    """
+
+    GET_BY_SERVICE = "SELECT id, username, password, service, note, revision FROM credential WHERE service = ?"
+    SERVICE_EXISTS = "SELECT 1 FROM credential WHERE service = ?"
+
+    def fetch_one(self, statement, parameters):
+        """
+        Runs one statement on the session's sqlite3 connection, timed in the SQL metrics like statements sent through the engine.
+
+        Returns:
+            tuple or None: The first row.
+        """
+        start = time.perf_counter()
+        row = db.session.connection().connection.driver_connection.execute(statement, parameters).fetchone()
+        metrics.observe_since(metrics.SQL_SECONDS, start)
+        return row
+
+    def get_by_service(self, service):
+        row = self.fetch_one(self.GET_BY_SERVICE, (service,))
+        return CredentialRow._make(row) if row else None
+
+    def service_exists(self, service):
+        return self.fetch_one(self.SERVICE_EXISTS, (service,)) is not None
+
+class CachedCredentialReads:
+    """
+    Read-through cache in front of another read path, see row_cache.py. Hot services are answered from memory without touching SQLite.
+    """
+
+    def __init__(self, reads, cache):
+        """
+        Parameters:
+            reads (OrmCredentialReads): The read path used on cache misses.
+            cache (CredentialRowCache): The row cache.
+        """
+        self.reads = reads
+        self.cache = cache
+        self._cipher_suite = None
+
+    def check_keys(self):
+        # cached ciphertext may use a key that a rotation is about to retire, start over whenever the keys are reloaded
+        cipher_suite = ci.get_cipher_suite()
+        if cipher_suite is not self._cipher_suite:
+            self.cache.clear()
+            self._cipher_suite = cipher_suite
+
+    def get_by_service(self, service):
+        self.check_keys()
+        row = self.cache.get(service)
+        if row is None:
+            token = self.cache.read_token()
+            row = self.reads.get_by_service(service)
+            if row is not None:
+                self.cache.put(service, row, token)
+        return row
+
+    def service_exists(self, service):
+        # fetching the whole row costs SQLite about as much as the existence check, and caches it for both routes
+        return self.get_by_service(service) is not None
+
+def invalidate_credential(service):
+    """
+    Drops a service from the credential row cache. Call after committing any change to its credential.
+    """
+    cache = current_app.extensions['cred_cache']
+    if cache.enabled:
+        cache.invalidate(service)
+
+def get_credential_reads():
+    """
+    Returns:
+        OrmCredentialReads: The read path of the current app, see create_app.
+    """
+    return current_app.extensions['credential_reads']
+
+def create_app(config=None):
+    """
+    Builds the Flask app: loads settings, binds the database, registers the routes and prepares the database.
+
+    Nothing here prompts for input. Missing keys are generated into config/config.json, and the first API user is only created
+    if ADMIN_USERNAME and ADMIN_PASSWORD are set (see bootstrap_admin).
+
+    Parameters:
+        config (dict, optional): Settings overriding default_config(), e.g. {'SQLALCHEMY_DATABASE_URI': 'sqlite:///test.db'}.
+
+    Returns:
+        flask.Flask: The configured app.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(default_config())
+    if config:
+        app.config.from_mapping(config)
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = get_or_gen_token_key()    # signs bearer tokens, shared by every process using config/config.json
+    configure_storage(app, app.config['STORAGE_PROFILE'])    # SQLite PRAGMAs and pool settings, see db_config.py
+
+    db.init_app(app)
+    app.extensions['auth_cache'] = VerifiedCredentialCache(ttl=app.config['AUTH_CACHE_TTL'], max_entries=app.config['AUTH_CACHE_MAX_ENTRIES'])
+    app.extensions['cred_cache'] = CredentialRowCache(ttl=app.config['CRED_CACHE_TTL'], max_entries=app.config['CRED_CACHE_MAX_ENTRIES'])
+    app.extensions['token_serializer'] = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='auth-token')
+    json_provider.install(app)    # orjson/msgspec JSON and MessagePack responses, see serialization.py
+    app.register_blueprint(bp)
+    metrics.configure(app.config['METRICS_ENABLED'])
+    if app.config['METRICS_ENABLED']:
+        app.before_request(start_request_timer)
+        app.after_request(record_request_metrics)
+    response_compression.install(app)    # registered after the metrics hook, so it runs first and is included in the request latency
+    profiling.install(app)    # only wraps the app if PROFILE_ALL or PROFILE_SECRET is set
+
+    with app.app_context():
+        register_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        if app.config['METRICS_ENABLED']:
+            metrics.register_sql_timing(db.engine)
+            metrics.register_pool_metrics(db.engine)
+            metrics.register_auth_cache_metrics(app.extensions['auth_cache'])
+            metrics.register_cred_cache_metrics(app.extensions['cred_cache'])
+        if app.config['INIT_DB']:
+            # Initialize the database and bring existing database files up to the current schema
+            db.create_all()
+            migrate(db.engine)
+            bootstrap_admin(app.config['ADMIN_USERNAME'], app.config['ADMIN_PASSWORD'], app.config['ADMIN_EMAIL'])
+        raw_reads = app.config['RAW_READS'] and db.engine.dialect.name == 'sqlite'
+        app.extensions['credential_reads'] = SQLiteCredentialReads() if raw_reads else OrmCredentialReads()
+        if app.extensions['cred_cache'].enabled:
+            app.extensions['credential_reads'] = CachedCredentialReads(app.extensions['credential_reads'], app.extensions['cred_cache'])
+        # the full-text index is missing if SQLite lacks FTS5 (see migrations.add_credential_search)
+        app.extensions['credential_search'] = inspect(db.engine).has_table('credential_fts')
+    return app
+
+def bootstrap_admin(username, password, email=None):
+    """
+    Creates the first API user when the users table is empty, so a new vault can be used without editing the code.
+    Must be called inside an app context.
 
-   
-# TODO: (2) Add the initial user to users database table on first script run
-# ADD INITIAL USER ON FIRST RUN   
-db_path = os.path.join(app.instance_path, 'creds.db')
-if not os.path.exists(db_path):
-    # stub
+    Parameters:
+        username (str): The username of the first user. Nothing is done if it is empty.
+        password (str): The password of the first user. Nothing is done if it is empty.
+        email (str, optional): The email of the first user. Defaults to '<username>@localhost'.
+
+    Returns:
+        bool: True if the user was created.
+    """
+    if not username or not password or db.session.query(User.id).first() is not None:
+        return False
     print("Creating initial user...")
+    user = User(username=username, email=email or f"{username}@localhost")
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    return True
 
-    
-    
-# Initialize the database
-with app.app_context():
-    db.create_all()
- 
-@auth.verify_password
+def reset_after_fork(app):
+    """
+    Drops database connections inherited from the parent process. Call in each worker after a pre-forking server forks (see gunicorn.conf.py),
+    the worker then opens its own connections, with the storage profile PRAGMAs applied, on first use.
+
+    Parameters:
+        app (flask.Flask): The app created before forking.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+def record_request_metrics(response):
+    """
+    Records the request's latency under its URL rule, method and status code. Registered by create_app when metrics are enabled.
+    """
+    start = g.get('request_start')
+    if start is not None:
+        # unmatched paths share one label, so probing random URLs can't create new series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_since(metrics.REQUEST_SECONDS, start, route, request.method, str(response.status_code))
+    return response
+
+def get_auth_cache():
+    """
+    Returns:
+        VerifiedCredentialCache: The verified-credential cache of the current app.
+    """
+    return current_app.extensions['auth_cache']
+
+@basic_auth.verify_password
 def verify_password(username, password):
     """
     Verify the provided username and password against the database.
 
+    Successful verifications are kept in `auth_cache` for AUTH_CACHE_TTL seconds, so repeat requests with the same
+    credentials skip the password hash check and only do a primary key lookup. A hit only counts if the user's password hash
+    is still the one that was verified, so a password changed through another worker is not accepted from the cache.
+
     Args:
         username (str): The username to verify.
         password (str): The password to verify.
@@ -112,11 +410,226 @@ def verify_password(username, password):
     Returns:
         User or None: The user object if the username and password are valid, None otherwise.
     """
+    cached = get_auth_cache().get(username, password)
+    if cached is not None:
+        user_id, fingerprint = cached
+        user = db.session.get(User, user_id)
+        if user and hmac.compare_digest(fingerprint, user.password_fingerprint()):
+            return user
+        get_auth_cache().invalidate_user(username)
+
     user = User.query.filter_by(username=username).first()
     if user and user.check_password(password):
+        verified_hash = rehash_if_outdated(user, password)
+        get_auth_cache().put(username, password, user.id, hash_fingerprint(verified_hash))
         return user
 
-@app.route('/users', methods=['POST'])
+def rehash_if_outdated(user, password):
+    """
+    Rehashes a user's password with PASSWORD_HASH_METHOD if the stored hash was made with other parameters.
+    Call only after the password has been verified. The new hash changes the password fingerprint, so the user's bearer tokens
+    have to be renewed once (client_auth.TokenAuth does so automatically).
+    The new hash is only written if the stored hash is still the verified one, so a password changed by another request
+    in the meantime is not reverted.
+
+    Args:
+        user (User): The user who just logged in.
+        password (str): The verified plaintext password.
+
+    Returns:
+        str: The password hash the password matches, the new one if it was rehashed.
+    """
+    old_hash = user.password_hash
+    if not needs_rehash(old_hash, current_app.config['PASSWORD_HASH_METHOD']):
+        return old_hash
+    new_hash = hash_password(password)
+    try:
+        updated = User.query.filter_by(id=user.id, password_hash=old_hash).update({'password_hash': new_hash}, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError:
+        # the login itself succeeded, try again next time
+        db.session.rollback()
+        return old_hash
+    return new_hash if updated else old_hash
+
+@token_auth.verify_token
+def verify_token(token):
+    """
+    Verify a bearer token issued by POST /auth/token.
+
+    The token signature and age are checked with itsdangerous, then the user is loaded by primary key. No password hashing is done.
+
+    Args:
+        token (str): The token sent in the 'Authorization: Bearer <token>' header.
+
+    Returns:
+        User or None: The user object if the token is valid, unexpired and issued for the user's current password, None otherwise.
+    """
+    try:
+        payload = current_app.extensions['token_serializer'].loads(token, max_age=current_app.config['AUTH_TOKEN_TTL'])
+    except (SignatureExpired, BadSignature):
+        return None
+    user = db.session.get(User, payload.get('uid'))
+    if user and hmac.compare_digest(payload.get('pwd', ''), user.password_fingerprint()):
+        return user
+
+@bp.route('/auth/token', methods=['POST'])
+@basic_auth.login_required
+def issue_token():
+    """
+    Issues a signed, expiring bearer token for the authenticated user.
+
+    This route handler handles the 'POST' request to '/auth/token' endpoint. It requires HTTP Basic authentication.
+    The token can then be sent as 'Authorization: Bearer <token>' to every other route until it expires.
+
+    Returns:
+        A JSON response with the keys 'token', 'token_type' and 'expires_in' (seconds).
+    """
+    user = basic_auth.current_user()
+    token = current_app.extensions['token_serializer'].dumps({"uid": user.id, "pwd": user.password_fingerprint()})
+    return jsonify({"token": token, "token_type": "Bearer", "expires_in": current_app.config['AUTH_TOKEN_TTL']})
+
+def table_revision(name):
+    """
+    Returns the current change counter of a table, used to build ETags for list endpoints.
+
+    Parameters:
+        name (str): The table name, 'credential' or 'user'.
+
+    Returns:
+        int: The table's revision.
+    """
+    return db.session.query(TableRevision.revision).filter_by(name=name).scalar()
+
+def conditional_response(etag, build_body):
+    """
+    Builds a response carrying an ETag, answering 304 Not Modified if the client already has that version.
+
+    Parameters:
+        etag (str): The entity tag of the current version of the resource.
+        build_body (callable): Called with no arguments to build the JSON body. Only called if the client's copy is stale,
+            so expensive work such as decryption is skipped for unchanged resources.
+
+    Returns:
+        flask.Response: Either a 304 response with no body or a JSON response.
+    """
+    if json_provider.wants_msgpack():
+        etag += '-msgpack'    # each representation of the resource needs its own entity tag
+    if request.if_none_match.contains_weak(etag):    # weak comparison, compressed responses carry W/"<etag>" (see response_compression.py)
+        response = current_app.response_class(status=304)
+        if serialization.msgpack is not None:
+            response.vary.add('Accept')
+    else:
+        response = jsonify(build_body())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def page_args(after_type=str):
+    """
+    Reads the keyset pagination arguments of a list route, '?limit={n}&after={cursor}'.
+
+    Parameters:
+        after_type (type): The type of the cursor, the sort key of the listed rows.
+
+    Returns:
+        tuple: (limit, after, error). limit is None if the whole list was requested, after is None for the first page,
+            error is a message for a 400 response or None.
+    """
+    limit = after = None
+    if 'limit' in request.args:
+        limit = request.args.get('limit', type=int)
+        if limit is None or not 1 <= limit <= current_app.config['PAGE_MAX_LIMIT']:
+            return None, None, f"Invalid limit, use 1 to {current_app.config['PAGE_MAX_LIMIT']}!"
+    if 'after' in request.args:
+        after = request.args.get('after', type=after_type)
+        if after is None:
+            return None, None, "Invalid after!"
+    return limit, after, None
+
+def paginate(query, key, limit, after):
+    """
+    Returns one page of a query ordered by a unique column. The page starts right after the row whose key is `after`, so it is
+    found with an index seek however deep into the list it is, and rows added or removed meanwhile never shift it.
+
+    Parameters:
+        query (sqlalchemy.orm.Query): The rows to list.
+        key (sqlalchemy.orm.InstrumentedAttribute): A unique, indexed column the rows are ordered by, e.g. Credential.service.
+        limit (int): Rows per page, None for every row.
+        after: The key of the last row of the previous page, None for the first page.
+
+    Returns:
+        tuple: (rows, next_after) where next_after is the cursor of the next page, None if this was the last one.
+    """
+    if after is not None:
+        query = query.filter(key > after)
+    query = query.order_by(key)
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()    # one extra row tells whether there is a next page
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], getattr(rows[limit - 1], key.key)
+
+def paged_response(etag, build_page, limit):
+    """
+    Builds the response of one page of a list route. If there is a next page, its URL is sent in a 'Link: <url>; rel="next"' header.
+
+    Parameters:
+        etag (str): The entity tag of the current version of the list.
+        build_page (callable): Called with no arguments to run the list query, returns (body, next_after). Like the body of
+            conditional_response it is only called if the client's copy is stale, so a 304 never queries the list.
+            The 304 carries no 'Link' header, the client keeps the one of its cached page.
+        limit (int): The page size, None if the whole list was requested.
+
+    Returns:
+        flask.Response: Either a 304 response with no body or a JSON response.
+    """
+    next_after = None
+    def build_body():
+        nonlocal next_after
+        body, next_after = build_page()
+        return body
+    response = conditional_response(etag, build_body)
+    if next_after is not None:
+        response.headers['Link'] = f'<{url_for(request.endpoint, **{**request.args, "limit": limit, "after": next_after})}>; rel="next"'
+    return response
+
+@bp.route('/auth/cache', methods=['GET'])
+@auth.login_required
+def get_auth_cache_stats():
+    """
+    Returns the hit/miss counters of the verified-credential cache.
+
+    This route handler handles the 'GET' request to '/auth/cache' endpoint. It requires the user to be authenticated using the `@auth.login_required` decorator.
+
+    Returns:
+        A JSON response with the keys 'enabled', 'hits', 'misses', 'hit_rate', 'size', 'max_entries' and 'ttl'.
+    """
+    return jsonify(get_auth_cache().stats())
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Returns the app's metrics in the Prometheus text exposition format, see metrics.py.
+
+    This route handler handles the 'GET' request to '/metrics' endpoint. Unless METRICS_AUTH is disabled, it requires the user to be
+    authenticated like every other route.
+
+    Returns:
+        A text/plain response with request, password hashing, cipher and SQL histograms and pool and auth cache figures.
+        A 404 JSON response if metrics are disabled.
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({"message": "Metrics are disabled!"}), 404
+    if current_app.config['METRICS_AUTH']:
+        return auth.login_required(render_metrics)()
+    return render_metrics()
+
+def render_metrics():
+    return current_app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/users', methods=['POST'])
 @auth.login_required
 def add_user():
     """
@@ -131,15 +644,25 @@ def add_user():
     Returns:
         A JSON response with a message indicating the success of the user addition.
         The response has a status code of 201.
+        If the username is already taken, returns a JSON response with a 'User already exists!' message and a status code of 409.
+        If the email is already used by another user, returns a JSON response with an 'Email already in use!' message and a status code of 409.
     """
     data = request.get_json()
     new_user = User(username=data['username'], email=data['email'])
     new_user.set_password(data['password'])
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # username and email are both unique, tell the client which one clashed
+        if db.session.query(User.id).filter_by(username=data['username']).first() is None \
+                and db.session.query(User.id).filter_by(email=data['email']).first() is not None:
+            return jsonify({"message": "Email already in use!"}), 409
+        return jsonify({"message": "User already exists!"}), 409
     return jsonify({"message": "New user added successfully!"}), 201
 
-@app.route('/users', methods=['GET'])
+@bp.route('/users', methods=['GET'])
 @auth.login_required
 def get_users():
     """
@@ -154,12 +677,19 @@ def get_users():
         - 'id' (int): The unique identifier of the user.
         - 'username' (str): The username of the user.
         - 'email' (str): The email address of the user.
+        Users are listed by id. With '?limit={n}', at most n users are returned, and if there are more, the 'Link' header holds the URL
+        of the next page ('?limit={n}&after={last id}'). If limit or after is invalid, returns a 400 status code.
+        The response carries an ETag. If it matches the request's If-None-Match header, a 304 response with no body is returned instead.
     """
-    users = User.query.all()
-    users_list = [{"id":user.id, "username":user.username, "email":user.email} for user in users]
-    return jsonify(users_list)
+    limit, after, error = page_args(int)
+    if error:
+        return jsonify({"message": error}), 400
+    def build_page():
+        users, next_after = paginate(db.session.query(User.id, User.username, User.email), User.id, limit, after)
+        return [{"id":user.id, "username":user.username, "email":user.email} for user in users], next_after
+    return paged_response(f"users-{table_revision('user')}", build_page, limit)
     
-@app.route('/users/<string:username>', methods=['PUT'])
+@bp.route('/users/<string:username>', methods=['PUT'])
 @auth.login_required
 def update_user_password(username):
     """
@@ -177,10 +707,11 @@ def update_user_password(username):
         data = request.get_json()
         user.set_password(data['password'])
         db.session.commit()
+        get_auth_cache().invalidate_user(username)
         return jsonify({"message": "User updated successfully!"})
     return jsonify({"message": "User not found!"}), 404
 
-@app.route('/users/<string:username>', methods=['DELETE'])
+@bp.route('/users/<string:username>', methods=['DELETE'])
 @auth.login_required
 def delete_user(username):
     """
@@ -197,10 +728,11 @@ def delete_user(username):
     if user:
         db.session.delete(user)
         db.session.commit()
+        get_auth_cache().invalidate_user(username)
         return jsonify({"message": "User deleted successfully!"})
     return jsonify({"message": "User not found!"}), 404
 
-@app.route('/users/<string:username>', methods=['GET'])
+@bp.route('/users/<string:username>', methods=['GET'])
 @auth.login_required
 def check_user(username):
     """
@@ -216,7 +748,7 @@ def check_user(username):
         return jsonify({"message": "True"})
     return jsonify({"message": "False"})
 
-@app.route('/creds', methods=['POST'])
+@bp.route('/creds', methods=['POST'])
 @auth.login_required
 def add_cred():
     """
@@ -230,6 +762,7 @@ def add_cred():
     Returns:
         A JSON response with a message indicating the success of the credential addition.
         The response has a status code of 201.
+        If a credential for the service already exists, returns a JSON response with a 'Credential already exists!' message and a status code of 409.
 
     Raises:
         None
@@ -238,9 +771,133 @@ def add_cred():
     new_cred = Credential(username=data['username'], service=data['service'], note=data['note'])
     new_cred.set_password(data['password'])
     db.session.add(new_cred)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Credential already exists!"}), 409
+    invalidate_credential(new_cred.service)
     return jsonify({'message': "New credential added successfully!"}), 201
 
+# SQLite limits the number of bound parameters per statement, keep IN (...) lists below it
+SQL_IN_CHUNK_SIZE = 500
+
+def validate_cred_data(data):
+    """
+    Checks that a credential object from a request body has the fields required to create a credential.
+
+    Parameters:
+        data: One decoded JSON value from the request body.
+
+    Returns:
+        str or None: A message describing the problem, or None if the credential is valid.
+    """
+    if not isinstance(data, dict):
+        return "Credential must be a JSON object!"
+    for field in ('username', 'password', 'service'):
+        if not isinstance(data.get(field), str) or not data[field]:
+            return f"Missing or invalid field: {field}"
+    if data.get('note') is not None and not isinstance(data['note'], str):
+        return "Invalid field: note"
+    return None
+
+def cred_to_dict(cred):
+    """
+    Builds the JSON representation of a credential returned by the API, decrypting its password.
+
+    Parameters:
+        cred (Credential | CredentialRow): The credential to serialize.
+
+    Returns:
+        dict: The keys 'id', 'username', 'password', 'service' and 'note'.
+    """
+    return {"id":cred.id, "username":cred.username, "password":ci.decrypt_password(cred.password), "service":cred.service, "note":cred.note}
+
+def service_chunks(services):
+    """
+    Splits a list of service names into chunks small enough for one IN (...) query.
+
+    Parameters:
+        services (list): Service names.
+
+    Yields:
+        list: The next chunk of at most SQL_IN_CHUNK_SIZE service names.
+    """
+    for start in range(0, len(services), SQL_IN_CHUNK_SIZE):
+        yield services[start:start + SQL_IN_CHUNK_SIZE]
+
+def find_existing_services(services):
+    """
+    Returns the subset of the given service names that already have a credential, using indexed IN (...) queries.
+
+    Parameters:
+        services (list): Service names to look up.
+
+    Returns:
+        set: The service names that exist in the database.
+    """
+    existing = set()
+    for chunk in service_chunks(services):
+        rows = db.session.query(Credential.service).filter(Credential.service.in_(chunk)).all()
+        existing.update(row.service for row in rows)
+    return existing
+
+@bp.route('/creds/bulk', methods=['POST'])
+@auth.login_required
+def add_creds_bulk():
+    """
+    Adds many credentials to the database in a single transaction.
+
+    This route handler handles the 'POST' request to '/creds/bulk' endpoint. It requires the user to be authenticated using the `@auth.login_required` decorator.
+    The request body is a JSON array of credential objects with the same keys as 'POST /creds' ('username', 'password', 'service', 'note').
+
+    Returns:
+        A JSON response with the following keys:
+        - 'created' (int): The number of credentials added.
+        - 'results' (list): One entry per submitted item, in request order, with the keys 'service', 'status' and 'message'.
+          'status' is 201 if the credential was added, 409 if the service already exists (in the database or earlier in the same request),
+          and 400 if the item is invalid.
+        If the body is not a JSON array, returns a 400 status code. If it has more than BULK_MAX_ITEMS items, returns a 413 status code.
+        If a concurrent write adds one of the services before the transaction commits, nothing is added and a 409 status code is returned.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify({"message": "Request body must be a JSON array of credentials!"}), 400
+    if len(data) > current_app.config['BULK_MAX_ITEMS']:
+        return jsonify({"message": f"Too many credentials, send at most {current_app.config['BULK_MAX_ITEMS']} per request!"}), 413
+
+    results = []
+    pending = {}    # service -> index in results, for items that passed validation
+    for item in data:
+        error = validate_cred_data(item)
+        service = item.get('service') if isinstance(item, dict) else None
+        if error:
+            results.append({"service": service, "status": 400, "message": error})
+        elif service in pending:
+            results.append({"service": service, "status": 409, "message": "Duplicate service in request!"})
+        else:
+            pending[service] = len(results)
+            results.append({"service": service, "status": 201, "message": "New credential added successfully!"})
+
+    for service in find_existing_services(list(pending)):
+        results[pending.pop(service)].update(status=409, message="Credential already exists!")
+
+    new_creds = []
+    for service, index in pending.items():
+        item = data[index]
+        new_cred = Credential(username=item['username'], service=service, note=item.get('note'))
+        new_cred.set_password(item['password'])
+        new_creds.append(new_cred)
+    db.session.add_all(new_creds)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "A credential was added concurrently, no credentials were added. Retry the request."}), 409
+    for new_cred in new_creds:
+        invalidate_credential(new_cred.service)
+    return jsonify({"created": len(new_creds), "results": results})
+
 # NOT CURRENTLY USED. DUMPa ALL CREDS DATA. Not ideal.
 # @app.route('/creds', methods=['GET'])
 # @auth.login_required
@@ -265,7 +922,7 @@ def add_cred():
 #     creds_list = [{"id":cred.id, "username":cred.username, "password":cred.get_password(), "service":cred.service} for cred in creds]
 #     return jsonify(creds_list)
 
-@app.route('/creds/<string:service>', methods=['GET'])
+@bp.route('/creds/<string:service>', methods=['GET'])
 @auth.login_required
 def get_cred(service):
     """
@@ -285,13 +942,108 @@ def get_cred(service):
           - 'service' (str): The service name for which the credential is used.
         - If no credential with the provided service name is found, a JSON response with a message indicating that the credential was not found is returned.
           The response has a status code of 404.
+        Found credentials carry an ETag. If it matches the request's If-None-Match header, a 304 response with no body is returned and the password is not decrypted.
     """
-    cred = Credential.query.filter_by(service=service).first()
+    return credential_response(service)
+
+def credential_response(service):
+    """
+    Builds the response of 'GET /creds/{service}'. Shared with 'GET /creds/search', which answers for a service named 'search'.
+    """
+    cred = get_credential_reads().get_by_service(service)
     if cred:
-        return jsonify({"id":cred.id, "username":cred.username, "password":cred.get_password(), "service":cred.service, "note":cred.note})
+        # revisions are never reused, even by a credential deleted and added again under the same id
+        return conditional_response(f"cred-{cred.revision}", lambda: cred_to_dict(cred))
     return jsonify({"message": "Credential not found!"}), 404
 
-@app.route('/creds/<string:service>', methods=['PUT'])
+def fts_query(text):
+    """
+    Turns user input into an FTS5 query matching credentials that contain every word of it, as a whole word or a word prefix.
+    Each word is quoted, so FTS5 operators and punctuation in the input are searched for literally instead of being interpreted.
+
+    Parameters:
+        text (str): The search text, e.g. 'git work'.
+
+    Returns:
+        str: The FTS5 MATCH expression, e.g. '"git"* "work"*'.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+def search_credentials(text, limit):
+    """
+    Finds credentials whose service or note contains every word of `text`, using the credential_fts index (see migrations.add_credential_search).
+    Without the index, the service and note columns are scanned for the whole text instead.
+
+    Parameters:
+        text (str): The search text.
+        limit (int): The maximum number of matches returned.
+
+    Returns:
+        list: (id, service, username, note) rows, best matches first.
+    """
+    if current_app.extensions['credential_search']:
+        return db.session.execute(text_clause("""
+            SELECT credential.id, credential.service, credential.username, credential.note
+            FROM credential_fts JOIN credential ON credential.id = credential_fts.rowid
+            WHERE credential_fts MATCH :query ORDER BY rank LIMIT :limit"""), {"query": fts_query(text), "limit": limit}).all()
+    return db.session.query(Credential.id, Credential.service, Credential.username, Credential.note).filter(
+        Credential.service.contains(text, autoescape=True) | Credential.note.contains(text, autoescape=True)
+    ).order_by(Credential.service).limit(limit).all()
+
+@bp.route('/creds/search', methods=['GET'])
+@auth.login_required
+def search_creds():
+    """
+    Searches credentials by words of their service name or note.
+
+    This route handler handles the 'GET' request to '/creds/search?q={text}&limit={n}' endpoint. It requires the user to be authenticated using the `@auth.login_required` decorator.
+    Every word of 'q' must match the start of a word in the service or the note, e.g. 'git work' finds the service 'github-work'.
+
+    Returns:
+        A JSON response containing a list of dictionaries with the keys 'id', 'service', 'username' and 'note', best matches first.
+        Passwords are not returned, fetch them with 'GET /creds/{service}' or 'POST /creds/batch'.
+        At most 'limit' matches are returned, SEARCH_DEFAULT_LIMIT by default and never more than SEARCH_MAX_LIMIT.
+        If 'q' is empty, returns a 400 status code. Without 'q', the credential of a service named 'search' is returned like 'GET /creds/search' did before this route existed.
+    """
+    text = request.args.get('q')
+    if text is None:
+        return credential_response('search')
+    if not text.strip():
+        return jsonify({"message": "Missing search text!"}), 400
+    limit = request.args.get('limit', current_app.config['SEARCH_DEFAULT_LIMIT'], type=int)
+    limit = max(1, min(limit, current_app.config['SEARCH_MAX_LIMIT']))
+    rows = search_credentials(text, limit)
+    return jsonify([{"id": row.id, "service": row.service, "username": row.username, "note": row.note} for row in rows])
+
+@bp.route('/creds/batch', methods=['POST'])
+@auth.login_required
+def get_creds_batch():
+    """
+    Retrieves the credentials of many services in one request.
+
+    This route handler handles the 'POST' request to '/creds/batch' endpoint. It requires the user to be authenticated using the `@auth.login_required` decorator.
+    The request body is a JSON object with the key 'services', a list of service names.
+
+    Returns:
+        A JSON object mapping every requested service name to either the same credential dictionary returned by 'GET /creds/{service}',
+        or {"message": "Credential not found!"} if the service does not exist.
+        If 'services' is missing or not a list of strings, returns a 400 status code. If it has more than BATCH_MAX_ITEMS names, returns a 413 status code.
+    """
+    data = request.get_json(silent=True)
+    services = data.get('services') if isinstance(data, dict) else None
+    if not isinstance(services, list) or not all(isinstance(service, str) for service in services):
+        return jsonify({"message": "Request body must be a JSON object with a list of 'services'!"}), 400
+    services = list(dict.fromkeys(services))    # drop repeats, keep order
+    if len(services) > current_app.config['BATCH_MAX_ITEMS']:
+        return jsonify({"message": f"Too many services, request at most {current_app.config['BATCH_MAX_ITEMS']} per request!"}), 413
+
+    creds = {service: {"message": "Credential not found!"} for service in services}
+    for chunk in service_chunks(services):
+        for cred in Credential.query.filter(Credential.service.in_(chunk)):
+            creds[cred.service] = cred_to_dict(cred)
+    return jsonify(creds)
+
+@bp.route('/creds/<string:service>', methods=['PUT'])
 @auth.login_required
 def update_cred(service):
     """
@@ -310,10 +1062,11 @@ def update_cred(service):
         cred.username = data['username']
         cred.set_password(data['password'])
         db.session.commit()
+        invalidate_credential(service)
         return jsonify({"message": "Credential updated successfully!"})
     return jsonify({"message": "Credential not found!"}), 404
 
-@app.route('/creds/<string:service>/note', methods=['PUT'])
+@bp.route('/creds/<string:service>/note', methods=['PUT'])
 @auth.login_required
 def set_note(service):
     """
@@ -331,10 +1084,11 @@ def set_note(service):
         data = request.get_json()
         cred.note = data['note']
         db.session.commit()
+        invalidate_credential(service)
         return jsonify({"message": "Note updated successfully!"})
     return jsonify({"message": "Credential not found!"}), 404
 
-@app.route('/creds/<string:service>', methods=['DELETE'])
+@bp.route('/creds/<string:service>', methods=['DELETE'])
 @auth.login_required
 def delete_cred(service):
     """
@@ -351,10 +1105,50 @@ def delete_cred(service):
     if cred:
         db.session.delete(cred)
         db.session.commit()
+        invalidate_credential(service)
         return jsonify({"message": "Credential deleted successfully!"})
     return jsonify({"message": "Credential not found!"}), 404
 
-@app.route('/services', methods=['GET'])
+def prefix_upper_bound(prefix):
+    """
+    Returns the smallest string greater than every string starting with `prefix`, or None if there is none.
+    SQLite compares text by its UTF-8 bytes, which orders strings like their code points, so incrementing the last code point is enough.
+
+    Parameters:
+        prefix (str): A non-empty prefix.
+
+    Returns:
+        str or None: The exclusive upper bound of the prefix range, e.g. 'git' -> 'giu'.
+    """
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000    # surrogates can't be encoded, skip them
+        if code <= 0x10FFFF:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+def services_with_prefix(query, prefix):
+    """
+    Narrows a credential query to the services starting with `prefix`. The range condition service >= prefix AND service < upper bound
+    is answered from the unique index on credential.service, only the matching index entries are read.
+    (LIKE 'prefix%' would not use the index, since SQLite's LIKE is case-insensitive by default.)
+
+    Parameters:
+        query (sqlalchemy.orm.Query): A query over the credential table.
+        prefix (str): A non-empty prefix.
+
+    Returns:
+        sqlalchemy.orm.Query: The filtered query.
+    """
+    query = query.filter(Credential.service >= prefix)
+    upper = prefix_upper_bound(prefix)
+    if upper is not None:
+        query = query.filter(Credential.service < upper)
+    return query
+
+@bp.route('/services', methods=['GET'])
 @auth.login_required
 def get_services():
     """
@@ -364,12 +1158,26 @@ def get_services():
 
     Returns:
         A JSON response containing a list of unique services. Each service is represented as a string.
+        Services are sorted and read from the service index alone, credential rows are never loaded.
+        With '?prefix={text}', only the services starting with that text are returned. They are read with a range scan of the
+        index, so the cost depends on the number of matches rather than the size of the vault.
+        With '?limit={n}', at most n services are returned, and if there are more, the 'Link' header holds the URL of the next page
+        ('?limit={n}&after={last service}'). If limit is invalid, returns a 400 status code.
+        The response carries an ETag. If it matches the request's If-None-Match header, a 304 response with no body is returned instead.
     """
-    creds = Credential.query.all()
-    services = list(set([cred.service for cred in creds]))
-    return jsonify(services)
-
-@app.route('/services/<string:service>', methods=['GET'])
+    limit, after, error = page_args()
+    if error:
+        return jsonify({"message": error}), 400
+    query = db.session.query(Credential.service)    # service is unique, no DISTINCT needed
+    prefix = request.args.get('prefix')
+    if prefix:
+        query = services_with_prefix(query, prefix)
+    def build_page():
+        services, next_after = paginate(query, Credential.service, limit, after)
+        return [row.service for row in services], next_after
+    return paged_response(f"services-{table_revision('credential')}", build_page, limit)
+
+@bp.route('/services/<string:service>', methods=['GET'])
 @auth.login_required
 def check_service(service):
     """
@@ -384,12 +1192,14 @@ def check_service(service):
         - If a credential with the provided service name is found, a JSON response containing the message "True" is returned.
         - If no credential with the provided service name is found, a JSON response containing the message "False" is returned.
     """
-    service_exists = Credential.query.filter_by(service=service).first()
-    if service_exists:
+    if get_credential_reads().service_exists(service):
         return jsonify({"message": "True"})
     return jsonify({"message": "False"})
 
 if __name__ == '__main__':
+    # Interactive development server: prompts for missing config credentials and uses them for the first API user
+    username, password = ci.bootstrap(interactive=True)
+    app = create_app({'ADMIN_USERNAME': username, 'ADMIN_PASSWORD': password})
     app.run(debug=False, host='0.0.0.0')
 
 
@@ -0,0 +1,429 @@
+'''
+    - asyncio client for the credentials API. Mirrors the functions in credentials.py and authusers.py as coroutines on AsyncVaultClient, so
+      services fetching many secrets can run requests concurrently instead of one at a time.
+    - One httpx.AsyncClient (and connection pool) is shared by every call. A semaphore caps the number of requests in flight, and every
+      method accepts a per-call timeout.
+    - Authentication works like VaultClient: a bearer token is requested once per username/password and renewed transparently.
+    - Return values and printed messages match the synchronous functions.
+
+    Usage:
+        async with AsyncVaultClient(concurrency=20) as client:
+            creds = await client.gather_credentials(services, auth_username, auth_password)
+'''
+
+import asyncio
+import base64
+import time
+import httpx
+from vault_client import DEFAULT_BASE_URL, DEFAULT_TIMEOUT, TOKEN_PATH
+from client_auth import REFRESH_MARGIN
+from serialization import JSON_MIMETYPE, accept_header, decode_response, dumps
+
+DEFAULT_CONCURRENCY = 10         # requests in flight at once
+DEFAULT_MAX_CONNECTIONS = 20     # connections in the pool
+DEFAULT_MAX_KEEPALIVE = 10       # idle connections kept open
+BATCH_SIZE = 200                 # services per POST /creds/batch in gather_credentials
+
+CREDENTIALS_PATH = "/creds"
+SERVICE_PATH = "/services"
+USERS_PATH = "/users"
+
+class AsyncTokenAuth(httpx.Auth):
+    """
+    httpx auth flow sending 'Authorization: Bearer <token>', acquiring and refreshing the token transparently.
+    Behaves like client_auth.TokenAuth: a rejected token is replaced and the request resent once, and HTTP Basic is used if no token can be obtained.
+    """
+
+    def __init__(self, client, username, password):
+        """
+        Parameters:
+            client (httpx.AsyncClient): Client used to request tokens, so they reuse pooled connections.
+            username (str): The username for authentication.
+            password (str): The password for authentication.
+        """
+        self.client = client
+        self.username = username
+        self.password = password
+        self._basic = httpx.BasicAuth(username, password)
+        self._basic_header = "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+        self._token = None
+        self._expires_at = 0.0
+        self._token_unsupported = False
+        self._lock = asyncio.Lock()
+
+    async def _fetch_token(self):
+        try:
+            response = await self.client.post(TOKEN_PATH, auth=self._basic)
+        except httpx.HTTPError:
+            return None
+        if response.status_code in (404, 405):
+            # server predates token auth, stop asking
+            self._token_unsupported = True
+            return None
+        if response.status_code != 200:
+            return None
+        result = decode_response(response)
+        self._token = result['token']
+        self._expires_at = time.monotonic() + result.get('expires_in', 0)
+        return self._token
+
+    async def get_token(self):
+        """
+        Returns:
+            str or None: A token valid for at least REFRESH_MARGIN more seconds, or None if token auth is unavailable.
+        """
+        async with self._lock:
+            if self._token_unsupported:
+                return None
+            if self._token and time.monotonic() < self._expires_at - REFRESH_MARGIN:
+                return self._token
+            self._token = None
+            return await self._fetch_token()
+
+    def _apply(self, request, token):
+        if token:
+            request.headers['Authorization'] = f"Bearer {token}"
+        else:
+            request.headers['Authorization'] = self._basic_header
+
+    async def async_auth_flow(self, request):
+        token = await self.get_token()
+        self._apply(request, token)
+        response = yield request
+        if response.status_code == 401 and token:
+            async with self._lock:
+                if self._token == token:
+                    self._token = None
+            self._apply(request, await self.get_token())
+            yield request
+
+class AsyncVaultClient:
+    """
+    Connection-pooled asyncio client for the credentials API.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, max_connections=DEFAULT_MAX_CONNECTIONS, max_keepalive=DEFAULT_MAX_KEEPALIVE, msgpack=False, compress=True):
+        """
+        Parameters:
+            base_url (str): Scheme, host and port of the API, e.g. 'http://127.0.0.1:5000'.
+            timeout (float | tuple): Default seconds to wait for the server, or a (connect, read) tuple. Every method accepts its own `timeout`.
+            concurrency (int): Maximum number of requests in flight at once.
+            max_connections (int): Maximum number of connections in the pool.
+            max_keepalive (int): Maximum number of idle connections kept open.
+            msgpack (bool): Ask for MessagePack responses. Ignored if msgpack is not installed.
+            compress (bool): Accept compressed responses, decompressed transparently by httpx.
+        """
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        headers = {'Accept': accept_header(msgpack)}
+        if not compress:
+            headers['Accept-Encoding'] = 'identity'
+        self._client = httpx.AsyncClient(base_url=base_url.rstrip('/'), timeout=timeout, headers=headers,
+                                         limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive))
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._auth_handlers = {}
+
+    def auth(self, auth_username, auth_password):
+        """
+        Returns:
+            AsyncTokenAuth: The token auth flow for a set of credentials, created on first use.
+        """
+        key = (auth_username, auth_password)
+        if key not in self._auth_handlers:
+            self._auth_handlers[key] = AsyncTokenAuth(self._client, auth_username, auth_password)
+        return self._auth_handlers[key]
+
+    async def request(self, method, path, auth_username, auth_password, timeout=None, **kwargs):
+        """
+        Sends an authenticated request, waiting for a free concurrency slot first.
+
+        Parameters:
+            method (str): The HTTP method, e.g. 'GET'.
+            path (str): The API path, e.g. '/creds/github'.
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+            timeout (float, optional): Seconds to wait for this request. Defaults to the client's timeout.
+            **kwargs: Passed on to httpx.AsyncClient.request (json, params, headers, ...).
+
+        Returns:
+            httpx.Response: The response from the API.
+
+        Raises:
+            httpx.HTTPError: If there is an error with the request.
+        """
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        if 'json' in kwargs:
+            kwargs['content'] = dumps(kwargs.pop('json'))
+            kwargs['headers'] = {'Content-Type': JSON_MIMETYPE, **(kwargs.get('headers') or {})}
+        async with self._semaphore:
+            return await self._client.request(method, path, auth=self.auth(auth_username, auth_password), **kwargs)
+
+    async def aclose(self):
+        """
+        Closes every pooled connection.
+        """
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    # CREDENTIAL STORAGE INTERACTION (see credentials.py)
+    async def check_service_exists(self, service, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            bool: True if the service exists, False otherwise. None if the request failed.
+        """
+        try:
+            response = await self.request('GET', f"{SERVICE_PATH}/{service}", auth_username, auth_password, timeout)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)['message'] == "True"
+        except httpx.HTTPError as e:
+            print(f"Error checking service exists: {e}")
+
+    async def add_credential(self, service, username, password, note, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API. None if the service already exists or the request failed.
+        """
+        try:
+            data = {'username': username, 'password': password, 'service': service, 'note': note}
+            response = await self.request('POST', CREDENTIALS_PATH, auth_username, auth_password, timeout, json=data)
+            if response.status_code == 409:
+                print(f"Service '{service}' already exists.")
+                return
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error adding credential: {e}")
+
+    async def add_credentials(self, credential_list, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from POST /creds/bulk with 'created' and per-credential 'results'. None if the request failed.
+        """
+        try:
+            response = await self.request('POST', f"{CREDENTIALS_PATH}/bulk", auth_username, auth_password, timeout, json=credential_list)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error adding credentials: {e}")
+
+    async def delete_credential(self, service, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API, {"message": "Credential not found!"} if the service does not exist. None if the request failed.
+        """
+        try:
+            response = await self.request('DELETE', f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password, timeout)
+            if response.status_code == 404:
+                print(f"Service '{service}' does not exist.")
+                return {"message": "Credential not found!"}
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error deleting credential: {e}")
+
+    async def get_services(self, auth_username, auth_password, timeout=None, prefix=None):
+        """
+        Returns:
+            list: The names of all services, or only those starting with `prefix` (sorted). None if the request failed.
+        """
+        try:
+            response = await self.request('GET', SERVICE_PATH, auth_username, auth_password, timeout, params={"prefix": prefix} if prefix else None)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error getting all services: {e}")
+
+    async def search_credentials(self, query, auth_username, auth_password, limit=None, timeout=None):
+        """
+        Returns:
+            list: Credentials whose service or note match every word of `query`, without passwords. None if the request failed.
+        """
+        params = {"q": query}
+        if limit is not None:
+            params["limit"] = limit
+        try:
+            response = await self.request('GET', f"{CREDENTIALS_PATH}/search", auth_username, auth_password, timeout, params=params)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error searching credentials: {e}")
+
+    async def get_credential(self, service, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The credential, {"message": "Credential not found!"} if the service does not exist. None if the request failed.
+        """
+        try:
+            response = await self.request('GET', f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password, timeout)
+            if response.status_code == 404:
+                print(f"Service '{service}' does not exist.")
+                return {"message": "Credential not found!"}
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error getting credential by service: {e}")
+
+    async def get_credentials(self, services, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: Maps each service name to its credential or to {"message": "Credential not found!"}. None if the request failed.
+        """
+        try:
+            response = await self.request('POST', f"{CREDENTIALS_PATH}/batch", auth_username, auth_password, timeout, json={'services': list(services)})
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error getting credentials by service: {e}")
+
+    async def gather_credentials(self, services, auth_username, auth_password, batch_size=BATCH_SIZE, timeout=None):
+        """
+        Retrieves any number of credentials by splitting the services into POST /creds/batch requests and sending them concurrently.
+
+        Parameters:
+            services (list): The names of the services for which to retrieve credentials.
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+            batch_size (int, optional): Services per request. Defaults to BATCH_SIZE.
+            timeout (float, optional): Seconds to wait for each request.
+
+        Returns:
+            dict: Maps each service name to its credential or to {"message": "Credential not found!"}. Services from a failed request are missing.
+        """
+        services = list(dict.fromkeys(services))
+        batches = [services[start:start + batch_size] for start in range(0, len(services), batch_size)]
+        results = await asyncio.gather(*(self.get_credentials(batch, auth_username, auth_password, timeout) for batch in batches))
+        creds = {}
+        for result in results:
+            if result:
+                creds.update(result)
+        return creds
+
+    async def update_credential(self, service, username, password, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API, {"message": "Credential not found!"} if the service does not exist. None if the request failed.
+        """
+        try:
+            data = {'username': username, 'password': password}
+            response = await self.request('PUT', f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password, timeout, json=data)
+            if response.status_code == 404:
+                print(f"Service '{service}' does not exist.")
+                return {"message": "Credential not found!"}
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error updating credential: {e}")
+
+    async def set_note(self, service, note, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API, {"message": "Credential not found!"} if the service does not exist. None if the request failed.
+        """
+        try:
+            response = await self.request('PUT', f"{CREDENTIALS_PATH}/{service}/note", auth_username, auth_password, timeout, json={'note': note})
+            if response.status_code == 404:
+                print(f"Service '{service}' does not exist.")
+                return {"message": "Credential not found!"}
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error setting note: {e}")
+
+    # AUTH USERS INTERACTION (see authusers.py)
+    async def check_user_exists(self, username, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            bool: True if the user exists, False otherwise. None if the request failed.
+        """
+        try:
+            response = await self.request('GET', f"{USERS_PATH}/{username}", auth_username, auth_password, timeout)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)['message'] == "True"
+        except httpx.HTTPError as e:
+            print(f"Error checking user exists: {e}")
+
+    async def add_user(self, username, email, password, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API. None if the user already exists or the request failed.
+        """
+        try:
+            data = {'username': username, 'email': email, 'password': password}
+            response = await self.request('POST', USERS_PATH, auth_username, auth_password, timeout, json=data)
+            if response.status_code == 409:
+                if decode(response).get('message') == "Email already in use!":
+                    print(f"Email '{email}' is already used by another user.")
+                else:
+                    print(f"User '{username}' already exists.")
+                return
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error adding user: {e}")
+
+    async def delete_user(self, username, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API. None if the user does not exist or the request failed.
+        """
+        try:
+            response = await self.request('DELETE', f"{USERS_PATH}/{username}", auth_username, auth_password, timeout)
+            if response.status_code == 404:
+                print(f"User '{username}' does not exist.")
+                return
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error deleting user: {e}")
+
+    async def get_users(self, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            list: The id, username and email of every user. None if the request failed.
+        """
+        try:
+            response = await self.request('GET', USERS_PATH, auth_username, auth_password, timeout)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error getting users: {e}")
+
+    async def change_user_password(self, username, new_password, auth_username, auth_password, timeout=None):
+        """
+        Returns:
+            dict: The JSON response from the API. None if the user does not exist or the request failed.
+        """
+        try:
+            response = await self.request('PUT', f"{USERS_PATH}/{username}", auth_username, auth_password, timeout, json={'password': new_password})
+            if response.status_code == 404:
+                print(f"User '{username}' does not exist.")
+                return
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            return decode(response)
+        except httpx.HTTPError as e:
+            print(f"Error changing user password: {e}")
+
+def decode(response):
+    """
+    Decodes the JSON or MessagePack body of a response, like vault_client.decode.
+
+    Parameters:
+        response (httpx.Response): The response.
+
+    Returns:
+        The decoded body.
+
+    Raises:
+        httpx.DecodingError: If the body can't be decoded, so the httpx.HTTPError handlers report it like any other failed request.
+    """
+    try:
+        return decode_response(response)
+    except ValueError as e:
+        raise httpx.DecodingError(f"Invalid response body: {e}", request=response.request) from e
@@ -0,0 +1,155 @@
+# Bounded, TTL-based in-process cache of successful HTTP Basic auth verifications. Used by api.py to skip check_password_hash on repeat requests.
+
+'''
+    - Entries are keyed on an HMAC-SHA256 digest of username + password using a random per-process salt. The plaintext password is never stored.
+    - Only successful verifications are cached, so a wrong password always falls through to the full hash check.
+    - Entries are dropped when they expire, when the cache is full (least recently used first), or when a user's password changes or the user is deleted.
+    - Each entry also records the fingerprint of the password hash it was verified against. api.verify_password compares it with the
+      user loaded from the database on every hit, so a password changed elsewhere stops matching on the next request.
+    - The cache is per process. invalidate_user() only clears the worker that handled the change, with several gunicorn workers the
+      other workers rely on the fingerprint check above. Without it, an old password would keep working there until the TTL expired.
+'''
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 300           # seconds a successful verification is trusted for
+DEFAULT_MAX_ENTRIES = 1024  # upper bound on cached verifications
+
+class VerifiedCredentialCache:
+    """
+    Thread-safe LRU cache mapping a salted digest of (username, password) to the id of the verified user and the fingerprint of their password hash.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Parameters:
+            ttl (int | float): Seconds a cached verification stays valid. 0 disables the cache.
+            max_entries (int): Maximum number of cached verifications. 0 disables the cache.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._salt = os.urandom(32)
+        self._entries = OrderedDict()    # digest -> (user_id, fingerprint, username, expires_at)
+        self._by_username = {}           # username -> set of digests, used for invalidation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _digest(self, username, password):
+        """
+        Returns the cache key for a username/password pair. The username is length-prefixed so that
+        ("ab", "c") and ("a", "bc") never collide.
+        """
+        message = f"{len(username)}:{username}:{password}".encode()
+        return hmac.new(self._salt, message, hashlib.sha256).digest()
+
+    def get(self, username, password):
+        """
+        Look up a previously verified username/password pair.
+
+        Parameters:
+            username (str): The username sent by the client.
+            password (str): The password sent by the client.
+
+        Returns:
+            tuple or None: (user id, password fingerprint) of the verified user on a hit, None on a miss or expired entry.
+                The caller must check the fingerprint against the user's current one, see api.verify_password.
+        """
+        if not self.enabled or username is None or password is None:
+            return None
+        digest = self._digest(username, password)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id, fingerprint, cached_username, expires_at = entry
+            if expires_at <= now:
+                self._remove(digest, cached_username)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return user_id, fingerprint
+
+    def put(self, username, password, user_id, fingerprint):
+        """
+        Record a successful verification.
+
+        Parameters:
+            username (str): The verified username.
+            password (str): The verified password. Only its salted digest is kept.
+            user_id (int): The id of the verified user.
+            fingerprint (str): The user's User.password_fingerprint() at verification time.
+        """
+        if not self.enabled:
+            return
+        digest = self._digest(username, password)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+            self._entries[digest] = (user_id, fingerprint, username, expires_at)
+            self._by_username.setdefault(username, set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                old_digest, (_, _, old_username, _) = self._entries.popitem(last=False)
+                self._discard_username_digest(old_username, old_digest)
+
+    def invalidate_user(self, username):
+        """
+        Drop every cached verification for a username. Called whenever a user's password changes or the user is deleted.
+
+        Parameters:
+            username (str): The username whose cached verifications should be removed.
+        """
+        with self._lock:
+            for digest in self._by_username.pop(username, ()):
+                self._entries.pop(digest, None)
+
+    def clear(self):
+        """
+        Drop every cached verification.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_username.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters, hit rate and current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+    def _remove(self, digest, username):
+        # caller must hold self._lock
+        self._entries.pop(digest, None)
+        self._discard_username_digest(username, digest)
+
+    def _discard_username_digest(self, username, digest):
+        # caller must hold self._lock
+        digests = self._by_username.get(username)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_username[username]
@@ -10,11 +10,11 @@
 
 import json
 import requests
-from requests.auth import HTTPBasicAuth
+from vault_client import get_client, decode, DEFAULT_BASE_URL
 
-# API Endpoints/Constants
-BASE_URL = 'http://127.0.0.1:5000'    # For running locally on same physical machine. tmux is suggested for testing and usage!!
-USERS_URL = f"{BASE_URL}/users"
+# API Endpoints/Constants. Requests go to the base URL of the shared client (see vault_client.set_client)
+BASE_URL = DEFAULT_BASE_URL    # Defaults to http://127.0.0.1:5000, set VAULT_API_URL to change it
+USERS_PATH = "/users"
 
 def load_config(config_file='config/config.json'):
     """
@@ -47,9 +47,9 @@ def check_user_exists(username, auth_username, auth_password):
         requests.RequestException: If there is an error with the request.
     """
     try:
-        response = requests.get(f"{USERS_URL}/{username}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('GET', f"{USERS_PATH}/{username}", auth_username, auth_password)
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         if result['message'] == "True":
             return True
         else:
@@ -75,15 +75,17 @@ def add_user(username, email, password, auth_username, auth_password):
     Raises:
         requests.RequestException: If there is an error with the request.
     """
-    if check_user_exists(username, auth_username, auth_password):
-        print(f"User '{username}' already exists.")
-        return
     try:
-        headers = {'Content-Type': 'application/json'}
         post_user_data = {'username': username, 'email': email, 'password': password}
-        response = requests.post(f"{USERS_URL}", headers=headers, data=json.dumps(post_user_data), auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('POST', USERS_PATH, auth_username, auth_password, json=post_user_data)
+        if response.status_code == 409:
+            if decode(response).get('message') == "Email already in use!":
+                print(f"Email '{email}' is already used by another user.")
+            else:
+                print(f"User '{username}' already exists.")
+            return
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error adding user: {e}")
@@ -105,13 +107,13 @@ def delete_user(username, auth_username, auth_password):
     Raises:
         requests.RequestException: If there is an error with the request.
     """   
-    if not check_user_exists(username, auth_username, auth_password):
-        print(f"User '{username}' does not exist.")
-        return
     try:
-        response = requests.delete(f"{USERS_URL}/{username}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('DELETE', f"{USERS_PATH}/{username}", auth_username, auth_password)
+        if response.status_code == 404:
+            print(f"User '{username}' does not exist.")
+            return
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error deleting user: {e}")
@@ -132,13 +134,29 @@ def get_users(auth_username, auth_password):
         requests.RequestException: If there is an error with the request.
     """
     try:
-        response = requests.get(f"{USERS_URL}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response, result = get_client().get_json(USERS_PATH, auth_username, auth_password)
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
         return result
     except requests.RequestException as e:
         print(f"Error getting users: {e}")
         
+def iter_users(auth_username, auth_password, page_size=1000):
+    """
+    Iterates over the users by id, fetching them one page at a time.
+
+    Args:
+        auth_username (str): The username for authentication.
+        auth_password (str): The password for authentication.
+        page_size (int, optional): Users per request. Defaults to 1000.
+
+    Yields:
+        dict: The next user, with the keys 'id', 'username' and 'email'. Stops early, after printing the error, if a request fails.
+    """
+    try:
+        yield from get_client().iter_pages(USERS_PATH, auth_username, auth_password, params={"limit": page_size})
+    except requests.RequestException as e:
+        print(f"Error getting users: {e}")
+
 # Change auth user password by username
 def change_user_password(username, new_password, auth_username, auth_password):
     """
@@ -157,15 +175,14 @@ def change_user_password(username, new_password, auth_username, auth_password):
     Raises:
         requests.RequestException: If there is an error with the request.
     """
-    if not check_user_exists(username, auth_username, auth_password):
-        print(f"User '{username}' does not exist.")
-        return
     try:
-        headers = {'Content-Type': 'application/json'}
         put_user_data = {'password': new_password}
-        response = requests.put(f"{USERS_URL}/{username}", headers=headers, data=json.dumps(put_user_data), auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('PUT', f"{USERS_PATH}/{username}", auth_username, auth_password, json=put_user_data)
+        if response.status_code == 404:
+            print(f"User '{username}' does not exist.")
+            return
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error changing user password: {e}")
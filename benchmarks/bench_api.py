@@ -0,0 +1,489 @@
+# End-to-end benchmark of every route in api.py against generated vaults, through the Flask test client and a real local server.
+# Usage: python -m benchmarks.bench_api [--sizes 1000 100000 1000000] [--mode client|server|both] [--requests N] [--concurrency N] [--json results.json]
+
+'''
+    - Vaults are generated once per size into benchmarks/data/vault-<size>.db with a fixed benchmark key, then copied for every run
+      because the write routes change them. config/config.json and instance/creds.db are never touched.
+    - client mode calls the app in-process with app.test_client(), measuring the app without any network or server overhead.
+      server mode starts the app in a separate process behind werkzeug's threaded server and sends real HTTP requests from
+      --concurrency threads over keep-alive connections.
+    - For every route the throughput and the p50/p95/p99 latency seen by the client are reported, together with the mean time per
+      request the server spent hashing passwords (auth), in SQL statements (db), decrypting and encrypting credentials, and the rest.
+      The server side is timed by wrapping check_password_hash/generate_password_hash, the cipher engine and the SQLAlchemy engine events.
+      'db' covers executing statements only, fetching the rows and building ORM objects from them counts as 'other' (except on the raw
+      sqlite3 read path of api.SQLiteCredentialReads, where 'db' includes fetching the row).
+    - Requests are authenticated with a bearer token by default, --auth basic sends the username and password with every request
+      instead (cached by the server unless --no-auth-cache is given, which shows the full password hashing cost).
+'''
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import jsonify, request
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_REQUESTS = 500       # measured requests per route
+DEFAULT_WARMUP = 20          # unmeasured requests per route, sent first
+DEFAULT_CONCURRENCY = 8      # client threads in server mode
+BATCH_SIZE = 50              # services per POST /creds/batch
+BULK_SIZE = 100              # credentials per POST /creds/bulk
+SEED_USERS = 10
+HASH_ROUTE_REQUESTS = 50     # cap for the user routes that hash a password on every request (tens of ms each), and their DELETE
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-password'
+# Fixed so that generated vaults stay readable between runs. Never use it for real data.
+BENCH_KEY = base64.urlsafe_b64encode(hashlib.sha256(b'credentials-vault-benchmark').digest()).decode()
+
+PHASES = ('auth', 'db', 'decrypt', 'encrypt')
+
+_originals = {}    # functions replaced by instrument(), so building several apps never wraps a wrapper
+
+class PhaseTimer:
+    """
+    Accumulates server-side time per phase for the request handled by the current thread, and totals per benchmark run.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.totals = dict.fromkeys(PHASES + ('request',), 0.0)
+
+    def add(self, phase, seconds):
+        phases = getattr(self._local, 'phases', None)
+        if phases is not None:
+            phases[phase] += seconds
+
+    def timed(self, phase, func):
+        """
+        Returns:
+            function: `func` wrapped so its run time is added to `phase`.
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return wrapper
+
+    def begin(self):
+        self._local.phases = dict.fromkeys(PHASES, 0.0)
+        self._local.start = time.perf_counter()
+
+    def end(self):
+        phases = getattr(self._local, 'phases', None)
+        if phases is None:
+            return
+        elapsed = time.perf_counter() - self._local.start
+        self._local.phases = None
+        with self._lock:
+            self.requests += 1
+            self.totals['request'] += elapsed
+            for phase, seconds in phases.items():
+                self.totals[phase] += seconds
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Mean milliseconds per request for every phase, 'other' (the rest of the server time) and 'requests'.
+        """
+        with self._lock:
+            count = self.requests or 1
+            result = {phase: self.totals[phase] / count * 1000 for phase in PHASES}
+            result['other'] = max(self.totals['request'] / count * 1000 - sum(result.values()), 0.0)
+            result['requests'] = self.requests
+            return result
+
+def instrument(module, name, timer, phase):
+    """
+    Replaces module.name with a version timed under `phase`.
+    """
+    original = _originals.setdefault((module.__name__, name), getattr(module, name))
+    setattr(module, name, timer.timed(phase, original))
+
+def build_app(db_path, auth_cache=True):
+    """
+    Creates the API app on a vault file, instrumented with a PhaseTimer.
+
+    Returns:
+        tuple: (flask.Flask, PhaseTimer)
+    """
+    import api
+    import config_init as ci
+    from cipher import CipherEngine
+
+    timer = PhaseTimer()
+    engine = CipherEngine([BENCH_KEY])
+    engine.decrypt = timer.timed('decrypt', engine.decrypt)
+    engine.encrypt = timer.timed('encrypt', engine.encrypt)
+    ci.set_cipher_suite(engine)
+    instrument(api, 'check_password_hash', timer, 'auth')
+    instrument(api, 'generate_password_hash', timer, 'auth')
+    instrument(api.SQLiteCredentialReads, 'fetch_one', timer, 'db')    # raw sqlite3 reads bypass the engine events below
+
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.abspath(db_path)}", 'SECRET_KEY': BENCH_KEY, 'INIT_DB': True}
+    if not auth_cache:
+        config['AUTH_CACHE_TTL'] = 0
+    app = api.create_app(config)
+
+    with app.app_context():
+        sql_engine = api.db.engine
+
+    @event.listens_for(sql_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('bench_start', []).append(time.perf_counter())
+
+    @event.listens_for(sql_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timer.add('db', time.perf_counter() - conn.info['bench_start'].pop())
+
+    @app.before_request
+    def begin_timing():
+        if not request.path.startswith('/_bench/'):
+            timer.begin()
+
+    @app.teardown_request
+    def end_timing(exc):
+        timer.end()
+
+    @app.route('/_bench/phases', methods=['GET'])
+    def bench_phases():
+        return jsonify(timer.snapshot())
+
+    @app.route('/_bench/reset', methods=['POST'])
+    def bench_reset():
+        timer.reset()
+        return jsonify({'message': 'reset'})
+
+    return app, timer
+
+def seed_vault(size, path):
+    """
+    Generates a vault with `size` credentials and SEED_USERS users at `path`.
+    The schema is created by the API itself, rows are then inserted with sqlite3 directly for speed.
+    """
+    import api
+    from cipher import CipherEngine
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    app = api.create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.abspath(tmp_path)}", 'SECRET_KEY': BENCH_KEY,
+                          'INIT_DB': True, 'ADMIN_USERNAME': None, 'ADMIN_PASSWORD': None})
+    with app.app_context():
+        api.db.engine.dispose()
+
+    engine = CipherEngine([BENCH_KEY])
+    rng = random.Random(size)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    conn = sqlite3.connect(tmp_path)
+    with conn:
+        conn.executemany('INSERT INTO "user" (username, email, password_hash) VALUES (?, ?, ?)',
+                         [(name, f"{name}@localhost", password_hash) for name in [BENCH_USERNAME] + [f"user-{i}" for i in range(1, SEED_USERS)]])
+    start = time.perf_counter()
+    for first in range(0, size, 10000):
+        rows = []
+        for i in range(first, min(first + 10000, size)):
+            password = ''.join(rng.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=20))
+            rows.append((f"user{i}@example.com", engine.encrypt(password), service_name(i), f"note for service {i}"))
+        with conn:
+            conn.executemany("INSERT INTO credential (username, password, service, note) VALUES (?, ?, ?, ?)", rows)
+        print(f"\r  seeding {size:,} credentials: {min(first + 10000, size):,}", end='', flush=True)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    os.replace(tmp_path, path)
+    print(f" ({time.perf_counter() - start:.1f}s)")
+
+def service_name(i):
+    return f"service-{i:07d}"
+
+def get_vault(size):
+    """
+    Returns:
+        str: The path of the generated vault with `size` credentials, generating it on first use.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"vault-{size}.db")
+    if not os.path.exists(path):
+        seed_vault(size, path)
+    return path
+
+def route_specs(size):
+    """
+    Returns the benchmarked requests, read-only routes first. Each entry is (name, factory, limit), where factory(i) returns the
+    (method, path, json body, headers) of the i-th request and limit caps the number of requests (None for no cap).
+    Write routes only touch rows no read route or earlier request depends on.
+    """
+    rng = random.Random(0)
+    # reads and updates use the first half of the vault, deletes walk down from the end
+    read_service = lambda i: service_name(rng.randrange(max(size // 2, 1)))
+    delete_service = lambda i: service_name(size - 1 - i)
+
+    return [
+        ('GET /creds/<service>', lambda i: ('GET', f"/creds/{read_service(i)}", None, None), None),
+        ('GET /creds/<service> 304', lambda i: ('GET', f"/creds/{service_name(0)}", None, {'If-None-Match': '"1-1"'}), None),
+        ('POST /creds/batch', lambda i: ('POST', '/creds/batch', {'services': [read_service(i) for _ in range(BATCH_SIZE)]}, None), None),
+        ('GET /services', lambda i: ('GET', '/services', None, None), None),
+        ('GET /services?limit', lambda i: ('GET', f"/services?limit=100&after={read_service(i)}", None, None), None),
+        ('GET /services?prefix', lambda i: ('GET', f"/services?prefix={read_service(i)[:-2]}", None, None), None),    # ~100 matches
+        ('GET /services/<service>', lambda i: ('GET', f"/services/{read_service(i)}", None, None), None),
+        ('GET /creds/search', lambda i: ('GET', f"/creds/search?q={read_service(i)[:-2]}", None, None), None),
+        ('GET /users', lambda i: ('GET', '/users', None, None), None),
+        ('GET /users/<username>', lambda i: ('GET', f"/users/user-{i % SEED_USERS}", None, None), None),
+        ('GET /auth/cache', lambda i: ('GET', '/auth/cache', None, None), None),
+        ('POST /auth/token', lambda i: ('POST', '/auth/token', None, None), HASH_ROUTE_REQUESTS),
+        ('POST /creds', lambda i: ('POST', '/creds', {'service': f"bench-new-{i}", 'username': 'u', 'password': 'p', 'note': 'n'}, None), None),
+        ('POST /creds/bulk', lambda i: ('POST', '/creds/bulk', [{'service': f"bench-bulk-{i}-{j}", 'username': 'u', 'password': 'p', 'note': ''} for j in range(BULK_SIZE)], None), None),
+        ('PUT /creds/<service>', lambda i: ('PUT', f"/creds/{read_service(i)}", {'username': 'u2', 'password': 'p2'}, None), None),
+        ('PUT /creds/<service>/note', lambda i: ('PUT', f"/creds/{read_service(i)}/note", {'note': f"note {i}"}, None), None),
+        ('DELETE /creds/<service>', lambda i: ('DELETE', f"/creds/{delete_service(i)}", None, None), None),
+        ('POST /users', lambda i: ('POST', '/users', {'username': f"bench-user-{i}", 'email': f"bench-user-{i}@localhost", 'password': 'pw'}, None), HASH_ROUTE_REQUESTS),
+        ('PUT /users/<username>', lambda i: ('PUT', f"/users/bench-user-{i}", {'password': 'pw2'}, None), HASH_ROUTE_REQUESTS),
+        ('DELETE /users/<username>', lambda i: ('DELETE', f"/users/bench-user-{i}", None, None), HASH_ROUTE_REQUESTS),    # deletes the users created above
+    ]
+
+def percentiles(latencies):
+    """
+    Returns:
+        tuple: p50, p95 and p99 of `latencies`, in milliseconds.
+    """
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+class TestClientDriver:
+    """
+    Sends requests through app.test_client() in the benchmark process.
+    """
+
+    def __init__(self, app, timer, auth_headers):
+        self.client = app.test_client()
+        self.timer = timer
+        self.auth_headers = auth_headers
+
+    def send(self, method, path, body, headers):
+        response = self.client.open(path, method=method, json=body, headers={**self.auth_headers, **(headers or {})})
+        return response.status_code
+
+    def run(self, factory, offset, count, concurrency):
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for i in range(offset, offset + count):
+            method, path, body, headers = factory(i)
+            t = time.perf_counter()
+            status = self.send(method, path, body, headers)
+            latencies.append(time.perf_counter() - t)
+            errors += status >= 400
+        return latencies, errors, time.perf_counter() - start
+
+    def reset_phases(self):
+        self.timer.reset()
+
+    def phases(self):
+        return self.timer.snapshot()
+
+    def close(self):
+        pass
+
+class ServerDriver:
+    """
+    Starts the app in a separate process and sends real HTTP requests to it from a pool of threads.
+    """
+
+    def __init__(self, db_path, auth_cache, concurrency):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        command = [sys.executable, '-m', 'benchmarks.bench_api', '--serve', db_path, '--port', str(port)]
+        if not auth_cache:
+            command.append('--no-auth-cache')
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.auth_headers = {}
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                self.session.get(f"{self.base_url}/_bench/phases", timeout=1)
+                break
+            except requests.ConnectionError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("benchmark server did not start")
+                time.sleep(0.1)
+
+    def send(self, method, path, body, headers):
+        response = self.session.request(method, f"{self.base_url}{path}", json=body, headers={**self.auth_headers, **(headers or {})})
+        return response.status_code
+
+    def run(self, factory, offset, count, concurrency):
+        batch = [factory(i) for i in range(offset, offset + count)]
+
+        def timed(args):
+            t = time.perf_counter()
+            status = self.send(*args)
+            return time.perf_counter() - t, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, batch))
+        wall = time.perf_counter() - start
+        return [latency for latency, _ in results], sum(status >= 400 for _, status in results), wall
+
+    def reset_phases(self):
+        self.session.post(f"{self.base_url}/_bench/reset")
+
+    def phases(self):
+        return self.session.get(f"{self.base_url}/_bench/phases").json()
+
+    def close(self):
+        self.session.close()
+        self.process.terminate()
+        self.process.wait()
+
+def auth_headers(send, auth):
+    """
+    Returns:
+        dict: The Authorization header used for every benchmarked request, a bearer token unless `auth` is 'basic'.
+    """
+    basic = {'Authorization': 'Basic ' + base64.b64encode(f"{BENCH_USERNAME}:{BENCH_PASSWORD}".encode()).decode()}
+    if auth == 'basic':
+        return basic
+    status, token = send(basic)
+    if status != 200:
+        raise RuntimeError(f"POST /auth/token failed with {status}")
+    return {'Authorization': f"Bearer {token}"}
+
+def run_benchmark(size, mode, args):
+    """
+    Benchmarks every route against a fresh copy of the vault with `size` credentials.
+
+    Returns:
+        list: One result dict per route.
+    """
+    vault = get_vault(size)
+    workdir = tempfile.mkdtemp(prefix='vault-bench-')
+    db_path = os.path.join(workdir, 'creds.db')
+    shutil.copyfile(vault, db_path)
+    try:
+        basic = {'Authorization': 'Basic ' + base64.b64encode(f"{BENCH_USERNAME}:{BENCH_PASSWORD}".encode()).decode()}
+        if mode == 'client':
+            app, timer = build_app(db_path, auth_cache=not args.no_auth_cache)
+            client = app.test_client()
+
+            def get_token(headers):
+                response = client.post('/auth/token', headers=headers)
+                return response.status_code, (response.get_json() or {}).get('token')
+
+            driver = TestClientDriver(app, timer, auth_headers(get_token, args.auth))
+        else:
+            driver = ServerDriver(db_path, not args.no_auth_cache, args.concurrency)
+
+            def get_token(headers):
+                response = driver.session.post(f"{driver.base_url}/auth/token", headers=headers)
+                return response.status_code, response.json().get('token') if response.ok else None
+
+            driver.auth_headers = auth_headers(get_token, args.auth)
+
+        results = []
+        try:
+            for name, factory, limit in route_specs(size):
+                # token requests always authenticate with the password
+                if name == 'POST /auth/token':
+                    factory = (lambda f: lambda i: (*f(i)[:3], basic))(factory)
+                warmup, count = args.warmup, args.requests
+                if limit:
+                    warmup, count = min(warmup, limit // 10), min(count, limit)
+                driver.run(factory, 0, warmup, args.concurrency)
+                driver.reset_phases()
+                latencies, errors, wall = driver.run(factory, warmup, count, args.concurrency)
+                p50, p95, p99 = percentiles(latencies)
+                result = {'size': size, 'mode': mode, 'route': name, 'requests': len(latencies), 'errors': errors,
+                          'throughput': len(latencies) / wall if wall else 0.0, 'p50': p50, 'p95': p95, 'p99': p99,
+                          'server': driver.phases()}
+                results.append(result)
+                print_result(result)
+        finally:
+            driver.close()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_header(size, mode, args):
+    detail = f", concurrency {args.concurrency}" if mode == 'server' else ''
+    print(f"\n{size:,} credentials, {mode} mode ({args.auth} auth{', no auth cache' if args.no_auth_cache else ''}{detail})")
+    print(f"{'route':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  |"
+          f"{'auth':>9}{'db':>9}{'decrypt':>9}{'encrypt':>9}{'other':>10}   (server ms/request)")
+
+def print_result(result):
+    server = result['server']
+    print(f"{result['route']:<28}{result['throughput']:>9.0f}{result['p50']:>9.2f}{result['p95']:>9.2f}{result['p99']:>9.2f}{result['errors']:>8}  |"
+          f"{server['auth']:>9.3f}{server['db']:>9.3f}{server['decrypt']:>9.3f}{server['encrypt']:>9.3f}{server['other']:>10.3f}")
+
+def serve(db_path, port, auth_cache):
+    """
+    Runs the instrumented app on a werkzeug threaded server, for server mode.
+    """
+    from werkzeug.serving import make_server
+    app, _ = build_app(db_path, auth_cache=auth_cache)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route against generated vaults.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="vault sizes in credentials, e.g. 1000 100000 1000000")
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both', help="Flask test client, local HTTP server, or both")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="measured requests per route")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help="unmeasured requests per route")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="client threads in server mode")
+    parser.add_argument('--auth', choices=['token', 'basic'], default='token', help="how benchmarked requests authenticate")
+    parser.add_argument('--no-auth-cache', action='store_true', help="verify the password hash on every basic auth request")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--serve', metavar='DB', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, not args.no_auth_cache)
+        return
+
+    results = []
+    for size in args.sizes:
+        for mode in (['client', 'server'] if args.mode == 'both' else [args.mode]):
+            get_vault(size)
+            print_header(size, mode, args)
+            results.extend(run_benchmark(size, mode, args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults written to {args.json}")
+    print()
+
+if __name__ == '__main__':
+    main()
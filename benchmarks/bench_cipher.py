@@ -0,0 +1,55 @@
+# Micro-benchmark of the per-operation cost of each cipher in cipher.py. Does not touch config/config.json or the database.
+# Usage: python -m benchmarks.bench_cipher [--iterations N] [--length N]
+
+import argparse
+import secrets
+import timeit
+from cryptography.fernet import Fernet
+from cipher import CipherEngine, CIPHERS
+
+def bench(engine, plaintext, iterations):
+    """
+    Times encryption and decryption of one value.
+
+    Parameters:
+        engine (CipherEngine): The engine to time.
+        plaintext (str): The value to encrypt.
+        iterations (int): Number of operations per measurement. The best of 5 measurements is kept.
+
+    Returns:
+        tuple: (encrypt µs/op, decrypt µs/op, stored value length)
+    """
+    value = engine.encrypt(plaintext)
+    encrypt = min(timeit.repeat(lambda: engine.encrypt(plaintext), number=iterations, repeat=5)) / iterations
+    decrypt = min(timeit.repeat(lambda: engine.decrypt(value), number=iterations, repeat=5)) / iterations
+    return encrypt * 1e6, decrypt * 1e6, len(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-operation cost of the credential ciphers.")
+    parser.add_argument('--iterations', type=int, default=20000, help="operations per measurement")
+    parser.add_argument('--length', type=int, default=24, help="plaintext length in characters")
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    plaintext = secrets.token_urlsafe(args.length)[:args.length]
+
+    print(f"\n{'cipher':<18}{'encrypt µs/op':>15}{'decrypt µs/op':>15}{'stored bytes':>14}")
+    results = {}
+    for name in CIPHERS:
+        results[name] = bench(CipherEngine([key], name), plaintext, args.iterations)
+        print(f"{name:<18}{results[name][0]:>15.2f}{results[name][1]:>15.2f}{results[name][2]:>14}")
+
+    # values written before the cipher engine existed: unprefixed Fernet tokens
+    engine = CipherEngine([key])
+    legacy_value = Fernet(key).encrypt(plaintext.encode()).decode()
+    legacy_decrypt = min(timeit.repeat(lambda: engine.decrypt(legacy_value), number=args.iterations, repeat=5)) / args.iterations * 1e6
+    print(f"{'fernet (legacy)':<18}{'-':>15}{legacy_decrypt:>15.2f}{len(legacy_value):>14}")
+
+    baseline = results['fernet'][1]
+    for name in CIPHERS:
+        if name != 'fernet':
+            print(f"\n{name} decrypt is {baseline / results[name][1]:.1f}x faster than fernet", end='')
+    print("\n")
+
+if __name__ == '__main__':
+    main()
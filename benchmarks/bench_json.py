@@ -0,0 +1,125 @@
+# Benchmark of API response serialization: Flask's default JSON provider against serialization.py's backends, per payload and end to end.
+# Usage: python -m benchmarks.bench_json [--size 20000] [--requests 200] [--iterations 50]
+
+'''
+    - Codecs: encode and decode time of API-shaped payloads (a POST /creds/batch response, a GET /services page, a GET /users list)
+      with Flask's default provider, the json module, and orjson, msgspec and msgpack where installed.
+    - Routes: the same requests through app.test_client(), once with Flask's default provider ('flask'), once with
+      json_provider.VaultJSONProvider ('vault', using serialization.BACKEND) and, if msgpack is installed, asking for MessagePack.
+      The vault is generated by bench_api.py and copied, the original is never changed.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import timeit
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import json_provider
+import serialization
+from benchmarks.bench_api import BENCH_PASSWORD, BENCH_USERNAME, build_app, get_vault, percentiles, service_name
+
+BATCH_SIZE = 1000            # services per POST /creds/batch, BATCH_MAX_ITEMS by default
+PAGE_SIZE = 10000            # services per GET /services page
+
+def sample_payloads():
+    """
+    Returns:
+        dict: Payload name -> value shaped like the API's responses.
+    """
+    creds = {service_name(i): {"id": i, "username": f"user{i}@example.com", "password": "x" * 20, "service": service_name(i),
+                               "note": f"note for service {i}"} for i in range(BATCH_SIZE)}
+    return {
+        'POST /creds/batch': creds,
+        'GET /services page': [service_name(i) for i in range(PAGE_SIZE)],
+        'GET /users': [{"id": i, "username": f"user-{i}", "email": f"user-{i}@localhost"} for i in range(100)],
+    }
+
+def codecs():
+    """
+    Returns:
+        list: (name, encode, decode) for every installed codec, encode returning bytes.
+    """
+    flask_json = DefaultJSONProvider(Flask('bench_json'))
+    found = [
+        ('flask default', lambda obj: flask_json.dumps(obj).encode(), flask_json.loads),
+        ('json compact', lambda obj: json.dumps(obj, separators=(',', ':')).encode(), json.loads),
+    ]
+    if serialization.orjson is not None:
+        found.append(('orjson', serialization.orjson.dumps, serialization.orjson.loads))
+    if serialization.msgspec is not None:
+        found.append(('msgspec', serialization.msgspec.json.encode, serialization.msgspec.json.decode))
+    if serialization.msgpack is not None:
+        found.append(('msgpack', serialization.msgpack.packb, serialization.msgpack.unpackb))
+    return found
+
+def bench_codecs(iterations):
+    print(f"\n{'payload':<22}{'codec':<16}{'encode ms':>11}{'decode ms':>11}{'bytes':>11}")
+    for payload_name, payload in sample_payloads().items():
+        for name, encode, decode in codecs():
+            data = encode(payload)
+            encode_time = min(timeit.repeat(lambda: encode(payload), number=iterations, repeat=5)) / iterations
+            decode_time = min(timeit.repeat(lambda: decode(data), number=iterations, repeat=5)) / iterations
+            print(f"{payload_name:<22}{name:<16}{encode_time * 1000:>11.3f}{decode_time * 1000:>11.3f}{len(data):>11,}")
+
+def route_requests(size):
+    """
+    Returns:
+        list: (name, method, path, json body) of the requests timed end to end.
+    """
+    return [
+        ('POST /creds/batch', 'POST', '/creds/batch', {'services': [service_name(i) for i in range(0, size, max(size // BATCH_SIZE, 1))][:BATCH_SIZE]}),
+        ('GET /services page', 'GET', f"/services?limit={PAGE_SIZE}", None),
+        ('GET /users', 'GET', '/users', None),
+    ]
+
+def bench_routes(size, count):
+    workdir = tempfile.mkdtemp(prefix='vault-bench-json-')
+    db_path = os.path.join(workdir, 'creds.db')
+    shutil.copyfile(get_vault(size), db_path)
+    try:
+        app, _ = build_app(db_path)
+        client = app.test_client()
+        token = client.post('/auth/token', auth=(BENCH_USERNAME, BENCH_PASSWORD)).get_json()['token']
+        variants = [('flask', DefaultJSONProvider(app), 'application/json'),
+                    (f"vault ({serialization.BACKEND})", json_provider.VaultJSONProvider(app), 'application/json')]
+        if serialization.msgpack is not None:
+            variants.append(('vault (msgpack)', json_provider.VaultJSONProvider(app), serialization.MSGPACK_MIMETYPE))
+
+        print(f"\n{size:,} credentials, {count} requests per route through the Flask test client")
+        print(f"{'route':<22}{'provider':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'bytes':>11}")
+        for route, method, path, body in route_requests(size):
+            for name, provider, accept in variants:
+                app.json = provider
+                headers = {'Authorization': f"Bearer {token}", 'Accept': accept}
+                for _ in range(max(count // 10, 1)):
+                    client.open(path, method=method, json=body, headers=headers)
+                latencies = []
+                start = time.perf_counter()
+                for _ in range(count):
+                    t = time.perf_counter()
+                    response = client.open(path, method=method, json=body, headers=headers)
+                    latencies.append(time.perf_counter() - t)
+                wall = time.perf_counter() - start
+                p50, p95, _ = percentiles(latencies)
+                print(f"{route:<22}{name:<18}{count / wall:>9.0f}{p50:>9.2f}{p95:>9.2f}{len(response.data):>11,}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON providers and codecs for API responses.")
+    parser.add_argument('--size', type=int, default=20000, help="vault size in credentials for the route benchmark")
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per route and provider")
+    parser.add_argument('--iterations', type=int, default=50, help="operations per codec measurement")
+    args = parser.parse_args()
+
+    print(f"serialization.py backend: {serialization.BACKEND}, msgpack {'installed' if serialization.msgpack else 'not installed'}")
+    bench_codecs(args.iterations)
+    bench_routes(args.size, args.requests)
+    print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Benchmark of the single-credential read paths in api.py: the ORM (OrmCredentialReads), raw sqlite3 (SQLiteCredentialReads) and the row cache.
+# Usage: python -m benchmarks.bench_reads [--sizes 1000 100000] [--requests 2000] [--lookups 20000]
+
+'''
+    - Lookups: the time of one get_by_service() and service_exists() call in a fresh session, as in a request, without HTTP or Flask routing.
+    - Routes: GET /creds/<service> and GET /services/<service> through app.test_client() with each read path, authenticated with a
+      bearer token. 'saved' is the p50 saving per request of the raw sqlite3 path over the ORM, 'cache saved' that of the cache
+      over the raw sqlite3 path.
+    - 'cached' is SQLiteCredentialReads behind CachedCredentialReads with a default-sized cache. Lookups are skewed like real traffic:
+      HOT_SHARE of them go to HOT_SERVICES services, the rest are spread over the whole vault. The cache hit rate is printed with it.
+    - Vaults are generated by bench_api.py and copied, the originals are never changed.
+'''
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from benchmarks.bench_api import BENCH_PASSWORD, BENCH_USERNAME, build_app, get_vault, percentiles, service_name
+
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_REQUESTS = 2000      # measured requests per route and read path
+DEFAULT_LOOKUPS = 20000      # measured calls per lookup and read path
+HOT_SERVICES = 50            # services receiving HOT_SHARE of the lookups
+HOT_SHARE = 0.9
+
+READ_PATHS = (('OrmCredentialReads', 'ORM'), ('SQLiteCredentialReads', 'raw'), ('CachedCredentialReads', 'cached'))
+
+def pick_services(rng, size, count):
+    hot = [rng.randrange(size) for _ in range(HOT_SERVICES)]
+    return [service_name(rng.choice(hot) if rng.random() < HOT_SHARE else rng.randrange(size)) for _ in range(count)]
+
+def read_paths():
+    import api
+
+    return (api.OrmCredentialReads(), api.SQLiteCredentialReads(),
+            api.CachedCredentialReads(api.SQLiteCredentialReads(), api.CredentialRowCache()))
+
+def bench_lookups(app, size, count):
+    """
+    Returns:
+        dict: (read path name, lookup) -> mean µs per call.
+    """
+    import api
+
+    rng = random.Random(0)
+    services = pick_services(rng, size, count)
+    results = {}
+    with app.test_request_context():
+        for reads in read_paths():
+            for lookup in ('get_by_service', 'service_exists'):
+                method = getattr(reads, lookup)
+                start = time.perf_counter()
+                for service in services:
+                    method(service)
+                    api.db.session.remove()    # every request starts with a fresh session
+                results[(type(reads).__name__, lookup)] = (time.perf_counter() - start) / count * 1e6
+    return results
+
+def bench_routes(app, size, count):
+    """
+    Returns:
+        dict: (read path name, route) -> (req/s, p50 ms, p95 ms), and 'hit_rate' -> the row cache hit rate.
+    """
+    import api
+
+    client = app.test_client()
+    token = client.post('/auth/token', auth=(BENCH_USERNAME, BENCH_PASSWORD)).get_json()['token']
+    headers = {'Authorization': f"Bearer {token}"}
+    rng = random.Random(1)
+    paths = {route: [f"{prefix}/{service}" for service in pick_services(rng, size, count)]
+             for route, prefix in (('GET /creds/<service>', '/creds'), ('GET /services/<service>', '/services'))}
+    results = {}
+    for reads in read_paths():
+        app.extensions['credential_reads'] = reads
+        for route, route_paths in paths.items():
+            for path in route_paths[:count // 10]:
+                client.get(path, headers=headers)
+            latencies = []
+            start = time.perf_counter()
+            for path in route_paths:
+                t = time.perf_counter()
+                client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - t)
+            wall = time.perf_counter() - start
+            p50, p95, _ = percentiles(latencies)
+            results[(type(reads).__name__, route)] = (count / wall, p50, p95)
+        if isinstance(reads, api.CachedCredentialReads):
+            results['hit_rate'] = reads.cache.stats()['hit_rate']
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ORM, raw sqlite3 and cached read paths of the single-credential routes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="vault sizes in credentials")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="measured requests per route and read path")
+    parser.add_argument('--lookups', type=int, default=DEFAULT_LOOKUPS, help="measured calls per lookup and read path")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix='vault-bench-reads-')
+        db_path = os.path.join(workdir, 'creds.db')
+        shutil.copyfile(get_vault(size), db_path)
+        try:
+            app, _ = build_app(db_path)
+            print(f"\n{size:,} credentials")
+            lookups = bench_lookups(app, size, args.lookups)
+            print(f"{'lookup':<18}{'ORM µs':>10}{'raw µs':>10}{'cached µs':>11}")
+            for lookup in ('get_by_service', 'service_exists'):
+                orm, raw, cached = (lookups[(name, lookup)] for name, _ in READ_PATHS)
+                print(f"{lookup:<18}{orm:>10.1f}{raw:>10.1f}{cached:>11.1f}")
+
+            routes = bench_routes(app, size, args.requests)
+            print(f"\n{'route':<26}{'read path':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            for route in ('GET /creds/<service>', 'GET /services/<service>'):
+                for name, label in READ_PATHS:
+                    throughput, p50, p95 = routes[(name, route)]
+                    print(f"{route:<26}{label:<12}{throughput:>9.0f}{p50:>9.3f}{p95:>9.3f}")
+                orm, raw, cached = (routes[(name, route)][1] for name, _ in READ_PATHS)
+                print(f"{'':<26}{'saved':<12}{'':>9}{orm - raw:>9.3f}")
+                print(f"{'':<26}{'cache saved':<12}{'':>9}{raw - cached:>9.3f}")
+            print(f"cache hit rate {routes['hit_rate']:.0%}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print()
+
+if __name__ == '__main__':
+    main()
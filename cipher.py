@@ -0,0 +1,171 @@
+# Pluggable cipher engine for the credential passwords stored in the database. Used by config_init.encrypt_password/decrypt_password.
+
+'''
+    - Every value written carries an algorithm and key id prefix, so values written with an older algorithm or key stay readable:
+        fernet:<key id>:<Fernet token>
+        aesgcm:<key id>:<urlsafe base64 of nonce + ciphertext + tag>
+        chacha20:<key id>:<urlsafe base64 of nonce + ciphertext + tag>
+    - Values written before the cipher engine existed have no prefix. They are plain Fernet tokens and are decrypted with the configured key(s).
+    - All algorithms use the 'cred_key' from config/config.json. AES-GCM and ChaCha20-Poly1305 use a 256-bit key derived from it with HKDF,
+      so no new key material has to be stored. The key id is the first 8 hex digits of the SHA-256 of the configured key.
+    - Fernet is AES-128-CBC + HMAC-SHA256 + base64 with a timestamp. The AEAD ciphers do one pass over the data, skip the separate HMAC
+      and produce shorter values, which makes them noticeably cheaper per operation (see benchmarks/bench_cipher.py).
+'''
+
+import base64
+import hashlib
+import os
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+DEFAULT_ALGORITHM = 'aesgcm'
+NONCE_SIZE = 12    # bytes, for both AES-GCM and ChaCha20-Poly1305
+
+def key_id(key):
+    """
+    Returns a short, stable identifier for a key, stored in the prefix of every value encrypted with it.
+
+    Parameters:
+        key (str | bytes): A Fernet key as stored in config/config.json.
+
+    Returns:
+        str: 8 hex digits.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    return hashlib.sha256(key).hexdigest()[:8]
+
+def derive_key(key, info):
+    """
+    Derives a 256-bit key for an AEAD cipher from a Fernet key.
+
+    Parameters:
+        key (str | bytes): A Fernet key as stored in config/config.json.
+        info (bytes): Context string, different for every algorithm so they never share a key.
+
+    Returns:
+        bytes: 32 bytes of key material.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(base64.urlsafe_b64decode(key))
+
+class FernetCipher:
+    """
+    Fernet (AES-128-CBC + HMAC-SHA256). The algorithm of every value written before the cipher engine existed.
+    """
+    name = 'fernet'
+
+    def __init__(self, key):
+        self.key_id = key_id(key)
+        self._fernet = Fernet(key)
+
+    def encrypt(self, data):
+        return self._fernet.encrypt(data).decode()
+
+    def decrypt(self, payload):
+        return self._fernet.decrypt(payload.encode())
+
+class AeadCipher:
+    """
+    Base class for the AEAD ciphers. Values are urlsafe base64 of a random nonce followed by the ciphertext and tag.
+    """
+    name = None
+    aead_class = None
+
+    def __init__(self, key):
+        self.key_id = key_id(key)
+        self._aead = self.aead_class(derive_key(key, f"credentials-vault:{self.name}".encode()))
+
+    def encrypt(self, data):
+        nonce = os.urandom(NONCE_SIZE)
+        return base64.urlsafe_b64encode(nonce + self._aead.encrypt(nonce, data, None)).decode()
+
+    def decrypt(self, payload):
+        raw = base64.urlsafe_b64decode(payload)
+        return self._aead.decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], None)
+
+class AesGcmCipher(AeadCipher):
+    """
+    AES-256-GCM. Fastest on CPUs with AES instructions.
+    """
+    name = 'aesgcm'
+    aead_class = AESGCM
+
+class ChaChaCipher(AeadCipher):
+    """
+    ChaCha20-Poly1305. Fastest on CPUs without AES instructions.
+    """
+    name = 'chacha20'
+    aead_class = ChaCha20Poly1305
+
+CIPHERS = {cipher.name: cipher for cipher in (FernetCipher, AesGcmCipher, ChaChaCipher)}
+
+class CipherEngine:
+    """
+    Encrypts with one algorithm and key, decrypts values written with any supported algorithm and any configured key.
+    """
+
+    def __init__(self, keys, algorithm=DEFAULT_ALGORITHM):
+        """
+        Parameters:
+            keys (list): Fernet keys (str or bytes). The first one is used for new values, the rest are only used for decryption.
+            algorithm (str): Name of the algorithm used for new values: 'aesgcm', 'chacha20' or 'fernet'.
+
+        Raises:
+            ValueError: If no key is given or the algorithm is unknown.
+        """
+        if not keys:
+            raise ValueError("At least one key is required")
+        if algorithm not in CIPHERS:
+            raise ValueError(f"Unknown cipher '{algorithm}', choose one of: {', '.join(CIPHERS)}")
+        self.algorithm = algorithm
+        self._ciphers = {}
+        for key in keys:
+            for cipher_class in CIPHERS.values():
+                cipher = cipher_class(key)
+                self._ciphers[(cipher.name, cipher.key_id)] = cipher
+        self._primary = self._ciphers[(algorithm, key_id(keys[0]))]
+        self._legacy = [self._ciphers[('fernet', key_id(key))] for key in keys]
+
+    def encrypt(self, plaintext):
+        """
+        Parameters:
+            plaintext (str): The value to encrypt.
+
+        Returns:
+            str: The prefixed ciphertext.
+        """
+        cipher = self._primary
+        return f"{cipher.name}:{cipher.key_id}:{cipher.encrypt(plaintext.encode())}"
+
+    def decrypt(self, value):
+        """
+        Parameters:
+            value (str): A value returned by encrypt, or an unprefixed Fernet token.
+
+        Returns:
+            str: The plaintext.
+
+        Raises:
+            cryptography.fernet.InvalidToken: If the value was not encrypted with a configured key or has been tampered with.
+        """
+        if ':' not in value:
+            # Fernet tokens are urlsafe base64 and never contain ':'
+            for cipher in self._legacy:
+                try:
+                    return cipher.decrypt(value).decode()
+                except InvalidToken:
+                    continue
+            raise InvalidToken
+        name, kid, payload = value.split(':', 2)
+        cipher = self._ciphers.get((name, kid))
+        if cipher is None:
+            raise InvalidToken
+        try:
+            return cipher.decrypt(payload).decode()
+        except (InvalidToken, InvalidTag, ValueError) as e:
+            raise InvalidToken from e
@@ -0,0 +1,119 @@
+# Client-side bearer token handling for vault_client.VaultClient. Trades the configured username/password for a short-lived token from POST /auth/token and reuses it until it is about to expire.
+
+import threading
+import time
+import requests
+from requests.auth import AuthBase, HTTPBasicAuth
+from serialization import decode_response
+
+REFRESH_MARGIN = 30    # seconds before expiry at which a token is renewed
+TOKEN_TIMEOUT = 10     # seconds to wait for POST /auth/token
+
+class TokenAuth(AuthBase):
+    """
+    requests auth handler that sends 'Authorization: Bearer <token>' and acquires/refreshes the token transparently.
+
+    If the server rejects a token (e.g. it expired early or the password changed), the token is dropped, a new one is
+    acquired and the request is resent once. If no token can be obtained (old server without /auth/token, bad
+    credentials, network error) the request falls back to HTTP Basic auth so callers see the same responses as before.
+    """
+
+    def __init__(self, token_url, username, password, session=None):
+        """
+        Parameters:
+            token_url (str): Full URL of the API's POST /auth/token endpoint.
+            username (str): The username for authentication.
+            password (str): The password for authentication.
+            session (requests.Session, optional): Session used to request tokens, so they reuse pooled connections.
+        """
+        self.session = session if session is not None else requests
+        self.token_url = token_url
+        self.username = username
+        self.password = password
+        self._token = None
+        self._expires_at = 0.0
+        self._token_unsupported = False
+        self._lock = threading.Lock()
+
+    def _fetch_token(self):
+        """
+        Requests a new token from the API.
+
+        Returns:
+            str or None: The new token, or None if one could not be obtained.
+        """
+        try:
+            response = self.session.post(self.token_url, auth=HTTPBasicAuth(self.username, self.password), timeout=TOKEN_TIMEOUT)
+        except requests.RequestException:
+            return None
+        if response.status_code in (404, 405):
+            # server predates token auth, stop asking
+            self._token_unsupported = True
+            return None
+        if response.status_code != 200:
+            return None
+        result = decode_response(response)
+        self._token = result['token']
+        self._expires_at = time.monotonic() + result.get('expires_in', 0)
+        return self._token
+
+    def get_token(self):
+        """
+        Returns:
+            str or None: A token valid for at least REFRESH_MARGIN more seconds, or None if token auth is unavailable.
+        """
+        with self._lock:
+            if self._token_unsupported:
+                return None
+            if self._token and time.monotonic() < self._expires_at - REFRESH_MARGIN:
+                return self._token
+            self._token = None
+            return self._fetch_token()
+
+    def invalidate(self, token):
+        """
+        Drops the cached token if it is still the one that was rejected.
+
+        Parameters:
+            token (str): The token the server rejected.
+        """
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def _apply(self, r, token):
+        if token:
+            r.headers['Authorization'] = f"Bearer {token}"
+        else:
+            HTTPBasicAuth(self.username, self.password)(r)
+        return r
+
+    def handle_401(self, r, **kwargs):
+        """
+        Response hook. Retries a request once with a fresh token if the server rejected the bearer token.
+        """
+        sent_token = getattr(r.request, '_vault_token', None)
+        if r.status_code != 401 or not sent_token or getattr(r.request, '_vault_retried', False):
+            return r
+
+        self.invalidate(sent_token)
+        token = self.get_token()
+
+        # Consume content and release the original connection so it can be reused
+        r.content
+        r.close()
+        prep = r.request.copy()
+        self._apply(prep, token)
+        prep._vault_token = token
+        prep._vault_retried = True
+        _r = r.connection.send(prep, **kwargs)
+        _r.history.append(r)
+        _r.request = prep
+        return _r
+
+    def __call__(self, r):
+        token = self.get_token()
+        self._apply(r, token)
+        r._vault_token = token
+        r.register_hook('response', self.handle_401)
+        return r
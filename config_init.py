@@ -1,15 +1,27 @@
 # Initialize the key for encryption and decryption of credential passwords. If the key is not found, a new key is generated.
+# Nothing happens at import time: the key is loaded on first use, and bootstrap() prepares config/config.json explicitly.
 
-from crypto_utils import get_or_gen_key
+import os
+import time
+import threading
+from crypto_utils import get_keyring, CONFIG_PATH
 from session_user_auth import add_config_creds
-from cryptography.fernet import Fernet
+from cipher import CipherEngine, DEFAULT_ALGORITHM
+import metrics
+
+# Seconds between checks of config/config.json for a changed keyring, see get_cipher_suite()
+KEYRING_CHECK_INTERVAL = 5
 
 def init_key():
     """
     Initializes the key for encryption and decryption of credential passwords. If the key is not found, a new key is generated.
 
+    New values are encrypted with the algorithm named by the VAULT_CIPHER environment variable ('aesgcm' by default, 'chacha20' or 'fernet').
+    Values written with any of them, including unprefixed Fernet values from before the cipher engine, stay readable.
+    While a key rotation is in progress (see rotate_keys.py), the previous keys are loaded too and only used for decryption.
+
     Returns:
-        cipher_suite (Fernet): The cipher suite object used for encryption and decryption.
+        cipher_suite (CipherEngine): The cipher engine used for encryption and decryption.
         None: If there is an error loading the key.
 
     Raises:
@@ -20,31 +32,89 @@ def init_key():
         Error loading key: {e}: If there is an error loading the key.
     """
     try:
-        key = get_or_gen_key()
-        cipher_suite = Fernet(key)
+        cipher_suite = CipherEngine(get_keyring(), os.environ.get('VAULT_CIPHER', DEFAULT_ALGORITHM))
         print(f"\nKey loaded successfully!\n")
         return cipher_suite
     except TypeError as e:
         print(f"Error loading key: {e}")
         return None
     
-def init_config_creds():
+def init_config_creds(interactive=True):
     """
     Initializes the config credentials.
 
+    Args:
+        interactive (bool, optional): Prompt for missing values. If False, they are read from the environment instead. Defaults to True.
+
     Returns:
-        None
+        tuple: The config (username, password), (None, None) if there was an error.
     """
     try:
-        add_config_creds()
+        return add_config_creds(interactive)
     except TypeError as e:
         print(f"Error creating config creds: {e}")
-        
-# [super important comment, you're welcome] init cipher suite a variable: cipher_suite (Redundency? What does redundency mean? Redundancy is good according to Linus Tech Tips. Don't want to lose your data! Oh.. I see. Oh whale.)      
-cipher_suite = init_key()
+        return None, None
 
-# [super important comment, you're welcome] create config creds (username, password) if they don't exist in config/config.json
-add_config_creds()
+# [super important comment, you're welcome] cipher suite, loaded by get_cipher_suite() on first use (Redundency? What does redundency mean? Redundancy is good according to Linus Tech Tips. Don't want to lose your data! Oh.. I see. Oh whale.)
+cipher_suite = None
+_cipher_suite_lock = threading.Lock()
+_keyring_mtime = None        # modification time of config/config.json when the cipher suite was loaded
+_keyring_checked_at = 0.0    # time.monotonic() of the last check
+
+def config_mtime():
+    try:
+        return os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def get_cipher_suite():
+    """
+    Returns the cipher suite, initializing the key on first use.
+
+    Every KEYRING_CHECK_INTERVAL seconds at most, config/config.json is checked for changes and the keys are reloaded if it changed,
+    so running API processes pick up a key rotation without a restart: within that interval of rotate_keys.py adding a new key,
+    every process encrypts with it.
+
+    Returns:
+        cipher_suite (CipherEngine): The cipher engine used for encryption and decryption.
+    """
+    global cipher_suite, _keyring_mtime, _keyring_checked_at
+    now = time.monotonic()
+    if cipher_suite is None or now - _keyring_checked_at >= KEYRING_CHECK_INTERVAL:
+        with _cipher_suite_lock:
+            if cipher_suite is None or now - _keyring_checked_at >= KEYRING_CHECK_INTERVAL:
+                mtime = config_mtime()
+                if cipher_suite is None or mtime != _keyring_mtime:
+                    cipher_suite = init_key() or cipher_suite
+                    _keyring_mtime = mtime
+                _keyring_checked_at = now
+    return cipher_suite
+
+def set_cipher_suite(engine):
+    """
+    Replaces the cipher suite, e.g. in benchmarks. The keys are no longer reloaded from config/config.json afterwards.
+
+    Args:
+        engine (CipherEngine): The cipher engine to use for encryption and decryption.
+    """
+    global cipher_suite, _keyring_checked_at
+    with _cipher_suite_lock:
+        cipher_suite = engine
+        _keyring_checked_at = float('inf')
+
+def bootstrap(interactive=True):
+    """
+    Prepares config/config.json for a new install: creates the encryption key and the config credentials (username, password) if they don't exist.
+
+    Args:
+        interactive (bool, optional): Prompt for missing config credentials. If False, they are read from the VAULT_CONFIG_USERNAME and
+            VAULT_CONFIG_PASSWORD environment variables and left unset if those are missing, so servers and scripts never block on input(). Defaults to True.
+
+    Returns:
+        tuple: The config (username, password). Either may be None in non-interactive mode.
+    """
+    get_cipher_suite()
+    return init_config_creds(interactive)
 
 def encrypt_password(password):
     """
@@ -57,7 +127,10 @@ def encrypt_password(password):
         str: The encrypted password.
 
     """
-    return cipher_suite.encrypt(password.encode()).decode()
+    start = time.perf_counter()
+    encrypted = get_cipher_suite().encrypt(password)
+    metrics.observe_since(metrics.CIPHER_SECONDS, start, 'encrypt')
+    return encrypted
 
 def decrypt_password(encrypted_password):
     """
@@ -70,6 +143,9 @@ def decrypt_password(encrypted_password):
         str: The decrypted password.
 
     Raises:
-        ValueError: If the encrypted password cannot be decrypted.
+        cryptography.fernet.InvalidToken: If the encrypted password cannot be decrypted.
     """
-    return cipher_suite.decrypt(encrypted_password.encode()).decode()
+    start = time.perf_counter()
+    decrypted = get_cipher_suite().decrypt(encrypted_password)
+    metrics.observe_since(metrics.CIPHER_SECONDS, start, 'decrypt')
+    return decrypted
@@ -6,15 +6,14 @@
 
 # TODO: Add more error handling and input validation
 
-import json
 import requests
-from requests.auth import HTTPBasicAuth
+from vault_client import get_client, decode
 from authusers import BASE_URL
 
-# API Endpoints/Constants
+# API Endpoints/Constants. Requests go to the base URL of the shared client (see vault_client.set_client)
 BASE_URL = BASE_URL
-CREDENTIALS_URL = f"{BASE_URL}/creds"
-SERVICE_URL = f"{BASE_URL}/services"
+CREDENTIALS_PATH = "/creds"
+SERVICE_PATH = "/services"
 
 # CREDENTIAL STORAGE INTERACTION
 def check_service_exists(service, auth_username, auth_password):
@@ -33,9 +32,9 @@ def check_service_exists(service, auth_username, auth_password):
         requests.RequestException: If there is an error with the request.
     """
     try:
-        response = requests.get(f"{SERVICE_URL}/{service}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('GET', f"{SERVICE_PATH}/{service}", auth_username, auth_password)
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         if result['message'] == "True":
             return True
         else:
@@ -61,20 +60,42 @@ def add_credential(service, username, password, note, auth_username, auth_passwo
         requests.RequestException: If there is an error with the request.
 
     """
-    if check_service_exists(service, auth_username, auth_password):
-        print(f"Service '{service}' already exists.")
-        return
-    
     try:
-        headers = {'Content-Type': 'application/json'}
         post_credential_data = {'username': username, 'password': password, 'service': service, 'note': note}
-        response = requests.post(f"{CREDENTIALS_URL}", headers=headers, data=json.dumps(post_credential_data), auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('POST', CREDENTIALS_PATH, auth_username, auth_password, json=post_credential_data)
+        if response.status_code == 409:
+            print(f"Service '{service}' already exists.")
+            return
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error adding credential: {e}")
         
+def add_credentials(credential_list, auth_username, auth_password):
+    """
+    Adds many credentials in one request using the API's bulk endpoint. Existing services are skipped, not overwritten.
+
+    Parameters:
+        credential_list (list): Dictionaries with the keys 'service', 'username', 'password' and 'note'.
+        auth_username (str): The username for authentication with the API.
+        auth_password (str): The password for authentication with the API.
+
+    Returns:
+        dict: The JSON response from the API, with the number of credentials 'created' and per-credential 'results'
+            (each with 'service', 'status' and 'message'). None if the request failed.
+
+    Raises:
+        requests.RequestException: If there is an error with the request.
+    """
+    try:
+        response = get_client().request('POST', f"{CREDENTIALS_PATH}/bulk", auth_username, auth_password, json=credential_list)
+        response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+        result = decode(response)
+        return result
+    except requests.RequestException as e:
+        print(f"Error adding credentials: {e}")
+        
 def delete_credential(service, auth_username, auth_password):
     """
     Deletes a credential for a given service using the provided authentication credentials.
@@ -94,24 +115,25 @@ def delete_credential(service, auth_username, auth_password):
         requests.exceptions.RequestException: If there is an error during the HTTP request.
 
     """
-    if not check_service_exists(service, auth_username, auth_password):
-        print(f"Service '{service}' does not exist.")
-        return {"message": "Credential not found!"}
     try:
-        response = requests.delete(f"{CREDENTIALS_URL}/{service}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('DELETE', f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password)
+        if response.status_code == 404:
+            print(f"Service '{service}' does not exist.")
+            return {"message": "Credential not found!"}
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error deleting credential: {e}")
         
-def get_services(auth_username, auth_password):
+def get_services(auth_username, auth_password, prefix=None):
     """
     Retrieves a list of services from the API.
 
     Parameters:
         auth_username (str): The username for authentication.
         auth_password (str): The password for authentication.
+        prefix (str, optional): Only return the services starting with this text, sorted.
 
     Returns:
         dict: The response from the API containing the list of services.
@@ -120,13 +142,56 @@ def get_services(auth_username, auth_password):
         requests.RequestException: If there is an error with the request.
     """
     try:
-        response = requests.get(f"{SERVICE_URL}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response, result = get_client().get_json(SERVICE_PATH, auth_username, auth_password, params={"prefix": prefix} if prefix else None)
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
         return result
     except requests.RequestException as e:
         print(f"Error getting all services: {e}")
         
+def iter_services(auth_username, auth_password, page_size=1000, prefix=None):
+    """
+    Iterates over the service names, sorted, fetching them one page at a time so large vaults are never held in memory at once.
+
+    Parameters:
+        auth_username (str): The username for authentication.
+        auth_password (str): The password for authentication.
+        page_size (int, optional): Services per request. Defaults to 1000.
+        prefix (str, optional): Only iterate over the services starting with this text.
+
+    Yields:
+        str: The next service name. Stops early, after printing the error, if a request fails.
+    """
+    params = {"limit": page_size}
+    if prefix:
+        params["prefix"] = prefix
+    try:
+        yield from get_client().iter_pages(SERVICE_PATH, auth_username, auth_password, params=params)
+    except requests.RequestException as e:
+        print(f"Error getting services: {e}")
+
+def search_credentials(query, auth_username, auth_password, limit=None):
+    """
+    Searches credentials by words of their service name or note. Passwords are not included in the results.
+
+    Args:
+        query (str): The search text, e.g. 'git work'. Every word must match the start of a word in the service or note.
+        auth_username (str): The username for authentication.
+        auth_password (str): The password for authentication.
+        limit (int, optional): The maximum number of matches. Defaults to the server's SEARCH_DEFAULT_LIMIT.
+
+    Returns:
+        list: Dictionaries with the keys 'id', 'service', 'username' and 'note', best matches first. None if the request failed.
+    """
+    params = {"q": query}
+    if limit is not None:
+        params["limit"] = limit
+    try:
+        response = get_client().request('GET', f"{CREDENTIALS_PATH}/search", auth_username, auth_password, params=params)
+        response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+        return decode(response)
+    except requests.RequestException as e:
+        print(f"Error searching credentials: {e}")
+
 def get_credential(service, auth_username, auth_password):
     """
     Retrieves a credential for a given service using the provided authentication credentials.
@@ -146,17 +211,41 @@ def get_credential(service, auth_username, auth_password):
     Prints:
         str: An error message if the service does not exist or if there is an error getting the credential.
     """
-    if not check_service_exists(service, auth_username, auth_password):
-        print(f"Service '{service}' does not exist.")
-        return {"message": "Credential not found!"}
     try:
-        response = requests.get(f"{CREDENTIALS_URL}/{service}", auth=HTTPBasicAuth(auth_username, auth_password))
+        response, result = get_client().get_json(f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password)
+        if response.status_code == 404:
+            print(f"Service '{service}' does not exist.")
+            return {"message": "Credential not found!"}
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
         return result
     except requests.RequestException as e:
         print(f"Error getting credential by service: {e}")
         
+def get_credentials(services, auth_username, auth_password):
+    """
+    Retrieves the credentials of many services in a single request.
+
+    Args:
+        services (list): The names of the services for which to retrieve credentials.
+        auth_username (str): The username for authentication.
+        auth_password (str): The password for authentication.
+
+    Returns:
+        dict: Maps each service name to the same value `get_credential` returns for it: the credential information, or a
+            dictionary with a "message" key indicating that the credential was not found. None if the request failed.
+
+    Raises:
+        requests.RequestException: If there is an error making the HTTP request.
+    """
+    try:
+        data = {'services': list(services)}
+        response = get_client().request('POST', f"{CREDENTIALS_PATH}/batch", auth_username, auth_password, json=data)
+        response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+        result = decode(response)
+        return result
+    except requests.RequestException as e:
+        print(f"Error getting credentials by service: {e}")
+        
 def update_credential(service, username, password, auth_username, auth_password):
     """
     Updates a credential for a given service using the provided authentication credentials.
@@ -178,29 +267,27 @@ def update_credential(service, username, password, auth_username, auth_password)
         requests.exceptions.RequestException: If there is an error during the HTTP request.
 
     """
-    if not check_service_exists(service, auth_username, auth_password):
-        print(f"Service '{service}' does not exist.")
-        return {"message": "Credential not found!"}
     try:
-        headers = {'Content-Type': 'application/json'}
         data = {'username': username, 'password': password}
-        response = requests.put(f"{CREDENTIALS_URL}/{service}", headers=headers, data=json.dumps(data), auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('PUT', f"{CREDENTIALS_PATH}/{service}", auth_username, auth_password, json=data)
+        if response.status_code == 404:
+            print(f"Service '{service}' does not exist.")
+            return {"message": "Credential not found!"}
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error updating credential: {e}")
         
 def set_note(service, note, auth_username, auth_password):
-    if not check_service_exists(service, auth_username, auth_password):
-        print(f"Service '{service}' does not exist.")
-        return {"message": "Credential not found!"}
     try:
-        headers = {'Content-Type': 'application/json'}
         data = {'note': note}
-        response = requests.put(f"{CREDENTIALS_URL}/{service}/note", headers=headers, data=json.dumps(data), auth=HTTPBasicAuth(auth_username, auth_password))
+        response = get_client().request('PUT', f"{CREDENTIALS_PATH}/{service}/note", auth_username, auth_password, json=data)
+        if response.status_code == 404:
+            print(f"Service '{service}' does not exist.")
+            return {"message": "Credential not found!"}
         response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
-        result = response.json()
+        result = decode(response)
         return result
     except requests.RequestException as e:
         print(f"Error setting note: {e}")
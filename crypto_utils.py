@@ -2,6 +2,7 @@
 
 import os
 import json
+import secrets
 from cryptography.fernet import Fernet
 
 CONFIG_DIR = 'config/'
@@ -65,25 +66,23 @@ def isFile(file_path):
     """
     return os.path.isfile(file_path)
         
-def get_or_gen_key():
+def get_or_gen_config_value(name, generator):
     """
-    Retrieves or generates a key for encryption and decryption of credential passwords.
+    Retrieves a secret value from the configuration file, generating and saving it first if it is missing.
 
     This function checks if the configuration directory exists and creates it if it doesn't.
     It also checks if the configuration file exists and creates it if it doesn't.
     If the configuration file is empty, it initializes it with an empty JSON object.
 
-    The function then loads the configuration file and checks if the 'cred_key' key exists and is not empty.
-    If the key is missing or empty, it generates a new key using the keygen function and adds it to the configuration file.
-    The new key is then returned.
+    The function then loads the configuration file and checks if the `name` key exists and is not empty.
+    If the key is missing or empty, a new value is generated by calling `generator` and added to the configuration file.
 
-    If the key is already present in the configuration file, it is returned.
+    Args:
+        name (str): The configuration key to retrieve, e.g. 'cred_key'.
+        generator (callable): Called with no arguments to create a new value. Must return a str.
 
     Returns:
-        str: The generated or retrieved key for encryption and decryption.
-
-    Raises:
-        None
+        str: The generated or retrieved value.
 
     Prints:
         str: A message indicating the creation of the configuration directory or file.
@@ -106,16 +105,79 @@ def get_or_gen_key():
     with open(CONFIG_PATH) as f:
         config = json.load(f)
     
-    if 'cred_key' not in config or not config['cred_key']:  
+    if name not in config or not config[name]:  
         # Append to config
-        key = keygen().decode()
-        config['cred_key'] = key
+        value = generator()
+        config[name] = value
         
         with open(CONFIG_PATH, 'w') as f:
             json.dump(config, f, indent=4)
             
-        return key
+        return value
     
     else:
-        return config['cred_key']
-    
\ No newline at end of file
+        return config[name]
+
+def get_or_gen_key():
+    """
+    Retrieves or generates a key for encryption and decryption of credential passwords.
+
+    The key is stored under 'cred_key' in the configuration file. If the key is missing or empty,
+    a new key is generated using the keygen function and added to the configuration file.
+
+    Returns:
+        str: The generated or retrieved key for encryption and decryption.
+
+    Raises:
+        None
+    """
+    return get_or_gen_config_value('cred_key', lambda: keygen().decode())
+
+def get_or_gen_token_key():
+    """
+    Retrieves or generates the secret used by api.py to sign bearer tokens.
+
+    The secret is stored under 'token_key' in the configuration file so that tokens stay valid across
+    restarts and are accepted by every API process sharing the same config directory.
+
+    Returns:
+        str: The generated or retrieved token signing secret.
+    """
+    return get_or_gen_config_value('token_key', lambda: secrets.token_urlsafe(32))
+
+def load_config_file():
+    """
+    Loads config/config.json.
+
+    Returns:
+        dict: The configuration, empty if the file is missing or empty.
+    """
+    if not isFile(CONFIG_PATH) or is_file_empty(CONFIG_PATH):
+        return {}
+    with open(CONFIG_PATH) as f:
+        return json.load(f)
+
+def save_config_file(config):
+    """
+    Replaces config/config.json atomically, so processes reading it concurrently never see a partly written file.
+
+    Args:
+        config (dict): The complete configuration to write.
+    """
+    if not isDir(CONFIG_DIR):
+        os.makedirs(CONFIG_DIR)
+    tmp_path = CONFIG_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, CONFIG_PATH)
+
+def get_keyring():
+    """
+    Returns every key credential passwords may be encrypted with: 'cred_key' (generated if missing), which encrypts new values,
+    followed by the keys listed under 'previous_cred_keys' while a key rotation is in progress (see rotate_keys.py).
+
+    Returns:
+        list: The keys as str, current key first.
+    """
+    key = get_or_gen_key()
+    return [key] + [old for old in load_config_file().get('previous_cred_keys', []) if old != key]
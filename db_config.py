@@ -0,0 +1,130 @@
+# SQLite storage profiles for api.py. A profile sets the PRAGMAs applied to every new database connection and the SQLAlchemy connection pool options.
+
+'''
+    - 'wal' (default): write-ahead logging, so readers keep reading while a write commits, with synchronous=NORMAL (durable across
+      application crashes, the last commits may be lost on power failure), a large page cache and memory-mapped reads.
+    - 'durable': like 'wal' but with synchronous=FULL, every commit is flushed to disk before it returns.
+    - 'legacy': SQLite's rollback journal and default settings, the behaviour before storage profiles existed. Only a busy timeout is added.
+    - Select a profile with the VAULT_STORAGE_PROFILE environment variable. Individual settings can be overridden with
+      app.config['SQLITE_PRAGMAS'] and app.config['SQLALCHEMY_ENGINE_OPTIONS'] before the engine is created.
+    - The pool size options only apply to databases SQLAlchemy pools with a QueuePool. In-memory SQLite databases use a StaticPool,
+      which rejects them, so they are left out there.
+'''
+
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_PROFILE = 'wal'
+
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+STORAGE_PROFILES = {
+    'wal': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,         # ms to wait for a lock before raising "database is locked"
+            'cache_size': -64000,         # negative = KiB, 64 MB page cache per connection
+            'mmap_size': 268435456,       # 256 MB of the database file read through mmap
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000,   # pages
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'pool_pre_ping': False,
+        },
+    },
+    'durable': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+            'cache_size': -64000,
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+        },
+    },
+    'legacy': {
+        'pragmas': {
+            'journal_mode': 'DELETE',
+            'busy_timeout': 5000,
+        },
+        'engine_options': {},
+    },
+}
+
+def get_storage_profile(name=None):
+    """
+    Returns a copy of a storage profile.
+
+    Parameters:
+        name (str, optional): The profile name. Defaults to the VAULT_STORAGE_PROFILE environment variable, or DEFAULT_PROFILE.
+
+    Returns:
+        dict: The profile's 'pragmas' and 'engine_options'.
+
+    Raises:
+        ValueError: If there is no profile with that name.
+    """
+    name = name or os.environ.get('VAULT_STORAGE_PROFILE', DEFAULT_PROFILE)
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile '{name}', choose one of: {', '.join(STORAGE_PROFILES)}")
+    profile = STORAGE_PROFILES[name]
+    return {'pragmas': dict(profile['pragmas']), 'engine_options': dict(profile['engine_options'])}
+
+def is_memory_database(uri):
+    """
+    Returns:
+        bool: True if `uri` is an in-memory SQLite database ('sqlite://', ':memory:' or a 'mode=memory' URI filename).
+    """
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return False
+    database = url.database or ''
+    return database in ('', ':memory:') or database.startswith('file::memory:') or url.query.get('mode') == 'memory'
+
+def configure_storage(app, name=None):
+    """
+    Writes a storage profile into a Flask app's config. Must be called before Flask-SQLAlchemy creates the engine.
+    Values already present in app.config['SQLITE_PRAGMAS'] and app.config['SQLALCHEMY_ENGINE_OPTIONS'] take precedence over the profile.
+    The profile's pool size options are skipped for in-memory databases and when the caller picked a poolclass.
+
+    Parameters:
+        app (flask.Flask): The app to configure.
+        name (str, optional): The profile name, see get_storage_profile.
+    """
+    profile = get_storage_profile(name)
+    app.config['SQLITE_PRAGMAS'] = {**profile['pragmas'], **app.config.get('SQLITE_PRAGMAS', {})}
+    engine_options = profile['engine_options']
+    configured = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if 'poolclass' in configured or is_memory_database(app.config.get('SQLALCHEMY_DATABASE_URI', 'sqlite://')):
+        engine_options = {key: value for key, value in engine_options.items() if key not in QUEUE_POOL_OPTIONS}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options, **configured}
+
+def register_pragmas(engine, pragmas):
+    """
+    Applies PRAGMAs to every new DBAPI connection the engine opens, via a 'connect' event.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): The SQLite engine.
+        pragmas (dict): PRAGMA name -> value, e.g. {'journal_mode': 'WAL'}.
+    """
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    statements = [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
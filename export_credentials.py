@@ -1,48 +1,125 @@
+# This file is used to export the credential table to a JSON or NDJSON file, reading and writing it in chunks so memory use stays flat however large the vault is.
+
+'''
+    Output formats:
+        json:   one JSON array, written one object at a time. The same format import_credentials.py reads.
+        ndjson: one JSON object per line (also known as JSON Lines). Chosen automatically for '.ndjson' and '.jsonl' paths.
+
+    - Rows are read with cursor.fetchmany(chunk_size) and written as they arrive, nothing but the current chunk is held in memory.
+    - Passwords are exported as stored (encrypted) unless decrypt=True. Decrypted exports can be imported again with import_credentials.py,
+      but contain every password in plaintext, handle them accordingly.
+    - The file is written next to json_path under a temporary name and renamed when complete, so a failed export never leaves a truncated file behind.
+'''
+
+import os
 import sqlite3
 import json
+import time
+from cryptography.fernet import InvalidToken
+
+DB_PATH = "instance/creds.db"    # the default path created at first run of api.py
+TABLE_NAME = "credential"
+CHUNK_SIZE = 1000                # rows fetched per fetchmany call
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+def table_columns(conn, table_name=TABLE_NAME):
+    """
+    Returns:
+        list: The column names of `table_name`, in table order.
+    """
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+def iter_rows(cursor, chunk_size=CHUNK_SIZE):
+    """
+    Yields the rows of an executed cursor, fetching `chunk_size` rows at a time.
+    """
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
 
-def export_credentials(json_path):
+def export_credentials(json_path, output_format=None, columns=None, decrypt=False, chunk_size=CHUNK_SIZE, db_path=DB_PATH):
     """
-    Export the data from a specified table in an SQLite database to a JSON file.
+    Export the credential table of the SQLite database to a JSON or NDJSON file.
 
     Parameters:
-        db_path (str): The path to the SQLite database file.
-        json_path (str): The path to the JSON file where the data will be exported.
+        json_path (str): The path to the file where the data will be exported.
+        output_format (str, optional): 'json' or 'ndjson'. Defaults to 'ndjson' for .ndjson/.jsonl paths and 'json' otherwise.
+        columns (list, optional): The columns to export, in order. Defaults to every column of the table.
+        decrypt (bool, optional): Export passwords in plaintext instead of as stored. Defaults to False.
+        chunk_size (int, optional): Rows read from the database at a time. Defaults to CHUNK_SIZE.
+        db_path (str, optional): The path to the SQLite database file. Defaults to DB_PATH.
 
     Returns:
-        None
+        int: The number of rows exported. None if nothing was exported.
     """
-    # define the path to the db file (this is the default path created at first run of api.py)
-    db_path = "instance/creds.db"
-    
-    # define the name of the table to retrieve data from
-    table_name = "credential"
-    
+    if output_format is None:
+        output_format = 'ndjson' if json_path.lower().endswith(NDJSON_EXTENSIONS) else 'json'
+    if output_format not in ('json', 'ndjson'):
+        print(f"\nUnknown export format '{output_format}', use 'json' or 'ndjson'.\nNo data exported.\n")
+        return
+
+    if not os.path.isfile(db_path):
+        print(f"\nDatabase file not found: {db_path}\nPlease check that the database file exists and that the path is correct.\nNo data exported.\n")
+        return
     try:
-        # connect to the SQLite2 database passed as db_path
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        # open read only, so exporting never creates or locks the database for writing
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
     except sqlite3.OperationalError as e:
         print(f"\nError connecting to database: {e}\nPlease check that the database file exists and that the path is correct.\n\
 No data exported.\n")
         return
-    
+
+    tmp_path = f"{json_path}.tmp"
     try:
-        # retrieve data from the specified table
-        cursor.execute(f"SELECT * FROM {table_name};")
-        rows = cursor.fetchall()
-    except sqlite3.OperationalError as e:
+        available = table_columns(conn)
+        columns = list(columns or available)
+        unknown = [column for column in columns if column not in available]
+        if unknown:
+            print(f"\nUnknown column(s): {', '.join(unknown)}\nAvailable columns: {', '.join(available)}\nNo data exported.\n")
+            return
+        decrypt = decrypt and 'password' in columns
+        if decrypt:
+            # imported here so that plain exports don't need the encryption key
+            from config_init import decrypt_password
+
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        cursor = conn.execute(f'SELECT {column_list} FROM "{TABLE_NAME}" ORDER BY id')
+        password_index = columns.index('password') if decrypt else None
+
+        start = time.perf_counter()
+        count = 0
+        with open(tmp_path, 'w') as out:
+            if output_format == 'json':
+                out.write('[')
+            for row in iter_rows(cursor, chunk_size):
+                if decrypt:
+                    row = list(row)
+                    row[password_index] = decrypt_password(row[password_index])
+                line = json.dumps(dict(zip(columns, row)))
+                if output_format == 'json':
+                    out.write(',\n    ' if count else '\n    ')
+                    out.write(line)
+                else:
+                    out.write(line)
+                    out.write('\n')
+                count += 1
+            if output_format == 'json':
+                out.write('\n]\n' if count else ']\n')
+        os.replace(tmp_path, json_path)
+    except (sqlite3.Error, OSError) as e:
         print(f"Error exporting data: {e}")
-    
-    # get names of fields/columns
-    column_names = [description[0] for description in cursor.description]
-    
-    # convert data to a JSON-compatible format
-    data = [dict(zip(column_names, row)) for row in rows]
-    
-    # write data to a JSON file
-    with open(json_path, 'w') as json_file:
-        json.dump(data, json_file, indent=4)
-    
-    # end connection
-    conn.close()
+        return
+    except InvalidToken:
+        print(f"Error decrypting data: the password of credential {count + 1} was not encrypted with a configured key.\nNo data exported.\n")
+        return
+    finally:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else count
+    print(f"\nExported {count} credentials to {json_path} in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+    return count
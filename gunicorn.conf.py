@@ -0,0 +1,26 @@
+# gunicorn settings for serving the API with several worker processes. Usage: gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden on the command line, e.g. gunicorn -c gunicorn.conf.py --workers 2 wsgi:app
+
+import multiprocessing
+import os
+
+bind = os.environ.get('VAULT_BIND', '0.0.0.0:5000')
+
+# SQLite serializes writes, so extra processes mostly help reads (password hashing, decryption, JSON). Threads cover I/O waits.
+workers = int(os.environ.get('VAULT_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('VAULT_THREADS', 4))
+
+# Build the app (key generation, create_all, migrations, first user) once in the master process instead of racing in every worker
+preload_app = True
+
+timeout = 30
+keepalive = 5    # seconds, lets VaultClient reuse connections between calls
+max_requests = 10000
+max_requests_jitter = 1000
+
+def post_fork(server, worker):
+    # Connections opened by the master before forking must not be shared, every worker opens its own
+    from wsgi import app
+    from api import reset_after_fork
+    reset_after_fork(app)
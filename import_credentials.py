@@ -16,13 +16,159 @@ JSON format: Incrementing key with credential object data attributes key:value p
         "note": "note2"
         }
 ]
+
+NDJSON format: the same objects, one per line
+{"username": "username1", "password": "password1", "service": "service1", "note": "note1"}
+{"username": "username2", "password": "password2", "service": "service2", "note": "note2"}
+
+Files are parsed incrementally and sent to the API in chunks while the next chunk is read, so memory use does not grow with the file size.
 '''
 
+import re
 import json
-from credentials import add_credential
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from credentials import add_credentials
 from authusers import load_config
 from crypto_utils import isFile
 
+READ_SIZE = 1 << 16              # characters read from the file at a time
+MAX_RECORD_SIZE = 1 << 20        # a single record larger than this is treated as malformed, so a broken file can't fill memory
+WHITESPACE = re.compile(r'\s*')
+
+def iter_json_records(f, read_size=READ_SIZE):
+    """
+    Parses JSON values from a file incrementally, reading `read_size` characters at a time.
+
+    Accepts either one JSON array (the format above, as written by export_credentials.py) or NDJSON, one value per line.
+    Only the current block of the file is held in memory, never the whole document.
+
+    Args:
+        f (file): A file opened in text mode.
+        read_size (int, optional): The number of characters read at a time. Defaults to READ_SIZE.
+
+    Yields:
+        The next decoded value (a dict for well-formed credential files).
+
+    Raises:
+        ValueError: If the file is not valid JSON or NDJSON. The message gives the record number and character offset.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, offset, eof = '', 0, 0, False
+    in_array = None       # decided by the first non-whitespace character
+    closed = False        # ']' of the array has been read
+    expect_value = True   # a record may start at pos
+    record = 0
+
+    while True:
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                break
+            offset += pos
+            buf, pos = f.read(read_size), 0
+            eof = not buf
+            continue
+
+        char = buf[pos]
+        if closed:
+            raise ValueError(f"Unexpected data after the end of the array at character {offset + pos}")
+        if in_array is None:
+            in_array = char == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and char == ']':
+            if expect_value and record:
+                raise ValueError(f"Trailing ',' before the end of the array at character {offset + pos}")
+            closed = True
+            pos += 1
+            continue
+        if in_array and char == ',' and not expect_value:
+            expect_value = True
+            pos += 1
+            continue
+        if not expect_value:
+            raise ValueError(f"Expecting ',' delimiter after record {record} at character {offset + pos}")
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+            complete = end < len(buf) or eof
+        except json.JSONDecodeError as e:
+            if eof or len(buf) - pos > MAX_RECORD_SIZE:
+                raise ValueError(f"Invalid JSON in record {record + 1} at character {offset + e.pos}: {e.msg}") from e
+            complete = False
+        if not complete:
+            # the record continues past the end of the buffer, keep its start and read more
+            more = f.read(read_size)
+            eof = not more
+            offset += pos
+            buf, pos = buf[pos:] + more, 0
+            continue
+
+        record += 1
+        pos = end
+        expect_value = not in_array    # NDJSON values need no delimiter
+        yield value
+
+    if in_array and not closed:
+        raise ValueError("Unexpected end of file, missing ']'")
+
+def normalize_credential(obj):
+    """
+    Checks one record from a credentials file and fills in the optional fields.
+
+    Args:
+        obj: One decoded JSON value.
+
+    Returns:
+        tuple: (credential, None) if the record is valid, (None, message) otherwise. Missing usernames and passwords default to
+            'default_username' and 'default_password', a missing note to ''.
+    """
+    if not isinstance(obj, dict):
+        return None, "not a JSON object"
+    credential = {
+        'username': obj.get('username', 'default_username'),
+        'password': obj.get('password', 'default_password'),
+        'service': obj.get('service'),
+        'note': obj.get('note', '') or '',
+    }
+    for field, value in credential.items():
+        if not isinstance(value, str):
+            return None, f"missing or invalid field: {field}"
+    if not credential['service']:
+        return None, "missing or invalid field: service"
+    return credential, None
+
+def iter_credentials(file_path, stats=None):
+    """
+    Lazily reads and validates the credentials in a JSON or NDJSON file. Invalid records are printed and skipped.
+
+    Args:
+        file_path (str): The path to the file containing the credentials.
+        stats (dict, optional): If given, 'read' and 'invalid' record counts are kept up to date in it.
+
+    Yields:
+        Dict[str, str]: The next valid credential with 'username', 'password', 'service' and 'note' keys.
+
+    Raises:
+        ValueError: If the file is not valid JSON or NDJSON.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('read', 0)
+    stats.setdefault('invalid', 0)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for number, obj in enumerate(iter_json_records(f), start=1):
+            stats['read'] += 1
+            credential, error = normalize_credential(obj)
+            if error:
+                stats['invalid'] += 1
+                print(f"Record {number} skipped: {error}")
+                continue
+            yield credential
+
 def load_credentials(file_path):
     """
     Load credentials from a JSON file.
@@ -35,69 +181,113 @@ def load_credentials(file_path):
             - 'username' (str): The username associated with the credential.
             - 'password' (str): The password associated with the credential.
             - 'service' (str): The service name for which the credential is used.
+            - 'note' (str): A note for the credential.
 
     Raises:
         None
 
-    This function loads credentials from a JSON file and returns them as a list of dictionaries. It assumes that each object in the JSON file contains the following data attributes: 'username', 'password', and 'service'. If any of these attributes are missing, default values ('default_username', 'default_password') are used. If the file does not exist, a message is printed and None is returned.
+    This function loads every credential into memory at once, use iter_credentials for large files. Missing usernames and passwords default to
+    'default_username' and 'default_password'. If the file does not exist or cannot be parsed, a message is printed and None is returned.
     """
     if not isFile(file_path):
         print(f"File not found: {file_path}")
         return None
     
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-        
-    credentials = []
-    
     try:
-        # this assumes that each object contains all 3 data attributes (username, password, service)
-        for obj in data:
-            # credential = data[key]
-            username = obj.get('username', 'default_username')
-            password = obj.get('password', 'default_password')
-            service = obj.get('service')
-            note = obj.get('note', '')
-            
-            credentials.append({
-                'username': username,
-                'password': password,
-                'service': service,
-                'note': note
-            })
-    except:
-        print(f"\nError parsing JSON file: {file_path}\nNo data imported.\n")
+        return list(iter_credentials(file_path))
+    except (ValueError, OSError) as e:
+        print(f"\nError parsing JSON file: {file_path}\n{e}\nNo data imported.\n")
+        return None
+
+# Number of credentials sent per POST /creds/bulk request
+CHUNK_SIZE = 500
+# Seconds between progress lines printed by write_credentials
+PROGRESS_INTERVAL = 2.0
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most `size` items.
+
+    Args:
+        iterable (iterable): The items to split.
+        size (int): The maximum number of items per chunk.
 
-    return credentials
+    Yields:
+        list: The next chunk of items.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
-def write_credentials(credential_list, username, password):
+def write_credentials(credential_list, username, password, chunk_size=CHUNK_SIZE, progress=False):
     """
-    Writes a list of credentials to the database.
+    Writes credentials to the database, sending them to the API's bulk endpoint in chunks.
+
+    The next chunk is read from `credential_list` while the previous one is being sent, so a lazy iterable (see iter_credentials)
+    is parsed and uploaded in a pipeline with at most two chunks in memory.
 
     Args:
-        credential_list (list): A list of dictionaries representing the credentials to be written. Each dictionary should have the following keys:
+        credential_list (iterable): The credentials to be written, a list or any iterable of dictionaries with the following keys:
             - username (str): The username associated with the credential.
             - password (str): The password associated with the credential.
             - service (str): The service associated with the credential.
+            - note (str): A note for the credential.
         username (str): The username of the user writing the credentials.
         password (str): The password of the user writing the credentials.
+        chunk_size (int, optional): The number of credentials per request. Defaults to CHUNK_SIZE.
+        progress (bool, optional): Print a progress line every PROGRESS_INTERVAL seconds. Defaults to False.
 
     Returns:
-        bool: True if the credentials are written to the database successfully, False otherwise.
+        bool: True if every chunk was accepted by the API, False otherwise. Credentials skipped because their service
+            already exists or because they are invalid are reported but do not count as a failure.
+
+    Raises:
+        ValueError: If `credential_list` is lazily parsed from a file that turns out to be malformed.
     """
     if credential_list is None:
         return False
 
+    counts = {'sent': 0, 'created': 0, 'skipped': 0}
+    start = last_report = time.perf_counter()
+
+    def handle(result):
+        nonlocal last_report
+        if result is None:
+            return False
+        counts['created'] += result['created']
+        for item in result['results']:
+            if item['status'] != 201:
+                counts['skipped'] += 1
+                print(f"Service '{item['service']}' skipped: {item['message']}")
+        counts['sent'] += len(result['results'])
+        now = time.perf_counter()
+        if progress and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            elapsed = now - start
+            print(f"{counts['sent']} credentials sent, {counts['created']} added, {counts['skipped']} skipped ({counts['sent'] / max(elapsed, 1e-9):,.0f}/sec)")
+        return True
+
     try:
-        for credential in credential_list:
-            add_credential(credential['service'], credential['username'], credential['password'], credential['note'], username, password)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = None
+            for chunk in chunked(credential_list, chunk_size):
+                if pending is not None and not handle(pending.result()):
+                    return False
+                pending = executor.submit(add_credentials, chunk, username, password)
+            if pending is not None and not handle(pending.result()):
+                return False
+        print(f"\n{counts['created']} credentials added, {counts['skipped']} skipped.")
         return True
+    except ValueError:
+        raise
     except:
         return False
 
 def import_credentials(file_path):
     """
-    Imports credentials from a file and writes them to a database.
+    Imports credentials from a JSON or NDJSON file and writes them to a database, reading the file incrementally.
 
     Args:
         file_path (str): The path to the file containing the credentials.
@@ -108,16 +298,24 @@ def import_credentials(file_path):
     Raises:
         None
     """
-    username, password = load_config()
+    if not isFile(file_path):
+        print(f"File not found: {file_path}")
+        return
 
-    credentials = load_credentials(file_path)
+    username, password = load_config()
 
-    # write
-    success = write_credentials(credentials, username, password)
+    stats = {}
+    try:
+        success = write_credentials(iter_credentials(file_path, stats), username, password, progress=True)
+    except (ValueError, OSError) as e:
+        # chunks sent before the error stay in the database, importing the file again skips them as existing services
+        print(f"\nError parsing JSON file: {file_path}\n{e}")
+        success = False
+    if stats.get('invalid'):
+        print(f"{stats['invalid']} of {stats['read']} records were invalid and skipped.")
     
     # feedback
     if success:
         print("\nCredentials written to database successfully!\n")
     else:
         print("\nError writing credentials to database.\n")
-    
\ No newline at end of file
@@ -0,0 +1,60 @@
+# Flask side of serialization.py: the JSON provider api.py installs and the MessagePack content negotiation.
+
+'''
+    - VaultJSONProvider encodes with serialization.BACKEND and answers in MessagePack when the request asks for it, see serialization.py.
+    - Kept apart from serialization.py so that the client modules, which import serialization.py, don't need Flask installed.
+'''
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from serialization import BACKEND, JSON_MIMETYPE, MSGPACK_MIMETYPE, dumps, json_default, loads, msgpack
+
+def wants_msgpack():
+    """
+    Returns:
+        bool: True if msgpack is installed and the current request prefers 'application/msgpack' over JSON.
+    """
+    if msgpack is None or not has_request_context():
+        return False
+    return request.accept_mimetypes.best_match((JSON_MIMETYPE, MSGPACK_MIMETYPE)) == MSGPACK_MIMETYPE
+
+class VaultJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with the selected backend and answering in MessagePack when the client asks for it.
+    With the json backend, encoding and decoding are left to Flask's default provider. Keys are sorted like Flask does unless
+    sort_keys is turned off (app.json.sort_keys = False), so every backend produces the same bytes and ETags.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if BACKEND == 'json':
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode()
+
+    def loads(self, s, **kwargs):
+        if BACKEND == 'json':
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if wants_msgpack():
+            obj = self._prepare_response_obj(args, kwargs)
+            response = self._app.response_class(msgpack.packb(obj, default=json_default), mimetype=MSGPACK_MIMETYPE)
+        elif BACKEND == 'json':
+            response = super().response(*args, **kwargs)
+        else:
+            # the encoded bytes go straight into the response, without a round trip through str. The trailing newline matches
+            # Flask's provider, so ASCII bodies are byte for byte the same with every backend.
+            body = dumps(self._prepare_response_obj(args, kwargs), sort_keys=self.sort_keys) + b'\n'
+            response = self._app.response_class(body, mimetype=self.mimetype)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+def install(app):
+    """
+    Makes the app encode and decode JSON with the selected backend, see VaultJSONProvider.
+
+    Parameters:
+        app (flask.Flask): The app.
+    """
+    app.json = VaultJSONProvider(app)
@@ -0,0 +1,265 @@
+# In-process metrics for api.py, rendered in the Prometheus text exposition format by GET /metrics.
+
+'''
+    - Request latency per route, method and status code, password hashing, credential encryption/decryption and SQL statement time
+      are recorded in histograms. Database connection pool, auth cache and credential cache figures are read when /metrics is scraped.
+    - Recording an observation is a bisect and a few additions under a lock, cheap enough to stay enabled under full load.
+      Set VAULT_METRICS=0 to turn recording and the endpoint off.
+    - Routes are labelled with their URL rule ('/creds/<string:service>'), never the actual path, so service and user names
+      don't end up in the metrics and the number of series stays bounded.
+    - Metrics are kept per process. With several gunicorn workers each scrape sees the worker that answered it, scrape each
+      worker separately or aggregate in Prometheus.
+'''
+
+import threading
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CIPHER_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def format_value(value):
+    """
+    Returns:
+        str: A sample value or bucket bound as Prometheus expects it.
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def escape_label_value(value):
+    """
+    Returns:
+        str: `value` with backslashes, double quotes and newlines escaped for a label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values):
+    """
+    Returns:
+        str: '{name="value",...}', or '' if there are no labels.
+    """
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)) + '}'
+
+class Histogram:
+    """
+    A labelled histogram. Each series keeps a count per bucket, the bucket counts are only made cumulative when rendered.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        """
+        Parameters:
+            name (str): The metric name, e.g. 'vault_http_request_duration_seconds'.
+            documentation (str): The HELP text.
+            labelnames (tuple): Names of the labels passed to observe(), in order.
+            buckets (tuple): Upper bounds of the buckets in seconds. +Inf is added automatically.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}    # label values -> [bucket counts (last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """
+        Records one observation.
+
+        Parameters:
+            value (float): The observed value, e.g. a duration in seconds.
+            *labelvalues: One value per label name.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        """
+        Yields:
+            str: The lines of the metric in the text exposition format.
+        """
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        bucket_names = self.labelnames + ('le',)
+        for labelvalues, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(bucket_names, labelvalues + (format_value(bound),))} {cumulative}"
+            labels = format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class CallbackMetric:
+    """
+    A gauge or counter whose samples are read from a callback when the metrics are rendered.
+    """
+
+    def __init__(self, name, documentation, metric_type, labelnames, callback):
+        """
+        Parameters:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            metric_type (str): 'gauge' or 'counter'.
+            labelnames (tuple): Names of the labels in the callback's keys.
+            callback (callable): Returns a dict mapping a tuple of label values to the current value.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        try:
+            samples = self.callback()
+        except Exception:
+            # a broken callback must not take the whole endpoint down
+            return
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        for labelvalues, value in sorted(samples.items()):
+            yield f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}"
+
+class Registry:
+    """
+    The metrics rendered by GET /metrics, in registration order. Registering a name again replaces the earlier metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """
+        Returns:
+            str: Every registered metric in the text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'vault_http_request_duration_seconds', "Time spent handling HTTP requests.", ('route', 'method', 'status'), REQUEST_BUCKETS))
+PASSWORD_HASH_SECONDS = REGISTRY.register(Histogram(
+    'vault_password_hash_duration_seconds', "Time spent in check_password_hash and generate_password_hash.", ('operation',), HASH_BUCKETS))
+CIPHER_SECONDS = REGISTRY.register(Histogram(
+    'vault_cipher_duration_seconds', "Time spent encrypting and decrypting credential passwords.", ('operation',), CIPHER_BUCKETS))
+SQL_SECONDS = REGISTRY.register(Histogram(
+    'vault_sql_duration_seconds', "Time spent executing SQL statements, fetching the rows not included.", (), SQL_BUCKETS))
+
+enabled = True    # set by configure(), checked before recording anything
+
+def configure(enable):
+    """
+    Turns recording on or off for the whole process.
+
+    Parameters:
+        enable (bool): Whether observations are recorded.
+    """
+    global enabled
+    enabled = bool(enable)
+
+def observe_since(histogram, start, *labelvalues):
+    """
+    Records the time elapsed since `start` (a time.perf_counter() value), if metrics are enabled.
+    """
+    if enabled:
+        histogram.observe(time.perf_counter() - start, *labelvalues)
+
+def register_sql_timing(engine):
+    """
+    Records the execution time of every SQL statement sent through the engine in SQL_SECONDS.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): The engine to time.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+        observe_since(SQL_SECONDS, conn.info['metrics_start'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def discard_sql_timer(context):
+        starts = context.connection.info.get('metrics_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+def register_pool_metrics(engine):
+    """
+    Exposes the connection pool of the engine as gauges, read when the metrics are rendered.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): The engine whose pool is reported.
+    """
+    pool = engine.pool
+
+    def pool_stats():
+        stats = {}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[(name,)] = method()
+        return stats
+
+    REGISTRY.register(CallbackMetric(
+        'vault_db_pool_connections', "Database connection pool: configured size, idle (checkedin) and in use (checkedout) connections, and overflow (negative while below the configured size).",
+        'gauge', ('state',), pool_stats))
+
+def register_auth_cache_metrics(cache):
+    """
+    Exposes the hit and miss counters and the size of the verified-credential cache.
+
+    Parameters:
+        cache (auth_cache.VerifiedCredentialCache): The app's cache.
+    """
+    REGISTRY.register(CallbackMetric(
+        'vault_auth_cache_lookups_total', "Verified-credential cache lookups by result.", 'counter', ('result',),
+        lambda: {('hit',): cache.hits, ('miss',): cache.misses}))
+    REGISTRY.register(CallbackMetric(
+        'vault_auth_cache_entries', "Entries in the verified-credential cache.", 'gauge', (), lambda: {(): cache.stats()['size']}))
+
+def register_cred_cache_metrics(cache):
+    """
+    Exposes the hit, miss and eviction counters and the size of the credential row cache.
+
+    Parameters:
+        cache (row_cache.CredentialRowCache): The app's cache.
+    """
+    REGISTRY.register(CallbackMetric(
+        'vault_cred_cache_lookups_total', "Credential row cache lookups by result.", 'counter', ('result',),
+        lambda: {('hit',): cache.hits, ('miss',): cache.misses}))
+    REGISTRY.register(CallbackMetric(
+        'vault_cred_cache_evictions_total', "Credential rows evicted from the full cache.", 'counter', (), lambda: {(): cache.evictions}))
+    REGISTRY.register(CallbackMetric(
+        'vault_cred_cache_entries', "Entries in the credential row cache.", 'gauge', (), lambda: {(): cache.stats()['size']}))
@@ -0,0 +1,248 @@
+# In-place schema migrations for existing instance/creds.db files. db.create_all() only creates missing tables, so changes to existing tables are applied here.
+
+'''
+    - Migrations run in order at startup of api.py. SQLite's PRAGMA user_version records how many have been applied, so each one runs once per database file.
+    - A migration is a function taking an open SQLAlchemy connection. If it raises MigrationError the API does not start, since later migrations (and the models) may depend on it.
+    - Each migration and its user_version bump run in one BEGIN IMMEDIATE ... COMMIT transaction, SQLite rolls back DDL too.
+      A crash or error part way through leaves the database at the previous version, and the migration is retried on the next start.
+    - A migration raising MigrationDeferred needs something this SQLite build lacks. It is rolled back and logged, listed in the
+      deferred_migration table and its version is recorded, so the migrations after it still run. Deferred migrations are retried
+      on every start and removed from the list once they succeed, so they must not depend on the ones after them.
+    - Migrations must also be safe to run against a database freshly created by db.create_all() from the current models.
+'''
+
+import logging
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+class MigrationError(Exception):
+    """
+    Raised when an existing database cannot be migrated without manual intervention.
+    """
+
+class MigrationDeferred(Exception):
+    """
+    Raised when a migration can't be applied with the SQLite library in use, e.g. one without FTS5. The API starts without it.
+    """
+
+def index_credential_service(conn):
+    """
+    Adds the unique index on credential.service used by every /creds/<service> and /services/<service> lookup.
+
+    Databases created before the index existed may contain duplicate service names, which SQLite refuses to put under a
+    unique index. In that case the duplicates are logged and the migration fails until they are resolved.
+
+    Parameters:
+        conn (sqlalchemy.engine.Connection): An open connection inside a transaction.
+
+    Raises:
+        MigrationError: If duplicate service names prevent the index from being created.
+    """
+    duplicates = conn.exec_driver_sql(
+        "SELECT service, COUNT(*) FROM credential GROUP BY service HAVING COUNT(*) > 1"
+    ).fetchall()
+    if duplicates:
+        logger.error("Cannot add unique index on credential.service, duplicate services found:\n%s",
+                     "\n".join(f"    {service} ({count} rows)" for service, count in duplicates))
+        raise MigrationError("Delete or rename the duplicate services and restart the API.")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_credential_service ON credential (service)")
+
+def has_column(conn, table, column):
+    """
+    Returns:
+        bool: True if `table` already has a column named `column`.
+    """
+    return any(row[1] == column for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")'))
+
+def add_revisions(conn):
+    """
+    Adds the revision counters behind the API's ETags.
+
+    - credential.revision is bumped by a trigger whenever a credential's username, password, service or note changes.
+    - table_revision holds one counter per table, bumped by triggers whenever a row is added or removed (and for users,
+      renamed), so GET /services and GET /users can tell whether their result changed without reading the table.
+
+    Triggers are used instead of application code so that every writer, including scripts using sqlite3 directly, keeps the counters current.
+
+    Parameters:
+        conn (sqlalchemy.engine.Connection): An open connection inside a transaction.
+    """
+    if not has_column(conn, 'credential', 'revision'):
+        conn.exec_driver_sql("ALTER TABLE credential ADD COLUMN revision INTEGER NOT NULL DEFAULT 1")
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS table_revision (name VARCHAR(80) NOT NULL PRIMARY KEY, revision INTEGER NOT NULL)")
+    conn.exec_driver_sql("INSERT OR IGNORE INTO table_revision (name, revision) VALUES ('credential', 1), ('user', 1)")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_revision_update AFTER UPDATE OF username, password, service, note ON credential
+        BEGIN
+            UPDATE credential SET revision = revision + 1 WHERE id = NEW.id;
+        END""")
+    for table, event in [('credential', 'INSERT'), ('credential', 'DELETE'), ('user', 'INSERT'), ('user', 'DELETE'), ('user', 'UPDATE OF username, email')]:
+        trigger = f"{table}_table_revision_{event.split()[0].lower()}"
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON "{table}"
+            BEGIN
+                UPDATE table_revision SET revision = revision + 1 WHERE name = '{table}';
+            END""")
+
+def add_credential_search(conn):
+    """
+    Adds credential_fts, the full-text index behind GET /creds/search, over the service and note of every credential.
+
+    - It is an external content FTS5 table: the text is read from the credential table, only the index is stored.
+    - Triggers keep it in sync on insert, delete and changes to service or note, for every writer like the revision triggers.
+    - prefix='2 3' adds prefix indexes, so the short 'term*' queries the search route sends don't scan the whole term list.
+
+    On SQLite builds without FTS5 the migration is deferred until a start with FTS5 available, GET /creds/search falls back to a
+    LIKE scan in the meantime.
+
+    Parameters:
+        conn (sqlalchemy.engine.Connection): An open connection inside a transaction.
+
+    Raises:
+        MigrationDeferred: If SQLite has no FTS5 module.
+    """
+    try:
+        conn.exec_driver_sql("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS credential_fts USING fts5(
+                service, note, content='credential', content_rowid='id', prefix='2 3'
+            )""")
+    except OperationalError as e:
+        raise MigrationDeferred(f"Full-text search unavailable, GET /creds/search will scan the credential table: {e}") from e
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_fts_insert AFTER INSERT ON credential
+        BEGIN
+            INSERT INTO credential_fts (rowid, service, note) VALUES (NEW.id, NEW.service, NEW.note);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_fts_delete AFTER DELETE ON credential
+        BEGIN
+            INSERT INTO credential_fts (credential_fts, rowid, service, note) VALUES ('delete', OLD.id, OLD.service, OLD.note);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_fts_update AFTER UPDATE OF service, note ON credential
+        BEGIN
+            INSERT INTO credential_fts (credential_fts, rowid, service, note) VALUES ('delete', OLD.id, OLD.service, OLD.note);
+            INSERT INTO credential_fts (rowid, service, note) VALUES (NEW.id, NEW.service, NEW.note);
+        END""")
+    # index the credentials added before this migration
+    conn.exec_driver_sql("INSERT INTO credential_fts (credential_fts) VALUES ('rebuild')")
+
+def unique_credential_revisions(conn):
+    """
+    Makes credential.revision unique across every row the table ever held, so the ETags of GET /creds/<service> identify one
+    version of one credential.
+
+    credential.id is reused by SQLite once the newest row is deleted, and revisions used to start at 1 for every row, so a service
+    deleted and added again got the ETag of the deleted credential. Revisions are now drawn from the 'credential_row' counter in
+    table_revision, which only ever grows: triggers give every inserted row and every change the next value. Existing rows are
+    renumbered once, their ETags change and clients fetch them again.
+
+    Parameters:
+        conn (sqlalchemy.engine.Connection): An open connection inside a transaction.
+    """
+    conn.exec_driver_sql("UPDATE credential SET revision = id")
+    conn.exec_driver_sql("INSERT OR IGNORE INTO table_revision (name, revision) SELECT 'credential_row', COALESCE(MAX(id), 0) FROM credential")
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS credential_revision_update")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_revision_update AFTER UPDATE OF username, password, service, note ON credential
+        BEGIN
+            UPDATE table_revision SET revision = revision + 1 WHERE name = 'credential_row';
+            UPDATE credential SET revision = (SELECT revision FROM table_revision WHERE name = 'credential_row') WHERE id = NEW.id;
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS credential_revision_insert AFTER INSERT ON credential
+        BEGIN
+            UPDATE table_revision SET revision = revision + 1 WHERE name = 'credential_row';
+            UPDATE credential SET revision = (SELECT revision FROM table_revision WHERE name = 'credential_row') WHERE id = NEW.id;
+        END""")
+
+# Append only. Never reorder or remove entries, the position of a migration is its version number.
+MIGRATIONS = [
+    index_credential_service,
+    add_revisions,
+    add_credential_search,
+    unique_credential_revisions,
+]
+
+def run_in_transaction(conn, work):
+    """
+    Calls work() inside BEGIN IMMEDIATE ... COMMIT, rolling back if it raises. IMMEDIATE takes the write lock up front, so two
+    workers starting together migrate one after the other.
+    """
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        work()
+        conn.exec_driver_sql("COMMIT")
+    except BaseException:
+        if conn.connection.driver_connection.in_transaction:
+            conn.exec_driver_sql("ROLLBACK")
+        raise
+
+def deferred_migrations(conn):
+    """
+    Returns:
+        list: The names of the migrations deferred on earlier starts.
+    """
+    return [name for (name,) in conn.exec_driver_sql("SELECT name FROM deferred_migration ORDER BY name")]
+
+def retry_deferred(conn, name):
+    migration = next((migration for migration in MIGRATIONS if migration.__name__ == name), None)
+
+    def retry():
+        # another process may have applied it while we waited for the lock
+        if name not in deferred_migrations(conn):
+            return
+        if migration is not None:
+            migration(conn)
+        conn.exec_driver_sql("DELETE FROM deferred_migration WHERE name = ?", (name,))
+
+    try:
+        run_in_transaction(conn, retry)
+    except MigrationDeferred as e:
+        logger.warning("Migration %s still deferred: %s", name, e)
+
+def apply_migration(conn, number, migration):
+    def apply():
+        # another process may have applied it while we waited for the lock
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= number:
+            return
+        conn.exec_driver_sql("SAVEPOINT migration")
+        try:
+            migration(conn)
+        except MigrationDeferred as e:
+            conn.exec_driver_sql("ROLLBACK TO migration")
+            conn.exec_driver_sql("INSERT OR IGNORE INTO deferred_migration (name) VALUES (?)", (migration.__name__,))
+            logger.warning("Migration %d (%s) deferred: %s", number, migration.__name__, e)
+        conn.exec_driver_sql("RELEASE migration")
+        conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+    run_in_transaction(conn, apply)
+
+def migrate(engine):
+    """
+    Applies every migration the database has not seen yet, and retries the deferred ones.
+
+    Parameters:
+        engine (sqlalchemy.engine.Engine): Engine bound to the SQLite database to migrate.
+
+    Returns:
+        int: The schema version of the database after migrating.
+    """
+    with engine.connect() as conn:
+        dbapi_connection = conn.connection.driver_connection
+        # sqlite3 only opens transactions before INSERT/UPDATE/DELETE, DDL would run in autocommit mode. Manage them explicitly instead.
+        isolation_level = dbapi_connection.isolation_level
+        dbapi_connection.isolation_level = None
+        try:
+            run_in_transaction(conn, lambda: conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS deferred_migration (name VARCHAR(80) NOT NULL PRIMARY KEY)"))
+            for name in deferred_migrations(conn):
+                retry_deferred(conn, name)
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                apply_migration(conn, number, migration)
+                version = number
+            conn.commit()
+        finally:
+            dbapi_connection.isolation_level = isolation_level
+    return version
@@ -0,0 +1,139 @@
+# Password hash settings for the API users in api.py, and a command to calibrate them on the host.
+# Usage: python password_hashing.py [--target-ms 50] [--rounds 5]
+
+'''
+    - The method is any werkzeug generate_password_hash method string, set with VAULT_PASSWORD_HASH, e.g.
+        scrypt:32768:8:1        scrypt with N=32768, r=8, p=1 (werkzeug's default, 'scrypt')
+        pbkdf2:sha256:600000    PBKDF2-HMAC-SHA256 with 600000 iterations (werkzeug's default for 'pbkdf2')
+    - Stored hashes carry their parameters. When a user logs in with a hash made with other parameters, api.verify_password
+      rehashes the password with the configured ones, so changing the setting upgrades (or downgrades) every active user over time.
+    - Hash cost only limits requests that verify a password: basic auth cache misses and POST /auth/token. Bearer tokens and
+      the verified-credential cache (auth_cache.py) skip it, so prefer those over weakening the hash.
+'''
+
+import argparse
+import statistics
+import time
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+DEFAULT_TARGET_MS = 50
+DEFAULT_ROUNDS = 5
+
+# Candidates tried by calibrate(), weakest first within each family
+SCRYPT_CANDIDATES = [f"scrypt:{2 ** exponent}:8:1" for exponent in range(12, 18)]
+PBKDF2_CANDIDATES = [f"pbkdf2:sha256:{iterations}" for iterations in (100000, 200000, 300000, 600000, 1000000, 1500000)]
+
+# Below these, recommendations come with a warning (OWASP password storage guidance)
+MINIMUM_SCRYPT_N = 2 ** 15
+MINIMUM_PBKDF2_SHA256_ITERATIONS = 600000
+
+@lru_cache(maxsize=16)
+def hash_prefix(method):
+    """
+    Returns the parameter prefix of hashes made with a method, e.g. 'scrypt' -> 'scrypt:32768:8:1'. Computed once per method by hashing a dummy value,
+    so werkzeug's defaults are filled in exactly as generate_password_hash does.
+
+    Parameters:
+        method (str): A generate_password_hash method string.
+
+    Returns:
+        str: The part of a stored hash before the first '$'.
+    """
+    return generate_password_hash('calibration', method=method).split('$', 1)[0]
+
+def needs_rehash(password_hash, method=DEFAULT_METHOD):
+    """
+    Parameters:
+        password_hash (str): A stored hash.
+        method (str): The configured method string.
+
+    Returns:
+        bool: True if the hash was made with other parameters than `method`.
+    """
+    return password_hash.split('$', 1)[0] != hash_prefix(method)
+
+def measure(method, rounds=DEFAULT_ROUNDS):
+    """
+    Times check_password_hash for a method on this host.
+
+    Parameters:
+        method (str): A generate_password_hash method string.
+        rounds (int): Number of verifications timed.
+
+    Returns:
+        float: The median verification time in milliseconds.
+    """
+    password_hash = generate_password_hash('calibration-password', method=method)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        check_password_hash(password_hash, 'calibration-password')
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def below_minimum(method):
+    """
+    Returns:
+        bool: True if the parameters of `method` are weaker than the OWASP minimum for its family.
+    """
+    name, *params = hash_prefix(method).split(':')
+    if name == 'scrypt':
+        return int(params[0]) < MINIMUM_SCRYPT_N
+    if name == 'pbkdf2' and params[0] == 'sha256':
+        return int(params[1]) < MINIMUM_PBKDF2_SHA256_ITERATIONS
+    return False
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, rounds=DEFAULT_ROUNDS, candidates=None):
+    """
+    Measures candidate parameters and recommends, per family, the strongest one verifying within `target_ms` on this host.
+    Candidates of a family are measured weakest first and stop at the first one over the target.
+
+    Parameters:
+        target_ms (float): The highest acceptable verification time in milliseconds.
+        rounds (int): Number of verifications timed per candidate.
+        candidates (list, optional): Method strings to try. Defaults to SCRYPT_CANDIDATES + PBKDF2_CANDIDATES.
+
+    Returns:
+        tuple: (results, recommendations) where results is a list of (method, median ms) and recommendations maps
+            the family ('scrypt', 'pbkdf2') to the recommended method string, or None if no candidate is fast enough.
+    """
+    results = []
+    recommendations = {}
+    too_slow = set()    # families with a candidate over the target, their stronger candidates are skipped
+    for method in candidates or SCRYPT_CANDIDATES + PBKDF2_CANDIDATES:
+        family = method.split(':', 1)[0]
+        recommendations.setdefault(family, None)
+        if family in too_slow:
+            continue
+        elapsed = measure(method, rounds)
+        results.append((method, elapsed))
+        if elapsed <= target_ms:
+            recommendations[family] = method
+        else:
+            too_slow.add(family)
+    return results, recommendations
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure password hash cost on this host and recommend VAULT_PASSWORD_HASH settings.")
+    parser.add_argument('--target-ms', type=float, default=DEFAULT_TARGET_MS, help="highest acceptable time to verify one password")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="verifications timed per candidate")
+    args = parser.parse_args()
+
+    print(f"\n{'method':<26}{'verify ms':>11}{'verifications/s per core':>26}")
+    results, recommendations = calibrate(args.target_ms, args.rounds)
+    for method, elapsed in results:
+        print(f"{method:<26}{elapsed:>11.1f}{1000 / elapsed:>26.0f}")
+
+    print(f"\nStrongest settings verifying within {args.target_ms:g} ms:")
+    for family, method in recommendations.items():
+        if method is None:
+            print(f"    {family}: none of the candidates is fast enough")
+            continue
+        warning = "    (below the recommended minimum, consider a higher target)" if below_minimum(method) else ''
+        print(f"    VAULT_PASSWORD_HASH={method}{warning}")
+    print("\nUsers are rehashed with the new setting the next time they log in with their password.\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# Opt-in per-request profiling for api.py with cProfile, and a command line tool to merge the profiles of one route.
+
+'''
+    - Off by default. create_app only wraps the app when VAULT_PROFILE=1 (profile every request) or VAULT_PROFILE_SECRET is set
+      (profile requests sending the header 'X-Vault-Profile: <secret>'), so a disabled profiler costs nothing.
+    - Each profiled request writes one pstats file to VAULT_PROFILE_DIR ('profiles' by default), named
+      <method>.<route>.<UTC timestamp>.<pid>.<duration>ms.prof, e.g. GET.creds.service.20240501T120000123.4242.12ms.prof.
+      The route is the URL rule with the converters reduced to their names, the requested path (with service names) is never used.
+    - Only one request is profiled at a time per process. Requests arriving while another one is being profiled are served normally.
+
+    Merging the profiles of a route:
+        python profiling.py list
+        python profiling.py merge creds.service --method GET --sort cumulative --limit 30 [--output merged.prof]
+'''
+
+import argparse
+import cProfile
+import glob
+import hmac
+import os
+import pstats
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+PROFILE_HEADER = 'HTTP_X_VAULT_PROFILE'    # WSGI environ key of the X-Vault-Profile header
+DEFAULT_PROFILE_DIR = 'profiles'
+
+def route_slug(rule):
+    """
+    Returns:
+        str: A file name friendly form of a URL rule, e.g. '/creds/<string:service>/note' -> 'creds.service.note'.
+    """
+    path = re.sub(r'<(?:[^:>]+:)?([^>]+)>', r'\1', rule)
+    return '.'.join(part for part in re.split(r'[^A-Za-z0-9_]+', path) if part) or 'root'
+
+class RequestProfiler:
+    """
+    WSGI middleware running selected requests under cProfile and writing one profile file per request.
+    """
+
+    def __init__(self, wsgi_app, url_map, profile_dir=DEFAULT_PROFILE_DIR, profile_all=False, secret=None):
+        """
+        Parameters:
+            wsgi_app (callable): The WSGI app to wrap, usually flask_app.wsgi_app.
+            url_map (werkzeug.routing.Map): The app's URL map, used to name profiles after the matched route.
+            profile_dir (str): Directory the profiles are written to. Created if missing.
+            profile_all (bool): Profile every request.
+            secret (str, optional): Profile requests whose X-Vault-Profile header equals this value.
+        """
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.profile_dir = profile_dir
+        self.profile_all = profile_all
+        self.secret = secret.encode() if secret else None
+        self._lock = threading.Lock()
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def wants_profile(self, environ):
+        if self.profile_all:
+            return True
+        header = environ.get(PROFILE_HEADER)
+        return bool(self.secret and header and hmac.compare_digest(header.encode(), self.secret))
+
+    def route_name(self, environ):
+        try:
+            rule, _ = self.url_map.bind_to_environ(environ).match(return_rule=True)
+            return route_slug(rule.rule)
+        except Exception:
+            # 404s, 405s and redirects have no route of their own
+            return 'unmatched'
+
+    def __call__(self, environ, start_response):
+        if not self.wants_profile(environ) or not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            body = profile.runcall(self.wsgi_app, environ, start_response)
+        except BaseException:
+            self._lock.release()
+            raise
+        return ProfiledBody(self, profile, body, environ, start)
+
+    def finish(self, profile, environ, start):
+        """
+        Writes the profile of a request once its body is closed and lets the next request be profiled.
+        """
+        try:
+            self.write(profile, environ, time.perf_counter() - start)
+        finally:
+            self._lock.release()
+
+    def write(self, profile, environ, elapsed):
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')[:-3]
+        name = f"{environ.get('REQUEST_METHOD', 'GET')}.{self.route_name(environ)}.{timestamp}.{os.getpid()}.{elapsed * 1000:.0f}ms.prof"
+        try:
+            profile.dump_stats(os.path.join(self.profile_dir, name))
+        except OSError as e:
+            print(f"Error writing profile {name}: {e}")
+
+class ProfiledBody:
+    """
+    Passes a profiled request's response iterable through chunk by chunk, profiling the production of every chunk so that lazily
+    generated (streamed) responses are included without buffering them. close() closes the wrapped iterable, as WSGI requires,
+    then writes the profile.
+    """
+
+    def __init__(self, profiler, profile, body, environ, start):
+        self.profiler = profiler
+        self.profile = profile
+        self.body = body
+        self.environ = environ
+        self.start = start
+        self._iterator = None
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self.body)
+        self.profile.enable()
+        try:
+            return next(self._iterator)
+        finally:
+            self.profile.disable()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self.body, 'close'):
+                # response close hooks and teardown run here, they belong to the request
+                self.profile.enable()
+                try:
+                    self.body.close()
+                finally:
+                    self.profile.disable()
+        finally:
+            self.profiler.finish(self.profile, self.environ, self.start)
+
+def install(app):
+    """
+    Wraps a Flask app in a RequestProfiler if profiling is enabled in its config (PROFILE_ALL or PROFILE_SECRET).
+
+    Parameters:
+        app (flask.Flask): The app to profile.
+
+    Returns:
+        bool: True if the profiler was installed.
+    """
+    if not app.config.get('PROFILE_ALL') and not app.config.get('PROFILE_SECRET'):
+        return False
+    app.wsgi_app = RequestProfiler(app.wsgi_app, app.url_map, app.config.get('PROFILE_DIR') or DEFAULT_PROFILE_DIR,
+                                   profile_all=app.config.get('PROFILE_ALL'), secret=app.config.get('PROFILE_SECRET'))
+    return True
+
+def profile_files(profile_dir, route=None, method=None):
+    """
+    Returns:
+        list: The profile files in `profile_dir`, optionally only those of one route slug and/or HTTP method.
+    """
+    pattern = f"{method or '*'}.{route or '*'}.*.prof"
+    files = glob.glob(os.path.join(profile_dir, pattern))
+    if route:
+        # 'creds' must not also match 'creds.service' files
+        files = [path for path in files if os.path.basename(path).split('.')[1:-4] == route.split('.')]
+    return sorted(files)
+
+def list_routes(profile_dir):
+    """
+    Prints the number of profiles per method and route.
+    """
+    counts = Counter()
+    for path in profile_files(profile_dir):
+        parts = os.path.basename(path).split('.')
+        counts[(parts[0], '.'.join(parts[1:-4]))] += 1
+    if not counts:
+        print(f"No profiles found in {profile_dir}")
+    for (method, route), count in sorted(counts.items()):
+        print(f"{count:>6}  {method} {route}")
+
+def merge(profile_dir, route, method=None, sort='cumulative', limit=30, output=None):
+    """
+    Merges every profile of a route and prints the combined statistics.
+
+    Parameters:
+        profile_dir (str): Directory holding the profiles.
+        route (str): The route slug, as in the file names, e.g. 'creds.service'.
+        method (str, optional): Only merge profiles of this HTTP method.
+        sort (str, optional): pstats sort key. Defaults to 'cumulative'.
+        limit (int, optional): Number of functions printed. Defaults to 30.
+        output (str, optional): Also write the merged profile to this file, e.g. for snakeviz.
+
+    Returns:
+        pstats.Stats: The merged statistics, None if there were no profiles.
+    """
+    files = profile_files(profile_dir, route, method)
+    if not files:
+        print(f"No profiles for {method or 'any method'} {route} in {profile_dir}")
+        return None
+    stats = pstats.Stats(files[0])
+    for path in files[1:]:
+        stats.add(path)
+    print(f"\n{len(files)} profiles merged for {method or 'any method'} {route}")
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    if output:
+        stats.dump_stats(output)
+        print(f"Merged profile written to {output}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the per-request profiles written by the API.")
+    parser.add_argument('--dir', default=os.environ.get('VAULT_PROFILE_DIR', DEFAULT_PROFILE_DIR), help="profile directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="count the profiles per route")
+    merge_parser = commands.add_parser('merge', help="merge and print the profiles of one route")
+    merge_parser.add_argument('route', help="route as in the file names, e.g. creds.service")
+    merge_parser.add_argument('--method', help="only merge profiles of this HTTP method")
+    merge_parser.add_argument('--sort', default='cumulative', help="pstats sort key, e.g. cumulative, tottime, ncalls")
+    merge_parser.add_argument('--limit', type=int, default=30, help="number of functions to print")
+    merge_parser.add_argument('--output', help="write the merged profile to this file")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        list_routes(args.dir)
+    else:
+        merge(args.dir, args.route, args.method and args.method.upper(), args.sort, args.limit, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# Negotiated compression of API responses: gzip and deflate, plus brotli and zstd when their packages are installed.
+
+'''
+    - The encoding is picked from the request's Accept-Encoding header, preferring zstd, then br, gzip and deflate among those the
+      client accepts equally. Clients sending no Accept-Encoding get uncompressed responses.
+    - Only JSON, MessagePack and text bodies of at least COMPRESSION_MIN_SIZE bytes are compressed, so single credential lookups and
+      short messages, where compression would cost more time than it saves, are sent as they are.
+    - Streamed responses are compressed chunk by chunk and flushed after every chunk, so they stay incremental. Their size is unknown
+      in advance, they are compressed unless they declare a Content-Length below the threshold.
+    - Compressed responses get a weak ETag (W/"..."), since their bytes differ from the uncompressed representation. If-None-Match
+      uses weak comparison, so revalidation keeps working with either form.
+    - Set VAULT_COMPRESSION=0 to turn compression off, e.g. behind a proxy that compresses already.
+'''
+
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MIN_SIZE = 1024    # bytes, smaller bodies are sent uncompressed
+DEFAULT_LEVEL = 6          # zlib level for gzip and deflate
+BROTLI_QUALITY = 4         # fast settings, API responses are compressed on every request
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/msgpack'}
+
+class ZlibEncoder:
+    """
+    gzip (wbits=31) or zlib-wrapped deflate (wbits=15) stream, the formats HTTP calls 'gzip' and 'deflate'.
+    """
+
+    def __init__(self, wbits, level=DEFAULT_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliEncoder:
+    def __init__(self, level=None):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+class ZstdEncoder:
+    def __init__(self, level=None):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def available_encodings():
+    """
+    Returns:
+        dict: Content-Encoding name -> encoder factory taking the zlib level, in server preference order.
+            brotli and zstd ignore the level and use BROTLI_QUALITY and ZSTD_LEVEL.
+    """
+    encodings = {}
+    if zstandard is not None:
+        encodings['zstd'] = ZstdEncoder
+    if brotli is not None:
+        encodings['br'] = BrotliEncoder
+    encodings['gzip'] = lambda level: ZlibEncoder(16 + zlib.MAX_WBITS, level)
+    encodings['deflate'] = lambda level: ZlibEncoder(zlib.MAX_WBITS, level)
+    return encodings
+
+ENCODINGS = available_encodings()
+
+def is_compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype in COMPRESSIBLE_MIMETYPES or mimetype.startswith('text/')
+
+def compress_stream(chunks, encoder):
+    """
+    Yields the compressed form of a streamed body, flushing after every chunk so the client receives data as it is produced.
+    """
+    try:
+        for chunk in chunks:
+            if chunk:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                yield encoder.compress(chunk) + encoder.flush()
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+class ResponseCompressor:
+    """
+    after_request hook compressing responses for clients that accept it, see install().
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, level=DEFAULT_LEVEL, encodings=None):
+        """
+        Parameters:
+            min_size (int): Bodies smaller than this many bytes are sent uncompressed.
+            level (int): zlib compression level (1-9) for gzip and deflate.
+            encodings (dict, optional): Content-Encoding name -> encoder factory, in preference order. Defaults to ENCODINGS.
+        """
+        self.min_size = min_size
+        self.level = level
+        self.encodings = encodings or ENCODINGS
+
+    def __call__(self, response):
+        if request.method == 'HEAD' or not is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(list(self.encodings))
+        if encoding is None:
+            return response
+        length = response.calculate_content_length() if not response.is_streamed else response.content_length
+        if length is not None and length < self.min_size:
+            return response
+
+        encoder = self.encodings[encoding](self.level)
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoder)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(encoder.compress(response.get_data()) + encoder.finish())
+        response.headers['Content-Encoding'] = encoding
+        weaken_etag(response)
+        return response
+
+def install(app):
+    """
+    Registers the compressor on a Flask app if COMPRESSION_ENABLED is set in its config.
+
+    Parameters:
+        app (flask.Flask): The app.
+
+    Returns:
+        bool: True if responses will be compressed.
+    """
+    if not app.config.get('COMPRESSION_ENABLED'):
+        return False
+    app.after_request(ResponseCompressor(app.config.get('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE), app.config.get('COMPRESSION_LEVEL', DEFAULT_LEVEL)))
+    return True
@@ -0,0 +1,263 @@
+# Rotates the key credential passwords are encrypted with, re-encrypting the vault in small batches while the API keeps serving requests.
+
+'''
+    Usage:
+        python rotate_keys.py             start a key rotation, or resume the one in progress
+        python rotate_keys.py --status    show the progress of the rotation in progress
+
+    Steps:
+        1. A new key is generated and becomes 'cred_key' in config/config.json. The old key moves to 'previous_cred_keys', so every
+           value stays readable. Running API processes reload the keys within config_init.KEYRING_CHECK_INTERVAL seconds.
+        2. The job waits for that interval to pass, from then on every process encrypts new values with the new key.
+        3. Credential passwords are re-encrypted in id order, --batch-size rows per transaction, so the API is never locked out for long.
+           A row is only replaced if its password is still the value that was read, so concurrent updates through the API win.
+           Progress is checkpointed to config/rotation.json after every batch.
+        4. The vault is scanned for values still using an old key (e.g. written by a process that had not reloaded yet) until none are left.
+        5. The old key is retired: removed from config/config.json, and the checkpoint is deleted.
+
+    If the job is interrupted or crashes, run it again: it resumes from the checkpoint, and rows already using the new key are skipped.
+    Database backups taken before the rotation can only be read with the old key, keep a copy of 'cred_key' from config/config.json
+    before rotating if you need them.
+'''
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from cryptography.fernet import InvalidToken
+from cipher import CipherEngine, DEFAULT_ALGORITHM, key_id
+from config_init import KEYRING_CHECK_INTERVAL
+from crypto_utils import CONFIG_DIR, keygen, get_or_gen_key, get_keyring, load_config_file, save_config_file, isFile
+
+DB_PATH = "instance/creds.db"    # the default path created at first run of api.py
+CHECKPOINT_PATH = CONFIG_DIR + 'rotation.json'
+BATCH_SIZE = 500                 # rows re-encrypted per transaction
+GRACE_PERIOD = KEYRING_CHECK_INTERVAL * 2    # seconds between adding the new key and re-encrypting
+MAX_VERIFY_PASSES = 5
+
+def load_checkpoint():
+    """
+    Returns:
+        dict or None: The state of the rotation in progress, None if there is no checkpoint.
+    """
+    if not isFile(CHECKPOINT_PATH):
+        return None
+    with open(CHECKPOINT_PATH) as f:
+        return json.load(f)
+
+def save_checkpoint(state):
+    """
+    Writes the rotation state atomically, so a crash never leaves a partly written checkpoint.
+    """
+    tmp_path = CHECKPOINT_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def new_state(keys):
+    """
+    Returns:
+        dict: The state of a rotation to keys[0] that has not re-encrypted anything yet.
+    """
+    return {
+        'key_id': key_id(keys[0]),
+        'retiring_key_ids': [key_id(key) for key in keys[1:]],
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'key_added_at': time.time(),
+        'last_id': 0,
+        'reencrypted': 0,
+        'failed_ids': [],
+    }
+
+def start_rotation():
+    """
+    Generates a new key, makes it the current one and keeps the old key for decryption.
+
+    Returns:
+        dict: The initial rotation state.
+    """
+    old_key = get_or_gen_key()
+    new_key = keygen().decode()
+    config = load_config_file()
+    config['previous_cred_keys'] = [old_key] + [key for key in config.get('previous_cred_keys', []) if key != old_key]
+    config['cred_key'] = new_key
+    save_config_file(config)
+    state = new_state([new_key] + config['previous_cred_keys'])
+    save_checkpoint(state)
+    print(f"\nNew key {state['key_id']} added, retiring {', '.join(state['retiring_key_ids'])}.")
+    return state
+
+def resume_state(keys):
+    """
+    Returns:
+        dict: The state of the rotation in progress, rebuilt from the keyring if the checkpoint was lost.
+    """
+    state = load_checkpoint()
+    if state is None or state.get('key_id') != key_id(keys[0]):
+        # crashed between updating the keyring and writing the checkpoint: start the re-encryption over, it is idempotent
+        state = new_state(keys)
+        save_checkpoint(state)
+    return state
+
+def reencrypt_rows(conn, engine, marker, rows, state):
+    """
+    Re-encrypts the given rows with the current key in one transaction.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the vault.
+        engine (CipherEngine): Engine holding the current and the previous keys.
+        marker (str): ':<key id>:' of the current key, found in every value already encrypted with it.
+        rows (list): (id, password) tuples.
+        state (dict): The rotation state, 'reencrypted' and 'failed_ids' are updated.
+
+    Returns:
+        int: The number of rows changed.
+    """
+    updates = []
+    for row_id, password in rows:
+        if marker in password:
+            continue
+        try:
+            updates.append((engine.encrypt(engine.decrypt(password)), row_id, password))
+        except InvalidToken:
+            if row_id not in state['failed_ids']:
+                state['failed_ids'].append(row_id)
+    if not updates:
+        return 0
+    with conn:
+        changed = conn.executemany("UPDATE credential SET password = ? WHERE id = ? AND password = ?", updates).rowcount
+    state['reencrypted'] += changed
+    return changed
+
+def rotate(db_path=DB_PATH, batch_size=BATCH_SIZE, pause=0.0, grace=GRACE_PERIOD, retire=True):
+    """
+    Starts or resumes a key rotation and runs it to completion.
+
+    Parameters:
+        db_path (str, optional): The path to the SQLite database file. Defaults to DB_PATH.
+        batch_size (int, optional): Rows re-encrypted per transaction. Defaults to BATCH_SIZE.
+        pause (float, optional): Seconds to sleep between batches, to leave more room for API requests. Defaults to 0.
+        grace (float, optional): Seconds to wait after adding the new key before re-encrypting. Defaults to GRACE_PERIOD.
+        retire (bool, optional): Remove the old keys from config/config.json when done. Defaults to True.
+
+    Returns:
+        bool: True if every credential now uses the new key.
+    """
+    if not isFile(db_path):
+        print(f"\nDatabase file not found: {db_path}\nNo keys rotated.\n")
+        return False
+
+    keys = get_keyring()
+    state = resume_state(keys) if len(keys) > 1 else start_rotation()
+    keys = get_keyring()
+    engine = CipherEngine(keys, os.environ.get('VAULT_CIPHER', DEFAULT_ALGORITHM))
+    marker = f":{state['key_id']}:"    # matches values of any algorithm, in case API processes use another VAULT_CIPHER
+    state['failed_ids'] = []    # checked again below, they may have been fixed since the last run
+
+    wait = state['key_added_at'] + grace - time.time()
+    if wait > 0:
+        print(f"Waiting {wait:.0f}s for running API processes to load the new key...")
+        time.sleep(wait)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM credential").fetchone()[0]
+        if state['last_id']:
+            print(f"Resuming after credential id {state['last_id']} ({state['reencrypted']} re-encrypted so far).")
+        start = time.perf_counter()
+        processed = 0
+        while True:
+            rows = conn.execute("SELECT id, password FROM credential WHERE id > ? ORDER BY id LIMIT ?", (state['last_id'], batch_size)).fetchall()
+            if not rows:
+                break
+            reencrypt_rows(conn, engine, marker, rows, state)
+            state['last_id'] = rows[-1][0]
+            save_checkpoint(state)
+            processed += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"\r{processed} of ~{total} credentials checked, {state['reencrypted']} re-encrypted ({processed / max(elapsed, 1e-9):,.0f} rows/sec)", end='', flush=True)
+            if pause:
+                time.sleep(pause)
+        print()
+
+        # values written with an old key after the scan passed them, by a process that had not reloaded the keys yet
+        for _ in range(MAX_VERIFY_PASSES):
+            rows = conn.execute("SELECT id, password FROM credential WHERE instr(password, ?) = 0", (marker,)).fetchall()
+            rows = [row for row in rows if row[0] not in state['failed_ids']]
+            if not rows:
+                break
+            for first in range(0, len(rows), batch_size):
+                reencrypt_rows(conn, engine, marker, rows[first:first + batch_size], state)
+            save_checkpoint(state)
+        else:
+            print("\nCredentials keep being written with an old key. Check that every API process can read config/config.json, then run again.\n")
+            return False
+    except KeyboardInterrupt:
+        save_checkpoint(state)
+        print("\nInterrupted. Run rotate_keys.py again to resume.\n")
+        return False
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{state['reencrypted']} credentials re-encrypted in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):,.0f} rows/sec checked).")
+    if state['failed_ids']:
+        print(f"\n{len(state['failed_ids'])} credentials could not be decrypted with any configured key (ids: {', '.join(map(str, state['failed_ids'][:20]))}).\n\
+Delete or re-enter them, then run again to retire the old key.\n")
+        return False
+    if retire:
+        retire_keys()
+    return True
+
+def retire_keys():
+    """
+    Removes the previous keys from config/config.json and deletes the checkpoint. Only call once no value uses them anymore.
+    """
+    config = load_config_file()
+    retired = [key_id(key) for key in config.pop('previous_cred_keys', [])]
+    save_config_file(config)
+    if isFile(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    print(f"\nKey rotation complete, retired {', '.join(retired) or 'no keys'}. Current key: {key_id(config['cred_key'])}\n")
+
+def print_status(db_path=DB_PATH):
+    """
+    Prints the progress of the rotation in progress.
+    """
+    keys = get_keyring()
+    if len(keys) == 1:
+        print(f"\nNo key rotation in progress. Current key: {key_id(keys[0])}\n")
+        return
+    state = load_checkpoint() or {}
+    print(f"\nRotating to key {key_id(keys[0])}, retiring {', '.join(key_id(key) for key in keys[1:])}.")
+    if state:
+        print(f"Started {state['started_at']}, checked up to credential id {state['last_id']}, {state['reencrypted']} re-encrypted.")
+    if isFile(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM credential").fetchone()[0]
+            current = conn.execute("SELECT COUNT(*) FROM credential WHERE instr(password, ?) > 0", (f":{key_id(keys[0])}:",)).fetchone()[0]
+        finally:
+            conn.close()
+        print(f"{current} of {total} credentials use the new key.")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotate the credential encryption key, re-encrypting the vault in batches.")
+    parser.add_argument('--status', action='store_true', help="show the progress of the rotation in progress and exit")
+    parser.add_argument('--db', default=DB_PATH, help="path to the SQLite database")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="rows re-encrypted per transaction")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument('--grace', type=float, default=GRACE_PERIOD, help="seconds to wait for API processes to load the new key")
+    parser.add_argument('--keep-old-key', action='store_true', help="don't retire the old key when done")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.db)
+    else:
+        rotate(args.db, args.batch_size, args.pause, args.grace, retire=not args.keep_old_key)
+
+if __name__ == '__main__':
+    main()
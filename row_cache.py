@@ -0,0 +1,132 @@
+# Bounded, TTL-based in-process cache of credential rows. Used by api.py so hot GET /creds/<service> and GET /services/<service> requests skip SQLite.
+
+'''
+    - Rows are cached as stored: the password stays encrypted and is decrypted per request, so the cache never holds plaintext.
+    - Entries are dropped when they expire, when the cache is full (least recently used first), and when the API changes or deletes the
+      credential. Every write route invalidates the service after committing.
+    - The cache is per process. With several gunicorn workers, a credential changed through one worker can be served from another
+      worker's cache until its entry expires, so the TTL bounds how stale a read can be. Keep it short, or set it to 0 to disable the cache.
+    - Changes made outside the API (scripts using sqlite3 directly) are also only seen once the entry expires. A key rotation clears
+      the cache, see api.CachedCredentialReads.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 5             # seconds a cached row is served for
+DEFAULT_MAX_ENTRIES = 1024  # upper bound on cached rows
+
+class CredentialRowCache:
+    """
+    Thread-safe LRU cache mapping a service name to its credential row.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Parameters:
+            ttl (int | float): Seconds a cached row stays valid. 0 disables the cache.
+            max_entries (int): Maximum number of cached rows. 0 disables the cache.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # service -> (row, expires_at)
+        self._lock = threading.Lock()
+        self._invalidations = 0          # bumped by every invalidation, see read_token()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, service):
+        """
+        Parameters:
+            service (str): The service name.
+
+        Returns:
+            The cached row, or None on a miss or expired entry.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(service)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[service]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(service)
+            self.hits += 1
+            return entry[0]
+
+    def read_token(self):
+        """
+        Returns a token to take before reading a row from the database and pass to put(). If the cache is invalidated in between,
+        put() drops the row, so a read racing with a write never caches the value from before the write.
+
+        Returns:
+            int: The current invalidation count.
+        """
+        return self._invalidations
+
+    def put(self, service, row, token):
+        """
+        Caches a row read from the database.
+
+        Parameters:
+            service (str): The service name.
+            row: The credential row.
+            token (int): The read_token() taken before the row was read.
+        """
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if token != self._invalidations:
+                return
+            self._entries[service] = (row, expires_at)
+            self._entries.move_to_end(service)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, service):
+        """
+        Drops the cached row of a service. Called after a credential is added, changed or deleted.
+
+        Parameters:
+            service (str): The service name.
+        """
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(service, None)
+
+    def clear(self):
+        """
+        Drops every cached row.
+        """
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss/eviction counters, hit rate and current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
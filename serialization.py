@@ -0,0 +1,143 @@
+# JSON encoding and decoding for api.py and the client modules, using the fastest library installed, and optional MessagePack bodies.
+
+'''
+    - dumps() and loads() use orjson or msgspec when installed and the standard json module otherwise. Set VAULT_JSON to 'orjson',
+      'msgspec' or 'json' to pick one. Every backend produces plain JSON, so clients and servers using different ones interoperate.
+    - create_app() installs json_provider.VaultJSONProvider, so jsonify() and request.get_json() use the same backend.
+    - This module doesn't need Flask, the client modules import it. The Flask parts live in json_provider.py.
+    - If msgpack is installed, requests sending 'Accept: application/msgpack' get MessagePack bodies instead of JSON. JSON stays
+      the default for every other Accept header. VaultClient(msgpack=True) and AsyncVaultClient(msgpack=True) ask for it, and
+      decode_response() reads either format.
+'''
+
+import dataclasses
+import decimal
+import json
+import os
+import uuid
+from datetime import date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+def json_default(obj):
+    """
+    Converts the values the JSON libraries can't encode natively, the same way Flask's default provider does.
+
+    Raises:
+        TypeError: If `obj` has no JSON representation.
+    """
+    if isinstance(obj, date):
+        from werkzeug.http import http_date    # only installed with Flask, clients rarely send dates
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def select_backend(name=None):
+    """
+    Returns the JSON backend to use.
+
+    Parameters:
+        name (str, optional): 'orjson', 'msgspec', 'json' or 'auto'. Defaults to the VAULT_JSON environment variable, then 'auto'.
+
+    Returns:
+        str: The name of an installed backend. 'auto' picks orjson, then msgspec, then json.
+    """
+    name = (name or os.environ.get('VAULT_JSON') or 'auto').lower()
+    installed = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    if name in installed and installed[name]:
+        return name
+    if name != 'auto':
+        print(f"JSON backend '{name}' is not available, picking the fastest installed one.")
+    return next(backend for backend in ('orjson', 'msgspec', 'json') if installed[backend])
+
+BACKEND = select_backend()
+
+# dumps(obj, sort_keys=False) returns the compact JSON encoding of obj as UTF-8 bytes, loads(data) decodes bytes or str
+if BACKEND == 'orjson':
+    # dates are passed to json_default so they are encoded like Flask does, non-string keys are accepted like the json module does
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj, sort_keys=False):
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _ORJSON_OPTIONS)
+
+    loads = orjson.loads
+elif BACKEND == 'msgspec':
+    _encoder = msgspec.json.Encoder(enc_hook=json_default)
+    try:
+        _sorted_encoder = msgspec.json.Encoder(enc_hook=json_default, order='sorted')
+    except TypeError:
+        # msgspec < 0.18 can't sort keys, sorted output comes from the json module there
+        _sorted_encoder = None
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj, sort_keys=False):
+        if not sort_keys:
+            return _encoder.encode(obj)
+        if _sorted_encoder is None:
+            return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode()
+        return _sorted_encoder.encode(obj)
+
+    def loads(data):
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            # callers catch ValueError like for the other backends
+            raise ValueError(str(e)) from e
+else:
+    def dumps(obj, sort_keys=False):
+        return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys).encode()
+
+    loads = json.loads
+
+def decode_response(response):
+    """
+    Decodes the body of an API response, JSON or MessagePack depending on its Content-Type.
+
+    Parameters:
+        response (requests.Response | httpx.Response): The response.
+
+    Returns:
+        The decoded body.
+
+    Raises:
+        ValueError: If the body is not valid JSON (or MessagePack).
+    """
+    return decode_body(response.content, response.headers.get('Content-Type', ''))
+
+def decode_body(content, content_type=JSON_MIMETYPE):
+    """
+    Decodes a response body given its Content-Type, see decode_response().
+    """
+    if msgpack is not None and content_type.startswith(MSGPACK_MIMETYPE):
+        return msgpack.unpackb(content)
+    return loads(content)
+
+def accept_header(use_msgpack):
+    """
+    Returns:
+        str: The Accept header clients send, preferring MessagePack if `use_msgpack` is set and msgpack is installed.
+    """
+    if use_msgpack and msgpack is not None:
+        return f"{MSGPACK_MIMETYPE}, {JSON_MIMETYPE};q=0.9"
+    return JSON_MIMETYPE
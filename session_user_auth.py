@@ -1,4 +1,4 @@
-# Initialize newly created username and password for config/config.json if those values are missing. Checks at the start of api.py each time.
+# Initialize newly created username and password for config/config.json if those values are missing. Checked by config_init.bootstrap(), run at the start of api.py.
 
 import os
 import json
@@ -8,23 +8,25 @@ CONFIG_FILE = 'config.json'
 CONFIG_PATH = CONFIG_DIR + CONFIG_FILE
 
 # Will be changed to a graphical form in the future
-def add_config_creds():
+def add_config_creds(interactive=True):
     """
     Reads the configuration file at `CONFIG_PATH` and checks if the 'username' and 'password' keys are present and not empty.
     If either of them is missing or empty, it prompts the user to enter the values and updates the configuration file.
     
     Parameters:
-        None
+        interactive (bool, optional): If False, missing values are taken from the VAULT_CONFIG_USERNAME and VAULT_CONFIG_PASSWORD
+            environment variables instead of prompting, and stay missing if those are unset. Defaults to True.
     
     Returns:
-        None
+        tuple: The config (username, password). Either may be None in non-interactive mode.
     """
     with open(CONFIG_PATH, 'r') as f:
         config = json.load(f)
         if 'username' not in config or not config['username']:
-            config['username'] = input("Enter config username: ")
+            config['username'] = input("Enter config username: ") if interactive else os.environ.get('VAULT_CONFIG_USERNAME')
         if 'password' not in config or not config['password']:
-            config['password'] = input("Enter config password: ")
+            config['password'] = input("Enter config password: ") if interactive else os.environ.get('VAULT_CONFIG_PASSWORD')
 
     with open(CONFIG_PATH, 'w') as f:
         json.dump(config, f, indent=4)
+    return config['username'], config['password']
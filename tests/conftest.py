@@ -0,0 +1,86 @@
+# Shared fixtures for the test suite: a throwaway working directory, a configured app and a live server.
+
+'''
+    - Tests run inside a temporary directory holding config/config.json, so the keys generated by config_init never touch the
+      checkout's own config/ folder.
+    - Every app gets its own SQLite file and a cheap password hash, the API's default scrypt cost would dominate the run time.
+    - live_server starts the app with werkzeug's make_server in a background thread, for the HTTP clients.
+'''
+
+import base64
+import json
+import os
+import sys
+import threading
+import pytest
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'admin-password'
+TEST_PASSWORD_HASH = 'pbkdf2:sha256:1000'
+
+@pytest.fixture(scope='session', autouse=True)
+def workdir(tmp_path_factory):
+    path = tmp_path_factory.mktemp('vault')
+    os.makedirs(path / 'config')
+    with open(path / 'config' / 'config.json', 'w') as f:
+        json.dump({'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}, f)
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+def make_app(tmp_path, **config):
+    """
+    Returns:
+        flask.Flask: An app on a fresh database in `tmp_path`, with `config` overriding the test defaults.
+    """
+    import api
+
+    return api.create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'creds.db'}",
+        'ADMIN_USERNAME': ADMIN_USERNAME,
+        'ADMIN_PASSWORD': ADMIN_PASSWORD,
+        'PASSWORD_HASH_METHOD': TEST_PASSWORD_HASH,
+        'COMPRESSION_ENABLED': False,
+        **config,
+    })
+
+@pytest.fixture
+def app(tmp_path):
+    return make_app(tmp_path)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers():
+    return basic_auth_headers(ADMIN_USERNAME, ADMIN_PASSWORD)
+
+def basic_auth_headers(username, password):
+    return {'Authorization': 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()}
+
+class LiveServer:
+    """
+    A WSGI app served on a free local port by a background thread.
+    """
+
+    def __init__(self, wsgi_app):
+        self.server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+@pytest.fixture
+def live_server(app):
+    server = LiveServer(app)
+    yield server
+    server.stop()
@@ -0,0 +1,192 @@
+# Tests for async_client.py against the API served on a local port.
+
+import asyncio
+import threading
+import time
+import pytest
+from async_client import AsyncVaultClient
+from conftest import ADMIN_PASSWORD, ADMIN_USERNAME, LiveServer
+
+AUTH = (ADMIN_USERNAME, ADMIN_PASSWORD)
+
+class InFlightCounter:
+    """
+    WSGI middleware recording the response statuses and the highest number of requests handled at once.
+    Each request is held for `delay` seconds so that concurrent requests overlap.
+    """
+
+    def __init__(self, wsgi_app, delay=0.0):
+        self.wsgi_app = wsgi_app
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.statuses = []
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+
+            def record_status(status, headers, *args):
+                self.statuses.append(int(status.split()[0]))
+                return start_response(status, headers, *args)
+
+            return self.wsgi_app(environ, record_status)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+@pytest.fixture
+def counted_server(app):
+    counter = InFlightCounter(app, delay=0.05)
+    server = LiveServer(counter)
+    server.counter = counter
+    yield server
+    server.stop()
+
+def test_add_and_get_credential(live_server):
+    async def scenario():
+        async with AsyncVaultClient(live_server.url) as vault:
+            added = await vault.add_credential('github', 'octocat', 's3cret', 'work', *AUTH)
+            credential = await vault.get_credential('github', *AUTH)
+            services = await vault.get_services(*AUTH)
+            return added, credential, services
+
+    added, credential, services = run(scenario())
+    assert added == {'message': "New credential added successfully!"}
+    assert credential['username'] == 'octocat'
+    assert credential['password'] == 's3cret'
+    assert credential['note'] == 'work'
+    assert services == ['github']
+
+def test_missing_service_maps_404(live_server, capsys):
+    async def scenario():
+        async with AsyncVaultClient(live_server.url) as vault:
+            return await vault.get_credential('missing', *AUTH), await vault.delete_credential('missing', *AUTH)
+
+    assert run(scenario()) == ({"message": "Credential not found!"}, {"message": "Credential not found!"})
+    assert "Service 'missing' does not exist." in capsys.readouterr().out
+
+def test_duplicate_service_returns_none(live_server, capsys):
+    async def scenario():
+        async with AsyncVaultClient(live_server.url) as vault:
+            await vault.add_credential('github', 'octocat', 's3cret', '', *AUTH)
+            return await vault.add_credential('github', 'other', 'other', '', *AUTH)
+
+    assert run(scenario()) is None
+    assert "Service 'github' already exists." in capsys.readouterr().out
+
+def test_duplicate_user_and_email_are_reported(live_server, capsys):
+    async def scenario():
+        async with AsyncVaultClient(live_server.url) as vault:
+            added = await vault.add_user('bob', 'bob@localhost', 'bob-password', *AUTH)
+            same_user = await vault.add_user('bob', 'other@localhost', 'bob-password', *AUTH)
+            same_email = await vault.add_user('alice', 'bob@localhost', 'alice-password', *AUTH)
+            return added, same_user, same_email
+
+    added, same_user, same_email = run(scenario())
+    assert added is not None
+    assert same_user is None and same_email is None
+    out = capsys.readouterr().out
+    assert "User 'bob' already exists." in out
+    assert "Email 'bob@localhost' is already used by another user." in out
+
+def test_invalid_body_is_reported(capsys):
+    def broken_app(environ, start_response):
+        if environ['PATH_INFO'] == '/auth/token':
+            start_response('404 NOT FOUND', [('Content-Type', 'application/json')])
+            return [b'{}']
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'<html>not json</html>']
+
+    server = LiveServer(broken_app)
+    try:
+        async def scenario():
+            async with AsyncVaultClient(server.url) as vault:
+                return await vault.get_services(*AUTH)
+
+        services = run(scenario())
+    finally:
+        server.stop()
+    assert services is None
+    assert "Error getting all services" in capsys.readouterr().out
+
+def test_rejected_token_is_refreshed(counted_server):
+    async def scenario():
+        async with AsyncVaultClient(counted_server.url) as vault:
+            await vault.get_services(*AUTH)
+            auth = vault.auth(*AUTH)
+            auth._token = 'revoked'    # still within its lifetime, so the client sends it
+            services = await vault.get_services(*AUTH)
+            return services, auth._token
+
+    services, token = run(scenario())
+    assert services == []
+    assert token not in (None, 'revoked')
+    assert 401 in counted_server.counter.statuses
+    assert counted_server.counter.statuses[-1] == 200
+
+def test_token_is_reused(counted_server):
+    async def scenario():
+        async with AsyncVaultClient(counted_server.url) as vault:
+            for _ in range(3):
+                await vault.get_services(*AUTH)
+
+    run(scenario())
+    # one POST /auth/token, then three GET /services
+    assert counted_server.counter.statuses == [200, 200, 200, 200]
+
+def test_concurrency_limit(counted_server):
+    async def scenario(concurrency):
+        async with AsyncVaultClient(counted_server.url, concurrency=concurrency) as vault:
+            await vault.get_services(*AUTH)    # fetch the token first
+            counted_server.counter.max_in_flight = 0
+            await asyncio.gather(*(vault.get_credential(f"service-{i}", *AUTH) for i in range(8)))
+            return counted_server.counter.max_in_flight
+
+    assert run(scenario(2)) <= 2
+    assert run(scenario(8)) > 2
+
+def test_per_call_timeout(capsys):
+    def slow_app(environ, start_response):
+        if environ['PATH_INFO'] == '/auth/token':
+            # no token support, the client falls back to HTTP Basic
+            start_response('404 NOT FOUND', [('Content-Type', 'application/json')])
+            return [b'{}']
+        time.sleep(1)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{}']
+
+    server = LiveServer(slow_app)
+    try:
+        async def scenario():
+            async with AsyncVaultClient(server.url, timeout=5) as vault:
+                start = time.monotonic()
+                credential = await vault.get_credential('github', *AUTH, timeout=0.2)
+                return credential, time.monotonic() - start
+
+        credential, elapsed = run(scenario())
+    finally:
+        server.stop()
+    assert credential is None
+    assert elapsed < 0.9
+    assert "Error getting credential by service" in capsys.readouterr().out
+
+def test_gather_credentials_batches(live_server):
+    services = [f"service-{i:03}" for i in range(25)]
+
+    async def scenario():
+        async with AsyncVaultClient(live_server.url) as vault:
+            await vault.add_credentials([{'username': f"user-{s}", 'password': f"pw-{s}", 'service': s, 'note': ''} for s in services], *AUTH)
+            return await vault.gather_credentials(services + ['missing', services[0]], *AUTH, batch_size=10)
+
+    creds = run(scenario())
+    assert set(creds) == set(services) | {'missing'}
+    assert creds['missing'] == {"message": "Credential not found!"}
+    assert all(creds[s]['password'] == f"pw-{s}" for s in services)
@@ -0,0 +1,137 @@
+# Tests for auth_cache.py and its use by api.verify_password.
+
+import sqlite3
+import time
+from werkzeug.security import generate_password_hash
+import api
+from auth_cache import VerifiedCredentialCache
+from conftest import ADMIN_PASSWORD, ADMIN_USERNAME, basic_auth_headers
+
+def test_hit_after_put():
+    cache = VerifiedCredentialCache()
+    assert cache.get('alice', 'pw') is None
+    cache.put('alice', 'pw', 1, 'fp')
+    assert cache.get('alice', 'pw') == (1, 'fp')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_wrong_password_misses():
+    cache = VerifiedCredentialCache()
+    cache.put('alice', 'pw', 1, 'fp')
+    assert cache.get('alice', 'other') is None
+    assert cache.get('alicep', 'w') is None
+
+def test_plaintext_is_not_stored():
+    cache = VerifiedCredentialCache()
+    cache.put('alice', 'hunter2', 1, 'fp')
+    assert all(b'hunter2' not in digest for digest in cache._entries)
+    assert all('hunter2' not in map(str, entry) for entry in cache._entries.values())
+
+def test_entries_expire():
+    cache = VerifiedCredentialCache(ttl=0.05)
+    cache.put('alice', 'pw', 1, 'fp')
+    time.sleep(0.1)
+    assert cache.get('alice', 'pw') is None
+    assert cache.stats()['size'] == 0
+
+def test_least_recently_used_is_evicted():
+    cache = VerifiedCredentialCache(max_entries=2)
+    cache.put('alice', 'pw', 1, 'fp')
+    cache.put('bob', 'pw', 2, 'fp')
+    cache.get('alice', 'pw')
+    cache.put('carol', 'pw', 3, 'fp')
+    assert cache.get('bob', 'pw') is None
+    assert cache.get('alice', 'pw') == (1, 'fp')
+    assert cache.get('carol', 'pw') == (3, 'fp')
+
+def test_invalidate_user_drops_every_password():
+    cache = VerifiedCredentialCache()
+    cache.put('alice', 'old', 1, 'fp')
+    cache.put('alice', 'new', 1, 'fp')
+    cache.put('bob', 'pw', 2, 'fp')
+    cache.invalidate_user('alice')
+    assert cache.get('alice', 'old') is None
+    assert cache.get('alice', 'new') is None
+    assert cache.get('bob', 'pw') == (2, 'fp')
+
+def test_disabled_cache_stores_nothing():
+    cache = VerifiedCredentialCache(ttl=0)
+    cache.put('alice', 'pw', 1, 'fp')
+    assert not cache.enabled
+    assert cache.get('alice', 'pw') is None
+
+def count_hash_checks(monkeypatch):
+    calls = []
+    check_password = api.User.check_password
+
+    def counting(self, password):
+        calls.append(self.username)
+        return check_password(self, password)
+
+    monkeypatch.setattr(api.User, 'check_password', counting)
+    return calls
+
+def test_repeat_requests_skip_the_hash_check(app, client, auth_headers, monkeypatch):
+    calls = count_hash_checks(monkeypatch)
+    for _ in range(3):
+        assert client.get('/services', headers=auth_headers).status_code == 200
+    assert calls == [ADMIN_USERNAME]
+    assert app.extensions['auth_cache'].hits == 2
+
+def test_password_change_invalidates(client, auth_headers):
+    assert client.get('/services', headers=auth_headers).status_code == 200
+    assert client.put(f"/users/{ADMIN_USERNAME}", json={'password': 'changed'}, headers=auth_headers).status_code == 200
+    assert client.get('/services', headers=auth_headers).status_code == 401
+    assert client.get('/services', headers=basic_auth_headers(ADMIN_USERNAME, 'changed')).status_code == 200
+
+def test_password_changed_by_another_process_is_not_served_from_cache(app, client, auth_headers):
+    assert client.get('/services', headers=auth_headers).status_code == 200
+    # another worker changes the password, this process' cache is not invalidated
+    with app.app_context():
+        user = api.User.query.filter_by(username=ADMIN_USERNAME).first()
+        user.set_password('changed')
+        api.db.session.commit()
+    assert app.extensions['auth_cache'].stats()['size'] == 1
+    assert client.get('/services', headers=auth_headers).status_code == 401
+    assert client.get('/services', headers=basic_auth_headers(ADMIN_USERNAME, 'changed')).status_code == 200
+
+def test_deleted_user_is_rejected(client, auth_headers):
+    other = basic_auth_headers('bob', 'bob-password')
+    client.post('/users', json={'username': 'bob', 'email': 'bob@localhost', 'password': 'bob-password'}, headers=auth_headers)
+    assert client.get('/services', headers=other).status_code == 200
+    assert client.delete('/users/bob', headers=auth_headers).status_code == 200
+    assert client.get('/services', headers=other).status_code == 401
+
+def test_wrong_password_is_rejected(client):
+    assert client.get('/services', headers=basic_auth_headers(ADMIN_USERNAME, ADMIN_PASSWORD + 'x')).status_code == 401
+
+def stored_hash(app):
+    with app.app_context():
+        return api.User.query.filter_by(username=ADMIN_USERNAME).first().password_hash
+
+def test_outdated_hash_is_rehashed_on_login(app, client, auth_headers):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert client.get('/services', headers=auth_headers).status_code == 200
+    assert stored_hash(app).startswith('pbkdf2:sha256:2000$')
+    app.extensions['auth_cache'].clear()
+    assert client.get('/services', headers=auth_headers).status_code == 200
+
+def test_rehash_does_not_revert_a_concurrent_password_change(app, client, auth_headers, monkeypatch):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    changed = generate_password_hash('changed', method='pbkdf2:sha256:1000')
+    check_password = api.User.check_password
+
+    def changed_after_check(self, password):
+        # another request changes the password between the check and the rehash
+        verified = check_password(self, password)
+        conn = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+        conn.execute("UPDATE user SET password_hash = ? WHERE username = ?", (changed, ADMIN_USERNAME))
+        conn.commit()
+        conn.close()
+        return verified
+
+    monkeypatch.setattr(api.User, 'check_password', changed_after_check)
+    assert client.get('/services', headers=auth_headers).status_code == 200
+    assert stored_hash(app) == changed
+    monkeypatch.undo()
+    assert client.get('/services', headers=auth_headers).status_code == 401
+    assert client.get('/services', headers=basic_auth_headers(ADMIN_USERNAME, 'changed')).status_code == 200
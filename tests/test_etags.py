@@ -0,0 +1,69 @@
+# Tests for the ETags of GET /creds/<service>, GET /services and GET /users.
+
+import sqlite3
+import api
+
+def create(client, headers, service, password):
+    response = client.post('/creds', json={'username': 'u', 'password': password, 'service': service, 'note': ''}, headers=headers)
+    assert response.status_code == 201
+
+def test_unchanged_credential_is_not_modified(client, auth_headers):
+    create(client, auth_headers, 'github', 'first')
+    etag = client.get('/creds/github', headers=auth_headers).headers['ETag']
+    assert client.get('/creds/github', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+
+def test_changes_get_a_new_etag(client, auth_headers):
+    create(client, auth_headers, 'github', 'first')
+    etags = {client.get('/creds/github', headers=auth_headers).headers['ETag']}
+    client.put('/creds/github', json={'username': 'u', 'password': 'second'}, headers=auth_headers)
+    etags.add(client.get('/creds/github', headers=auth_headers).headers['ETag'])
+    client.put('/creds/github/note', json={'note': 'n'}, headers=auth_headers)
+    etags.add(client.get('/creds/github', headers=auth_headers).headers['ETag'])
+    assert len(etags) == 3
+
+def test_recreated_credential_gets_a_new_etag(client, auth_headers):
+    create(client, auth_headers, 'github', 'first')
+    etag = client.get('/creds/github', headers=auth_headers).headers['ETag']
+    client.delete('/creds/github', headers=auth_headers)
+    # SQLite reuses the id of the deleted row
+    create(client, auth_headers, 'github', 'second')
+    response = client.get('/creds/github', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['password'] == 'second'
+    assert response.headers['ETag'] != etag
+
+def test_revisions_are_unique_across_rows(app, client, auth_headers):
+    for service in ('a', 'b', 'c'):
+        create(client, auth_headers, service, 'pw')
+    client.delete('/creds/c', headers=auth_headers)
+    create(client, auth_headers, 'c', 'pw')
+    with app.app_context():
+        revisions = [revision for (revision,) in api.db.session.query(api.Credential.revision)]
+    assert len(set(revisions)) == len(revisions)
+
+def test_writers_outside_the_api_get_new_revisions(app, client, auth_headers):
+    create(client, auth_headers, 'github', 'first')
+    etag = client.get('/creds/github', headers=auth_headers).headers['ETag']
+    conn = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+    conn.execute("UPDATE credential SET username = 'changed' WHERE service = 'github'")
+    conn.commit()
+    conn.close()
+    app.extensions['cred_cache'].clear()
+    assert client.get('/creds/github', headers={**auth_headers, 'If-None-Match': etag}).status_code == 200
+
+def test_unchanged_list_is_not_queried(client, auth_headers, monkeypatch):
+    for service in ('a', 'b', 'c'):
+        create(client, auth_headers, service, 'pw')
+    first = client.get('/services?limit=2', headers=auth_headers)
+    assert first.get_json() == ['a', 'b']
+    assert 'after=b' in first.headers['Link']
+    calls = []
+    paginate = api.paginate
+    monkeypatch.setattr(api, 'paginate', lambda *args: calls.append(args) or paginate(*args))
+    for url in ('/services?limit=2', '/users'):
+        etag = client.get(url, headers=auth_headers).headers['ETag']
+        calls.clear()
+        assert client.get(url, headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+        assert calls == []
+    create(client, auth_headers, 'd', 'pw')
+    assert client.get('/services?limit=2', headers={**auth_headers, 'If-None-Match': first.headers['ETag']}).status_code == 200
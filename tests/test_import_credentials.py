@@ -0,0 +1,125 @@
+# Tests for the incremental parser and the chunked upload in import_credentials.py.
+
+import io
+import json
+import pytest
+import import_credentials
+from import_credentials import iter_credentials, iter_json_records, normalize_credential, write_credentials
+
+RECORDS = [{'username': f"user{i}", 'password': f"pw{i}", 'service': f"service{i}", 'note': f"note {i}"} for i in range(20)]
+
+def parse(text, read_size=7):
+    return list(iter_json_records(io.StringIO(text), read_size))
+
+class EndlessFile:
+    """
+    A text file that never ends, reading it whole would never finish.
+    """
+
+    def __init__(self, start, filler):
+        self.start = start
+        self.filler = filler
+
+    def read(self, size):
+        data, self.start = self.start, ''
+        return data or self.filler * size
+
+@pytest.mark.parametrize('read_size', [1, 7, 64, 1 << 16])
+def test_array_split_across_reads(read_size):
+    assert parse(json.dumps(RECORDS, indent=4), read_size) == RECORDS
+
+@pytest.mark.parametrize('read_size', [1, 7, 1 << 16])
+def test_ndjson(read_size):
+    text = '\n'.join(json.dumps(record) for record in RECORDS) + '\n'
+    assert parse(text, read_size) == RECORDS
+
+def test_empty_inputs():
+    assert parse('') == []
+    assert parse('  []  ') == []
+
+def test_trailing_comma_is_rejected():
+    with pytest.raises(ValueError, match="Trailing ','"):
+        parse('[{"service": "a"}, {"service": "b"},]')
+
+def test_missing_delimiter_is_rejected():
+    with pytest.raises(ValueError, match="Expecting ',' delimiter after record 1"):
+        parse('[{"service": "a"} {"service": "b"}]')
+
+def test_unclosed_array_is_rejected():
+    with pytest.raises(ValueError, match="missing ']'"):
+        parse('[{"service": "a"},')
+
+def test_data_after_array_is_rejected():
+    with pytest.raises(ValueError, match="after the end of the array"):
+        parse('[{"service": "a"}] {"service": "b"}')
+
+def test_invalid_record_reports_its_number():
+    with pytest.raises(ValueError, match="record 2"):
+        parse('{"service": "a"}\n{"service": b}\n')
+
+def test_oversized_record_is_rejected_without_reading_everything(monkeypatch):
+    monkeypatch.setattr(import_credentials, 'MAX_RECORD_SIZE', 100)
+    with pytest.raises(ValueError, match="record 1"):
+        list(iter_json_records(EndlessFile('[{"note": "', 'x'), read_size=16))
+
+def test_record_below_the_size_limit_is_accepted(monkeypatch):
+    monkeypatch.setattr(import_credentials, 'MAX_RECORD_SIZE', 100)
+    record = {'note': 'x' * 60}
+    assert parse(json.dumps([record, record]), read_size=16) == [record, record]
+
+def test_records_are_parsed_lazily():
+    records = iter_json_records(EndlessFile('[{"service": "a"}, ', '{"service": "b"}, '), read_size=32)
+    assert next(records) == {'service': 'a'}
+    assert next(records) == {'service': 'b'}
+
+def test_normalize_credential():
+    assert normalize_credential({'service': 'a'}) == (
+        {'username': 'default_username', 'password': 'default_password', 'service': 'a', 'note': ''}, None)
+    assert normalize_credential({'service': 'a', 'note': None})[0]['note'] == ''
+    assert normalize_credential(['a']) == (None, "not a JSON object")
+    assert normalize_credential({'username': 'u'}) == (None, "missing or invalid field: service")
+    assert normalize_credential({'service': 'a', 'password': 5}) == (None, "missing or invalid field: password")
+
+def test_iter_credentials_skips_invalid_records(tmp_path, capsys):
+    path = tmp_path / 'creds.ndjson'
+    path.write_text('{"service": "a"}\n["not", "an", "object"]\n{"service": "b", "note": "n"}\n', encoding='utf-8')
+    stats = {}
+    services = [credential['service'] for credential in iter_credentials(str(path), stats)]
+    assert services == ['a', 'b']
+    assert stats == {'read': 3, 'invalid': 1}
+    assert "Record 2 skipped: not a JSON object" in capsys.readouterr().out
+
+def fake_bulk_endpoint(monkeypatch, existing=()):
+    chunks = []
+
+    def add_credentials(chunk, username, password):
+        chunks.append([credential['service'] for credential in chunk])
+        results = [{'service': c['service'], 'status': 409 if c['service'] in existing else 201, 'message': ''} for c in chunk]
+        return {'created': sum(result['status'] == 201 for result in results), 'results': results}
+
+    monkeypatch.setattr(import_credentials, 'add_credentials', add_credentials)
+    return chunks
+
+def test_write_credentials_sends_chunks(monkeypatch, capsys):
+    chunks = fake_bulk_endpoint(monkeypatch, existing={'service3'})
+    assert write_credentials(iter(RECORDS), 'admin', 'pw', chunk_size=8)
+    assert [len(chunk) for chunk in chunks] == [8, 8, 4]
+    assert [service for chunk in chunks for service in chunk] == [record['service'] for record in RECORDS]
+    assert "19 credentials added, 1 skipped." in capsys.readouterr().out
+
+def test_write_credentials_stops_on_a_failed_chunk(monkeypatch):
+    sent = []
+
+    def add_credentials(chunk, username, password):
+        sent.append(len(chunk))
+        return None
+
+    monkeypatch.setattr(import_credentials, 'add_credentials', add_credentials)
+    assert not write_credentials(iter(RECORDS), 'admin', 'pw', chunk_size=5)
+    # the second chunk is read while the first one is in flight, but not sent once the first one failed
+    assert sent == [5]
+
+def test_write_credentials_raises_on_a_malformed_file(monkeypatch):
+    fake_bulk_endpoint(monkeypatch)
+    with pytest.raises(ValueError):
+        write_credentials(iter_json_records(io.StringIO('[{"service": "a"}, oops]')), 'admin', 'pw', chunk_size=1)
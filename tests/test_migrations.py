@@ -0,0 +1,122 @@
+# Tests for migrations.py on fresh, old and broken databases.
+
+import sqlite3
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+import migrations
+from migrations import MIGRATIONS, MigrationError, migrate
+
+# credential and user tables as created before any migration existed
+OLD_SCHEMA = """
+    CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, password_hash VARCHAR(128) NOT NULL,
+                       email VARCHAR(120) NOT NULL UNIQUE);
+    CREATE TABLE credential (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL, password VARCHAR(120) NOT NULL,
+                             service VARCHAR(120) NOT NULL, note VARCHAR(120));
+"""
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'creds.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany("INSERT INTO credential (username, password, service, note) VALUES (?, ?, ?, ?)",
+                     [('u1', 'x', 'github', 'work account'), ('u2', 'x', 'gitlab', None)])
+    conn.commit()
+    conn.close()
+    return path
+
+def query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def user_version(path):
+    return query(path, "PRAGMA user_version")[0][0]
+
+def schema_names(path):
+    return {name for (name,) in query(path, "SELECT name FROM sqlite_master")}
+
+def test_old_database_is_migrated(db_path):
+    assert migrate(create_engine(f"sqlite:///{db_path}")) == len(MIGRATIONS)
+    assert user_version(db_path) == len(MIGRATIONS)
+    assert {'ix_credential_service', 'table_revision', 'credential_fts'} <= schema_names(db_path)
+    # credentials from before the search index are indexed
+    assert query(db_path, "SELECT rowid FROM credential_fts WHERE credential_fts MATCH 'work'") == [(1,)]
+    # revisions are unique, and new rows continue above every existing one
+    assert query(db_path, "SELECT revision FROM credential ORDER BY id") == [(1,), (2,)]
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO credential (username, password, service) VALUES ('u3', 'x', 'bank')")
+    conn.execute("UPDATE credential SET note = 'changed' WHERE service = 'github'")
+    conn.commit()
+    conn.close()
+    assert query(db_path, "SELECT service, revision FROM credential ORDER BY id") == [('github', 4), ('gitlab', 2), ('bank', 3)]
+
+def test_migrating_twice_changes_nothing(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    migrate(engine)
+    schema = query(db_path, "SELECT sql FROM sqlite_master ORDER BY name")
+    assert migrate(engine) == len(MIGRATIONS)
+    assert query(db_path, "SELECT sql FROM sqlite_master ORDER BY name") == schema
+
+def test_duplicate_services_stop_the_migration(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO credential (username, password, service) VALUES ('u3', 'x', 'github')")
+    conn.commit()
+    conn.close()
+    with pytest.raises(MigrationError):
+        migrate(create_engine(f"sqlite:///{db_path}"))
+    assert user_version(db_path) == 0
+
+def test_failed_migration_is_rolled_back(db_path, monkeypatch):
+    def half_applied(conn):
+        conn.exec_driver_sql("CREATE TABLE half_applied (id INTEGER)")
+        conn.exec_driver_sql("ALTER TABLE credential ADD COLUMN half_applied INTEGER")
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS[:1] + [half_applied])
+    with pytest.raises(RuntimeError):
+        migrate(create_engine(f"sqlite:///{db_path}"))
+    assert user_version(db_path) == 1
+    assert 'half_applied' not in schema_names(db_path)
+    assert 'half_applied' not in [row[1] for row in query(db_path, "PRAGMA table_info(credential)")]
+
+class WithoutFts5:
+    """
+    Connection wrapper failing like an SQLite build without the FTS5 module.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def exec_driver_sql(self, statement, *args):
+        if 'fts5' in statement:
+            raise OperationalError(statement, (), Exception("no such module: fts5"))
+        return self.conn.exec_driver_sql(statement, *args)
+
+def test_search_index_is_deferred_without_fts5(db_path, monkeypatch, caplog):
+    engine = create_engine(f"sqlite:///{db_path}")
+    search = MIGRATIONS.index(migrations.add_credential_search)
+
+    def add_credential_search(conn):
+        migrations.add_credential_search(WithoutFts5(conn))
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS[:search] + [add_credential_search] + MIGRATIONS[search + 1:])
+    # the migrations after it still run
+    assert migrate(engine) == len(MIGRATIONS)
+    assert 'credential_fts' not in schema_names(db_path)
+    assert query(db_path, "SELECT name FROM deferred_migration") == [('add_credential_search',)]
+    assert "deferred" in caplog.text
+
+    # still deferred on the next start without FTS5
+    assert migrate(engine) == len(MIGRATIONS)
+    assert query(db_path, "SELECT name FROM deferred_migration") == [('add_credential_search',)]
+
+    # retried once FTS5 is available
+    monkeypatch.undo()
+    assert migrate(engine) == len(MIGRATIONS)
+    assert 'credential_fts' in schema_names(db_path)
+    assert query(db_path, "SELECT name FROM deferred_migration") == []
+    assert query(db_path, "SELECT rowid FROM credential_fts WHERE credential_fts MATCH 'work'") == [(1,)]
@@ -0,0 +1,150 @@
+# Tests for row_cache.py and the cached read path of GET /creds/<service> and GET /services/<service>.
+
+import time
+import pytest
+import api
+from cipher import CipherEngine
+from crypto_utils import get_keyring
+from row_cache import CredentialRowCache
+
+def test_hit_after_put():
+    cache = CredentialRowCache()
+    assert cache.get('github') is None
+    cache.put('github', 'row', cache.read_token())
+    assert cache.get('github') == 'row'
+    assert cache.stats()['hit_rate'] == 0.5
+
+def test_entries_expire():
+    cache = CredentialRowCache(ttl=0.05)
+    cache.put('github', 'row', cache.read_token())
+    time.sleep(0.1)
+    assert cache.get('github') is None
+    assert cache.stats()['size'] == 0
+
+def test_least_recently_used_is_evicted():
+    cache = CredentialRowCache(max_entries=2)
+    for service in ('a', 'b'):
+        cache.put(service, service, cache.read_token())
+    cache.get('a')
+    cache.put('c', 'c', cache.read_token())
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('a', 'c')
+    assert cache.evictions == 1
+
+def test_invalidate_and_clear():
+    cache = CredentialRowCache()
+    for service in ('a', 'b', 'c'):
+        cache.put(service, service, cache.read_token())
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.get('b') == 'b'
+    cache.clear()
+    assert cache.stats()['size'] == 0
+
+def test_row_read_before_a_write_is_not_cached():
+    cache = CredentialRowCache()
+    token = cache.read_token()
+    cache.invalidate('github')    # a write commits while the row is being read
+    cache.put('github', 'stale row', token)
+    assert cache.get('github') is None
+
+def test_disabled_cache_stores_nothing():
+    for cache in (CredentialRowCache(ttl=0), CredentialRowCache(max_entries=0)):
+        cache.put('github', 'row', cache.read_token())
+        assert not cache.enabled
+        assert cache.get('github') is None
+
+class CountingReads:
+    """
+    Read path recording the lookups that reach the database.
+    """
+
+    def __init__(self, reads):
+        self.reads = reads
+        self.lookups = []
+
+    def get_by_service(self, service):
+        self.lookups.append(service)
+        return self.reads.get_by_service(service)
+
+    def service_exists(self, service):
+        self.lookups.append(service)
+        return self.reads.service_exists(service)
+
+@pytest.fixture
+def cached(app, client, auth_headers):
+    client.post('/creds', json={'username': 'octocat', 'password': 's3cret', 'service': 'github', 'note': 'work'}, headers=auth_headers)
+    reads = app.extensions['credential_reads']
+    assert isinstance(reads, api.CachedCredentialReads)
+    reads.cache.clear()
+    reads.reads = CountingReads(reads.reads)
+    return reads
+
+def get(client, headers, service='github'):
+    response = client.get(f"/creds/{service}", headers=headers)
+    return response.status_code, response.get_json()
+
+def test_hot_reads_skip_the_database(cached, client, auth_headers):
+    for _ in range(3):
+        assert get(client, auth_headers)[1]['password'] == 's3cret'
+    assert client.get('/services/github', headers=auth_headers).get_json() == {"message": "True"}
+    assert cached.reads.lookups == ['github']
+    assert cached.cache.hits == 3
+
+def test_rows_are_cached_encrypted(cached, client, auth_headers):
+    get(client, auth_headers)
+    row = cached.cache.get('github')
+    assert row.password != 's3cret'
+    assert api.ci.decrypt_password(row.password) == 's3cret'
+
+def test_missing_services_are_not_cached(cached, client, auth_headers):
+    assert get(client, auth_headers, 'missing')[0] == 404
+    client.post('/creds', json={'username': 'u', 'password': 'p', 'service': 'missing', 'note': ''}, headers=auth_headers)
+    assert get(client, auth_headers, 'missing')[1]['username'] == 'u'
+
+@pytest.mark.parametrize('method, path, body', [
+    ('PUT', '/creds/github', {'username': 'hubot', 'password': 'changed'}),
+    ('PUT', '/creds/github/note', {'note': 'personal'}),
+])
+def test_updates_invalidate(cached, client, auth_headers, method, path, body):
+    etag = client.get('/creds/github', headers=auth_headers).headers['ETag']
+    client.open(path, method=method, json=body, headers=auth_headers)
+    response = client.get('/creds/github', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    credential = response.get_json()
+    assert all(credential[key] == value for key, value in body.items())
+    assert cached.reads.lookups == ['github', 'github']
+
+def test_delete_invalidates(cached, client, auth_headers):
+    get(client, auth_headers)
+    client.delete('/creds/github', headers=auth_headers)
+    assert get(client, auth_headers)[0] == 404
+    assert client.get('/services/github', headers=auth_headers).get_json() == {"message": "False"}
+
+def test_bulk_add_invalidates(cached, client, auth_headers):
+    get(client, auth_headers, 'new')
+    client.post('/creds/bulk', json=[{'username': 'u', 'password': 'p', 'service': 'new'}], headers=auth_headers)
+    assert get(client, auth_headers, 'new')[0] == 200
+
+def test_key_reload_clears_the_cache(cached, client, auth_headers, monkeypatch):
+    get(client, auth_headers)
+    assert cached.cache.stats()['size'] == 1
+    reloaded = CipherEngine(get_keyring())
+    monkeypatch.setattr(api.ci, 'get_cipher_suite', lambda: reloaded)
+    assert get(client, auth_headers)[1]['password'] == 's3cret'
+    assert cached.reads.lookups == ['github', 'github']
+
+def test_disabled_cache_reads_the_database(tmp_path):
+    from conftest import make_app
+
+    app = make_app(tmp_path, CRED_CACHE_TTL=0)
+    assert not isinstance(app.extensions['credential_reads'], api.CachedCredentialReads)
+
+def test_metrics(cached, client, auth_headers):
+    get(client, auth_headers)
+    get(client, auth_headers)
+    body = client.get('/metrics', headers=auth_headers).get_data(as_text=True)
+    assert 'vault_cred_cache_lookups_total{result="hit"} 1' in body
+    assert 'vault_cred_cache_lookups_total{result="miss"} 1' in body
+    assert 'vault_cred_cache_entries 1' in body
+    assert 'vault_cred_cache_evictions_total 0' in body
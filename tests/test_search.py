@@ -0,0 +1,64 @@
+# Tests for GET /services?prefix= and GET /creds/search, and the triggers keeping the full-text index in sync.
+
+import pytest
+import api
+
+CREDENTIALS = [
+    ('github-work', 'work account'),
+    ('github-personal', 'side projects'),
+    ('gitlab', 'mirror of the work repositories'),
+    ('bank', 'savings'),
+]
+
+@pytest.fixture
+def client(app, auth_headers):
+    client = app.test_client()
+    for service, note in CREDENTIALS:
+        client.post('/creds', json={'username': 'u', 'password': 'p', 'service': service, 'note': note}, headers=auth_headers)
+    return client
+
+def search(client, headers, q, **params):
+    response = client.get('/creds/search', query_string={'q': q, **params}, headers=headers)
+    assert response.status_code == 200
+    return [match['service'] for match in response.get_json()]
+
+def test_prefix_listing(client, auth_headers):
+    assert client.get('/services?prefix=git', headers=auth_headers).get_json() == ['github-personal', 'github-work', 'gitlab']
+    assert client.get('/services?prefix=github-w', headers=auth_headers).get_json() == ['github-work']
+    assert client.get('/services?prefix=zzz', headers=auth_headers).get_json() == []
+
+@pytest.mark.parametrize('prefix, upper', [('git', 'giu'), ('a\U0010FFFF', 'b'), ('퟿', ''), ('\U0010FFFF', None)])
+def test_prefix_upper_bound(prefix, upper):
+    assert api.prefix_upper_bound(prefix) == upper
+
+def test_search_matches_service_and_note(app, client, auth_headers):
+    assert app.extensions['credential_search']
+    assert set(search(client, auth_headers, 'work')) == {'github-work', 'gitlab'}
+    assert search(client, auth_headers, 'git proj') == ['github-personal']
+    assert search(client, auth_headers, 'sav') == ['bank']
+    assert search(client, auth_headers, 'nothing') == []
+
+def test_search_results_have_no_passwords(client, auth_headers):
+    match = client.get('/creds/search?q=bank', headers=auth_headers).get_json()[0]
+    assert 'password' not in match
+    assert match['note'] == 'savings'
+
+def test_search_limit(client, auth_headers):
+    assert len(search(client, auth_headers, 'git', limit=1)) == 1
+    # out of range limits are clamped to 1..SEARCH_MAX_LIMIT
+    assert len(search(client, auth_headers, 'git', limit=0)) == 1
+    assert len(search(client, auth_headers, 'git', limit=10 ** 6)) == 3
+
+def test_empty_query_is_rejected(client, auth_headers):
+    assert client.get('/creds/search?q=', headers=auth_headers).status_code == 400
+
+def test_index_follows_changes(client, auth_headers):
+    client.put('/creds/bank/note', json={'note': 'checking'}, headers=auth_headers)
+    assert search(client, auth_headers, 'savings') == []
+    assert search(client, auth_headers, 'checking') == ['bank']
+    client.delete('/creds/github-work', headers=auth_headers)
+    assert search(client, auth_headers, 'work') == ['gitlab']
+
+def test_like_fallback(app, client, auth_headers):
+    app.extensions['credential_search'] = False
+    assert set(search(client, auth_headers, 'work')) == {'github-work', 'gitlab'}
@@ -0,0 +1,243 @@
+# Pooled HTTP client for the credentials API. Every function in credentials.py and authusers.py sends its request through a shared VaultClient.
+
+'''
+    - A VaultClient owns one requests.Session, so TCP connections are kept alive and reused between calls instead of being opened per request.
+    - The base URL and timeouts are configurable, either per client or through the VAULT_API_URL and VAULT_API_TIMEOUT environment variables for the default client.
+    - Bearer token handlers (client_auth.TokenAuth) are kept per username/password, so a token is only requested once per client and user.
+    - GET responses with an ETag are kept in a small LRU cache and revalidated with If-None-Match, so unchanged resources come back as an empty 304.
+    - Bodies are encoded and decoded with serialization.py (orjson when installed). With msgpack=True, responses are requested as MessagePack.
+    - Large responses arrive compressed (see response_compression.py), requests decompresses them. compress=False asks for plain bodies.
+'''
+
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from client_auth import TokenAuth
+from serialization import JSON_MIMETYPE, accept_header, decode_body, dumps
+
+# Defaults for the shared client. tmux is suggested for testing and usage!!
+DEFAULT_BASE_URL = os.environ.get('VAULT_API_URL', 'http://127.0.0.1:5000')    # For running locally on same physical machine
+DEFAULT_TIMEOUT = (3.05, float(os.environ.get('VAULT_API_TIMEOUT', 30)))       # (connect, read) seconds
+DEFAULT_POOL_CONNECTIONS = 4     # number of hosts to keep pools for
+DEFAULT_POOL_MAXSIZE = 16        # keep-alive connections kept per host, raise for heavily threaded callers
+DEFAULT_ETAG_CACHE_SIZE = 256    # GET responses kept for revalidation, 0 disables the cache
+
+TOKEN_PATH = '/auth/token'
+
+class VaultClient:
+    """
+    Connection-pooled client for the credentials API.
+
+    Usage:
+        client = VaultClient('http://vault.lan:5000', timeout=5)
+        response = client.request('GET', '/services', auth_username, auth_password)
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, max_retries=0, etag_cache_size=DEFAULT_ETAG_CACHE_SIZE, msgpack=False, compress=True):
+        """
+        Parameters:
+            base_url (str): Scheme, host and port of the API, e.g. 'http://127.0.0.1:5000'.
+            timeout (float | tuple): Seconds to wait for the server, or a (connect, read) tuple. Used unless a call passes its own.
+            pool_connections (int): Number of hosts to keep connection pools for.
+            pool_maxsize (int): Maximum number of keep-alive connections kept per host.
+            max_retries (int): Number of times a request that fails to connect is retried.
+            etag_cache_size (int): Number of GET responses kept for If-None-Match revalidation. 0 disables the cache.
+            msgpack (bool): Ask for MessagePack responses, smaller and faster to decode than JSON. Ignored if msgpack is not installed.
+            compress (bool): Accept compressed responses (gzip and deflate, plus br and zstd if brotli or zstandard is installed),
+                decompressed transparently. Turn off on fast local links to save CPU time on both ends.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept'] = accept_header(msgpack)
+        if not compress:
+            self.session.headers['Accept-Encoding'] = 'identity'
+        self.etag_cache_size = etag_cache_size
+        self._etag_cache = OrderedDict()    # (auth_username, path, query) -> (etag, content type, body)
+        self._auth_handlers = {}
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        """
+        Returns:
+            str: The full URL of an API path such as '/creds/github'.
+        """
+        return f"{self.base_url}{path}"
+
+    def auth(self, auth_username, auth_password):
+        """
+        Returns the bearer token handler for a set of credentials, creating it on first use.
+
+        Parameters:
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+
+        Returns:
+            client_auth.TokenAuth: An auth handler that can be passed as `auth=` to the session.
+        """
+        key = (auth_username, auth_password)
+        with self._lock:
+            handler = self._auth_handlers.get(key)
+            if handler is None:
+                handler = TokenAuth(self.url(TOKEN_PATH), auth_username, auth_password, session=self.session)
+                self._auth_handlers[key] = handler
+            return handler
+
+    def request(self, method, path, auth_username, auth_password, **kwargs):
+        """
+        Sends an authenticated request to the API over the pooled session.
+
+        Parameters:
+            method (str): The HTTP method, e.g. 'GET'.
+            path (str): The API path, e.g. '/creds/github'.
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+            **kwargs: Passed on to requests.Session.request (json, params, headers, timeout, ...).
+
+        Returns:
+            requests.Response: The response from the API.
+
+        Raises:
+            requests.RequestException: If there is an error with the request.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if 'json' in kwargs:
+            kwargs['data'] = dumps(kwargs.pop('json'))
+            kwargs['headers'] = {'Content-Type': JSON_MIMETYPE, **(kwargs.get('headers') or {})}
+        return self.session.request(method, self.url(path), auth=self.auth(auth_username, auth_password), **kwargs)
+
+    def get_json(self, path, auth_username, auth_password, params=None, **kwargs):
+        """
+        Sends an authenticated GET request and decodes the JSON body, revalidating previously fetched responses with their ETag.
+
+        If the server answers 304 Not Modified, the body cached from the earlier 200 response is decoded and returned instead,
+        so the server skips building (and, for credentials, decrypting) the response.
+
+        Parameters:
+            path (str): The API path, e.g. '/creds/github'.
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+            params (dict, optional): Query string parameters.
+            **kwargs: Passed on to requests.Session.request.
+
+        Returns:
+            tuple: (requests.Response, result) where result is the decoded JSON body for 200 and 304 responses, None otherwise.
+
+        Raises:
+            requests.RequestException: If there is an error with the request.
+        """
+        key = (auth_username, path, urlencode(params or {}, doseq=True))
+        with self._lock:
+            cached = self._etag_cache.get(key)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        response = self.request('GET', path, auth_username, auth_password, params=params, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                if key in self._etag_cache:
+                    self._etag_cache.move_to_end(key)
+            return response, decode_body(cached[2], cached[1])
+        if response.status_code == 200:
+            etag = response.headers.get('ETag')
+            if etag and self.etag_cache_size > 0:
+                with self._lock:
+                    self._etag_cache[key] = (etag, response.headers.get('Content-Type', ''), response.content)
+                    self._etag_cache.move_to_end(key)
+                    while len(self._etag_cache) > self.etag_cache_size:
+                        self._etag_cache.popitem(last=False)
+            return response, decode(response)
+        with self._lock:
+            self._etag_cache.pop(key, None)
+        return response, None
+
+    def iter_pages(self, path, auth_username, auth_password, params=None, **kwargs):
+        """
+        Iterates over the items of a paginated list route, requesting the next page only once the previous one has been consumed.
+        Pages are followed through the 'Link: <url>; rel="next"' header of each response.
+
+        Parameters:
+            path (str): The API path of the first page, e.g. '/services'.
+            auth_username (str): The username for authentication.
+            auth_password (str): The password for authentication.
+            params (dict, optional): Query string parameters of the first page, e.g. {'limit': 500}.
+            **kwargs: Passed on to requests.Session.request.
+
+        Yields:
+            The items of every page, in order.
+
+        Raises:
+            requests.RequestException: If there is an error with a request.
+        """
+        while path:
+            response = self.request('GET', path, auth_username, auth_password, params=params, **kwargs)
+            response.raise_for_status()    # Raise exception for 4xx and 5xx status codes
+            yield from decode(response)
+            # the next page URL already carries every parameter
+            path, params = response.links.get('next', {}).get('url'), None
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def decode(response):
+    """
+    Decodes the JSON or MessagePack body of a response.
+
+    Parameters:
+        response (requests.Response): The response.
+
+    Returns:
+        The decoded body.
+
+    Raises:
+        requests.exceptions.InvalidJSONError: If the body can't be decoded, like requests.Response.json() does.
+    """
+    try:
+        return decode_body(response.content, response.headers.get('Content-Type', ''))
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(f"Invalid response body: {e}", response=response) from e
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the shared client used by credentials.py and authusers.py, creating it with the defaults on first use.
+
+    Returns:
+        VaultClient: The shared client.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = VaultClient()
+        return _default_client
+
+def set_client(client):
+    """
+    Replaces the shared client, e.g. to point the module functions at another server or change timeouts. The previous client is closed.
+
+    Parameters:
+        client (VaultClient): The client to use from now on.
+    """
+    global _default_client
+    with _default_client_lock:
+        previous, _default_client = _default_client, client
+    if previous is not None and previous is not client:
+        previous.close()
@@ -0,0 +1,11 @@
+# WSGI entry point for production servers. Builds the app once with create_app() and never prompts for input.
+# gunicorn (several worker processes): gunicorn -c gunicorn.conf.py wsgi:app
+# waitress (one process, several threads, also runs on Windows): waitress-serve --listen=0.0.0.0:5000 --threads=8 wsgi:app
+
+import config_init as ci
+from api import create_app
+
+# Generate the encryption key if missing. Config credentials are read from VAULT_CONFIG_USERNAME and VAULT_CONFIG_PASSWORD if missing,
+# and used for the first API user unless VAULT_ADMIN_USERNAME and VAULT_ADMIN_PASSWORD are set.
+username, password = ci.bootstrap(interactive=False)
+app = create_app({'ADMIN_USERNAME': username, 'ADMIN_PASSWORD': password} if username and password else None)